@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark and regression check for GoldenShell's AWS commands.
+
+Runs deploy, status, start, stop, resize and destroy against 1, 10 and 100
+environments without touching AWS: boto3 clients are answered by an
+in-memory EC2/SSM/CloudWatch stand-in (hooked in through botocore's
+`before-call` event, the same hook botocore's Stubber uses, so clients are
+still built and requests still serialized), and `terraform` is a stand-in
+script with a configurable delay per run. Every scenario runs in a fresh
+process with its own HOME and a scratch copy of the tree, and reports:
+  - wall time of the command (the fastest of --runs; import time is covered
+    by import_time.py)
+  - AWS API calls and terraform runs made
+  - peak RSS of the process running the command
+
+Fleet commands use --all. `destroy` has no fleet mode, so it tears down the
+main deployment with N environments registered.
+
+Usage:
+    python3 benchmarks/commands.py
+    python3 benchmarks/commands.py --scales 1,10 --commands status,stop --runs 5
+    python3 benchmarks/commands.py --save baseline.json
+    python3 benchmarks/commands.py --compare baseline.json   # exits 1 on regressions
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone
+
+ROOT = Path(__file__).resolve().parent.parent
+
+REGIONS = ('us-east-1', 'us-west-2', 'eu-west-1')
+SCALES = (1, 10, 100)
+
+# Command line per scenario, and the state its environments start in
+COMMANDS = {
+    'deploy': (lambda n: ['deploy'] + [f'--env=bench-{k}={REGIONS[k % len(REGIONS)]}' for k in range(n)], None),
+    'status': (lambda n: ['status', '--all'], 'running'),
+    'start': (lambda n: ['start', '--all'], 'stopped'),
+    'stop': (lambda n: ['stop', '--all', '--wait'], 'running'),
+    'resize': (lambda n: ['resize', '--all', '--instance-type', 't3.large', '--yes'], 'running'),
+    'destroy': (lambda n: ['destroy', '--yes'], 'running'),
+}
+
+# Stand-in for terraform. Workspaces are marker files under .terraform, plan
+# always reports changes, and outputs derive the instance ID from the
+# workspace name
+FAKE_TERRAFORM = r"""#!/bin/sh
+[ -n "$BENCH_TERRAFORM_LOG" ] && echo "$1" >> "$BENCH_TERRAFORM_LOG"
+sleep "${BENCH_TERRAFORM_LATENCY:-0}"
+workspace=$(cat .terraform/environment 2>/dev/null || echo default)
+case "$1" in
+    init) mkdir -p .terraform ;;
+    workspace)
+        [ "$2" = select ] && [ ! -e ".terraform/workspace-$3" ] && exit 1
+        mkdir -p .terraform && touch ".terraform/workspace-$3" && printf %s "$3" > .terraform/environment ;;
+    plan) exit 2 ;;
+    output)
+        id=$(printf %s "$workspace" | cksum | cut -d' ' -f1)
+        printf '{"instance_id": {"value": "i-%017x"}, "public_ip": {"value": "198.51.100.1"}}\n' "$id" ;;
+esac
+exit 0
+"""
+
+
+class FakeAWS:
+    """In-memory EC2/SSM/CloudWatch answering every boto3 client in this process"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.instances = {}
+        self.calls = {}
+        self.unhandled = set()
+        self._lock = threading.Lock()
+
+    def add_instance(self, instance_id, region, state, name):
+        self.instances[instance_id] = {
+            'InstanceId': instance_id,
+            'InstanceType': 't3.medium',
+            'State': {'Name': state},
+            'PublicIpAddress': '198.51.100.1',
+            'Placement': {'AvailabilityZone': f'{region}a'},
+            'Tags': [{'Key': 'Name', 'Value': f'goldenshell-{name}'}],
+            'LaunchTime': datetime(2026, 1, 1, tzinfo=timezone.utc),
+            'HibernationOptions': {'Configured': False},
+        }
+
+    def install(self):
+        """Hook every boto3 session created from now on"""
+        import boto3.session
+
+        original_init = boto3.session.Session.__init__
+        fake = self
+
+        def init(self, *args, **kwargs):
+            original_init(self, *args, **kwargs)
+            self.events.register('before-parameter-build.*.*', fake._keep_params)
+            self.events.register('before-call.*.*', fake._answer)
+
+        boto3.session.Session.__init__ = init
+
+    @staticmethod
+    def _keep_params(params, context, **kwargs):
+        context['bench_params'] = dict(params)
+
+    def _answer(self, model, context, **kwargs):
+        from botocore.awsrequest import AWSResponse
+
+        name = f'{model.service_model.service_name}.{model.name}'
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        handler = getattr(self, name.replace('.', '_').replace('-', '_'), None)
+        params = context.get('bench_params', {})
+        with self._lock:
+            if handler is None:
+                self.unhandled.add(name)
+                parsed = {}
+            else:
+                parsed = handler(params)
+        parsed.setdefault('ResponseMetadata', {'HTTPStatusCode': 200, 'RetryAttempts': 0})
+        return AWSResponse(None, 200, {}, None), parsed
+
+    def _set_states(self, ids, transitional, final):
+        changes = []
+        for instance_id in ids:
+            instance = self.instances[instance_id]
+            changes.append({'InstanceId': instance_id, 'PreviousState': dict(instance['State']),
+                            'CurrentState': {'Name': transitional}})
+            # Transitions finish before the next describe
+            instance['State'] = {'Name': final}
+        return changes
+
+    def ec2_DescribeInstances(self, params):
+        filters = {f['Name']: f['Values'] for f in params.get('Filters', [])}
+        ids = params.get('InstanceIds') or filters.get('instance-id')
+        states = filters.get('instance-state-name')
+        found = [copy.deepcopy(instance) for instance_id, instance in self.instances.items()
+                 if (ids is None or instance_id in ids)
+                 and (states is None or instance['State']['Name'] in states)
+                 and not any(name.startswith('tag:') or name == 'tag-key' for name in filters)]
+        return {'Reservations': [{'Instances': found}] if found else []}
+
+    def ec2_StartInstances(self, params):
+        return {'StartingInstances': self._set_states(params['InstanceIds'], 'pending', 'running')}
+
+    def ec2_StopInstances(self, params):
+        return {'StoppingInstances': self._set_states(params['InstanceIds'], 'stopping', 'stopped')}
+
+    def ec2_ModifyInstanceAttribute(self, params):
+        self.instances[params['InstanceId']]['InstanceType'] = params['InstanceType']['Value']
+        return {}
+
+    def ec2_DescribeImages(self, params):
+        return {'Images': []}
+
+    def ec2_DescribeInstanceTypes(self, params):
+        return {'InstanceTypes': [{'InstanceType': name, 'MemoryInfo': {'SizeInMiB': 4096},
+                                   'VCpuInfo': {'DefaultVCpus': 2}, 'HibernationSupported': True}
+                                  for name in params.get('InstanceTypes', [])]}
+
+    def ssm_GetParametersByPath(self, params):
+        return {'Parameters': [{'Name': f"{params['Path']}/{name}", 'Value': 'bench', 'Type': 'SecureString'}
+                               for name in ('ttyd-password', 'tailscale-auth-key')]}
+
+    def ssm_GetParameter(self, params):
+        return {'Parameter': {'Name': params['Name'], 'Value': 'bench', 'Type': 'SecureString'}}
+
+    def cloudwatch_GetMetricData(self, params):
+        return {'MetricDataResults': []}
+
+
+def worker(command, scale, aws_latency):
+    """Run one scenario in this process and print its measurements as JSON"""
+    import resource
+    from click.testing import CliRunner
+
+    fake = FakeAWS(aws_latency)
+    fake.install()
+
+    import goldenshell
+
+    config = goldenshell.Config()
+    config.config.update({
+        'aws_access_key_id': 'AKIABENCHMARK',
+        'aws_secret_access_key': 'benchmark-secret',
+        'aws_region': REGIONS[0],
+        'tailscale_auth_key': 'tskey-benchmark',
+        'ssh_key_name': 'benchmark',
+    })
+    args, state = COMMANDS[command]
+    if state:
+        config.set('last_deployment', {'instance_id': 'i-bench00000main', 'public_ip': '198.51.100.1'})
+        fake.add_instance('i-bench00000main', REGIONS[0], state, 'main')
+        for k in range(scale):
+            name, region, instance_id = f'bench-{k}', REGIONS[k % len(REGIONS)], f'i-bench{k:08x}'
+            config.set_environment(name, {'instance_id': instance_id, 'public_ip': '198.51.100.1',
+                                          'region': region})
+            fake.add_instance(instance_id, region, state, name)
+    config.save()
+
+    started = time.perf_counter()
+    result = CliRunner().invoke(goldenshell.cli, args(scale), catch_exceptions=True)
+    wall = time.perf_counter() - started
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    error = None
+    if result.exit_code != 0 or 'Error:' in result.output:
+        error = (result.output.strip().splitlines() or [repr(result.exception)])[-1]
+    print(json.dumps({
+        'wall': wall,
+        'api_calls': sum(fake.calls.values()),
+        'calls': fake.calls,
+        'unhandled': sorted(fake.unhandled),
+        # Kilobytes on Linux, bytes on macOS
+        'peak_mb': peak / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+        'error': error,
+    }))
+
+
+def make_tree(workdir):
+    """Copy goldenshell.py and terraform/ into `workdir`, with stand-in binaries on PATH"""
+    tree = Path(workdir) / 'tree'
+    tree.mkdir()
+    shutil.copy2(ROOT / 'goldenshell.py', tree)
+    shutil.copytree(ROOT / 'terraform', tree / 'terraform',
+                    ignore=shutil.ignore_patterns('.terraform', '*.tfstate*', '__pycache__', '.goldenshell.*'))
+
+    bin_dir = Path(workdir) / 'bin'
+    bin_dir.mkdir()
+    for name, script in (('terraform', FAKE_TERRAFORM), ('ssh', '#!/bin/sh\nexit 0\n')):
+        path = bin_dir / name
+        path.write_text(script)
+        path.chmod(0o755)
+    home = Path(workdir) / 'home'
+    home.mkdir()
+    return tree, bin_dir, home
+
+
+def measure(command, scale, args):
+    """Run one scenario in a fresh process; returns its measurements"""
+    with tempfile.TemporaryDirectory() as workdir:
+        tree, bin_dir, home = make_tree(workdir)
+        terraform_log = Path(workdir) / 'terraform.log'
+        env = os.environ.copy()
+        env.update({
+            'HOME': str(home),
+            'PATH': f"{bin_dir}{os.pathsep}{env.get('PATH', '')}",
+            'PYTHONPATH': str(tree),
+            'BENCH_TERRAFORM_LOG': str(terraform_log),
+            'BENCH_TERRAFORM_LATENCY': f'{args.terraform_latency_ms / 1000:.3f}',
+        })
+        for name in ('AWS_PROFILE', 'AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_SESSION_TOKEN',
+                     'GOLDENSHELL_PROFILE', 'GOLDENSHELL_TRACE'):
+            env.pop(name, None)
+
+        process = subprocess.run(
+            [sys.executable, __file__, '--worker', command, str(scale), str(args.aws_latency_ms / 1000)],
+            env=env, cwd=workdir, capture_output=True, text=True, stdin=subprocess.DEVNULL,
+        )
+        if process.returncode != 0:
+            lines = process.stderr.strip().splitlines() or ['worker failed']
+            return {'error': lines[-1]}
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        result['terraform_runs'] = len(terraform_log.read_text().splitlines()) if terraform_log.exists() else 0
+        return result
+
+
+def compare(results, baseline, args):
+    """Print each scenario against the baseline; returns the regressions found"""
+    regressions = []
+    print(f"\n{'Scenario':14} {'Wall':>18} {'API calls':>14} {'Peak RSS':>20}")
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None or 'error' in result:
+            continue
+        problems = []
+        if (result['wall'] > base['wall'] * (1 + args.time_tolerance)
+                and result['wall'] - base['wall'] > args.min_delta_ms / 1000):
+            problems.append('slower')
+        if result['api_calls'] > base['api_calls'] * (1 + args.call_tolerance):
+            problems.append('more API calls')
+        if result['terraform_runs'] > base['terraform_runs']:
+            problems.append('more terraform runs')
+        if result['peak_mb'] > base['peak_mb'] * (1 + args.memory_tolerance):
+            problems.append('more memory')
+        regressions += [f'{key}: {problem}' for problem in problems]
+        print(f"{key:14} {base['wall']:>7.2f}s → {result['wall']:>6.2f}s "
+              f"{base['api_calls']:>5} → {result['api_calls']:<5} "
+              f"{base['peak_mb']:>7.1f} → {result['peak_mb']:>6.1f}MB  {'; '.join(problems) or 'ok'}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--commands', default=','.join(COMMANDS),
+                        help=f"Comma-separated commands to run (default: {','.join(COMMANDS)})")
+    parser.add_argument('--scales', default=','.join(map(str, SCALES)),
+                        help='Comma-separated environment counts (default: 1,10,100)')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='Runs per scenario; the fastest is reported (default: 3)')
+    parser.add_argument('--aws-latency-ms', type=float, default=20.0,
+                        help='Delay added to every stubbed AWS call (default: 20)')
+    parser.add_argument('--terraform-latency-ms', type=float, default=50.0,
+                        help='Delay added to every terraform run (default: 50)')
+    parser.add_argument('--save', metavar='FILE', help='Write the results to FILE as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='Fail if results regressed against FILE')
+    parser.add_argument('--time-tolerance', type=float, default=0.25,
+                        help='Allowed wall time increase as a fraction (default: 0.25)')
+    parser.add_argument('--min-delta-ms', type=float, default=50.0,
+                        help='Wall time increases smaller than this never fail (default: 50)')
+    parser.add_argument('--call-tolerance', type=float, default=0.0,
+                        help='Allowed API call count increase as a fraction (default: 0)')
+    parser.add_argument('--memory-tolerance', type=float, default=0.2,
+                        help='Allowed peak RSS increase as a fraction (default: 0.2)')
+    parser.add_argument('--worker', nargs=3, metavar=('COMMAND', 'SCALE', 'AWS_LATENCY'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        command, scale, aws_latency = args.worker
+        worker(command, int(scale), float(aws_latency))
+        return
+
+    commands = [name.strip() for name in args.commands.split(',') if name.strip()]
+    unknown = [name for name in commands if name not in COMMANDS]
+    if unknown:
+        parser.error(f"unknown command(s): {', '.join(unknown)}")
+    scales = [int(scale) for scale in args.scales.split(',')]
+
+    failed = False
+    results = {}
+    print(f"{'Scenario':14} {'Wall':>9} {'API calls':>10} {'Terraform':>10} {'Peak RSS':>10}  Result")
+    for command in commands:
+        for scale in scales:
+            key = f'{command}/{scale}'
+            runs = [measure(command, scale, args) for _ in range(args.runs)]
+            errors = [run['error'] for run in runs if run.get('error')]
+            if errors:
+                failed = True
+                results[key] = {'error': errors[0]}
+                print(f"{key:14} {'':>9} {'':>10} {'':>10} {'':>10}  failed: {errors[0]}")
+                continue
+
+            fastest = min(runs, key=lambda run: run['wall'])
+            results[key] = result = {
+                'wall': fastest['wall'],
+                # Poll rounds can vary with timing; the fewest calls seen is the stable figure
+                'api_calls': min(run['api_calls'] for run in runs),
+                'calls': fastest['calls'],
+                'terraform_runs': fastest['terraform_runs'],
+                'peak_mb': min(run['peak_mb'] for run in runs),
+            }
+            unhandled = sorted({name for run in runs for name in run['unhandled']})
+            note = f"ok (unstubbed: {', '.join(unhandled)})" if unhandled else 'ok'
+            print(f"{key:14} {result['wall']:>8.2f}s {result['api_calls']:>10} "
+                  f"{result['terraform_runs']:>10} {result['peak_mb']:>8.1f}MB  {note}")
+
+    if args.save:
+        Path(args.save).write_text(json.dumps({
+            'settings': {'aws_latency_ms': args.aws_latency_ms,
+                         'terraform_latency_ms': args.terraform_latency_ms},
+            'results': results,
+        }, indent=2) + '\n')
+        print(f'\nSaved results to {args.save}')
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        settings = {'aws_latency_ms': args.aws_latency_ms, 'terraform_latency_ms': args.terraform_latency_ms}
+        if baseline.get('settings') != settings:
+            print(f"\nWarning: baseline was recorded with {baseline.get('settings')}, this run uses {settings}")
+        regressions = compare(results, baseline['results'], args)
+        if regressions:
+            failed = True
+            print('\nRegressions:')
+            for regression in regressions:
+                print(f'  {regression}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
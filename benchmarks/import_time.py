@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for GoldenShell's lightweight commands.
+
+Runs each command under `python -X importtime` with an isolated HOME and a
+stand-in `ssh` binary, then fails if:
+  - a heavy AWS/Terraform module gets imported by a command that doesn't need it
+  - the cumulative import time (excluding interpreter startup) exceeds the budget
+
+Usage:
+    python3 benchmarks/import_time.py
+    python3 benchmarks/import_time.py --budget-ms 60 --runs 5
+"""
+
+import os
+import sys
+import stat
+import tempfile
+import argparse
+import subprocess
+from pathlib import Path
+
+GOLDENSHELL = Path(__file__).resolve().parent.parent / 'goldenshell.py'
+
+# Commands that must never touch boto3/botocore/python_terraform
+LIGHTWEIGHT_COMMANDS = {
+    'help': ['--help'],
+    'config': ['config'],
+    'ssh': ['ssh', '--tailscale-hostname', 'goldenshell-bench'],
+}
+
+FORBIDDEN_MODULES = ('boto3', 'botocore', 'python_terraform')
+
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into (module, cumulative_us, depth) tuples"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        imports.append((name.strip(), int(cumulative), depth))
+    return imports
+
+
+def measure(args, env):
+    """Run one command and return (import_ms, forbidden modules seen)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', str(GOLDENSHELL)] + args,
+        env=env, capture_output=True, text=True, stdin=subprocess.DEVNULL,
+    )
+    imports = parse_importtime(result.stderr)
+
+    # Only count top-level imports made after interpreter startup (site)
+    total_us = 0
+    after_site = False
+    for name, cumulative, depth in imports:
+        if depth != 0:
+            continue
+        if name == 'site':
+            after_site = True
+            continue
+        if after_site:
+            total_us += cumulative
+
+    forbidden = sorted({
+        name.split('.')[0] for name, _, _ in imports
+        if name.split('.')[0] in FORBIDDEN_MODULES
+    })
+    return total_us / 1000, forbidden
+
+
+def make_env(workdir):
+    """Build an environment with an empty HOME and a no-op `ssh` on PATH"""
+    bin_dir = Path(workdir) / 'bin'
+    bin_dir.mkdir()
+    fake_ssh = bin_dir / 'ssh'
+    fake_ssh.write_text('#!/bin/sh\nexit 0\n')
+    fake_ssh.chmod(fake_ssh.stat().st_mode | stat.S_IEXEC)
+
+    env = os.environ.copy()
+    env['HOME'] = str(workdir)
+    env['PATH'] = f"{bin_dir}{os.pathsep}{env.get('PATH', '')}"
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=75.0,
+                        help='Maximum import time per command in milliseconds (default: 75)')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='Runs per command; the fastest run is compared to the budget (default: 3)')
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as workdir:
+        env = make_env(workdir)
+
+        print(f"{'Command':10} {'Import time':>12} {'Budget':>10}  Result")
+        for name, command in LIGHTWEIGHT_COMMANDS.items():
+            runs = [measure(command, env) for _ in range(args.runs)]
+            best_ms = min(ms for ms, _ in runs)
+            forbidden = sorted({mod for _, mods in runs for mod in mods})
+
+            problems = []
+            if best_ms > args.budget_ms:
+                problems.append('over budget')
+            if forbidden:
+                problems.append(f"imported {', '.join(forbidden)}")
+            failed = failed or bool(problems)
+
+            print(f"{name:10} {best_ms:>10.1f}ms {args.budget_ms:>8.0f}ms  {'; '.join(problems) or 'ok'}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
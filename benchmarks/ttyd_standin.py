@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the instance's ttyd web terminal.
+
+Speaks ttyd's WebSocket protocol (subprotocol "tty", /token, basic auth) in
+front of a shell on a local pty, so `goldenshell webterm bench` can be
+exercised without an instance. --rtt-ms delays every keystroke to emulate a
+slow link, and --no-compression refuses permessage-deflate.
+
+Usage:
+    python3 benchmarks/ttyd_standin.py --port 7681 --credential ubuntu:secret
+    python3 goldenshell.py webterm bench --url http://127.0.0.1:7681 --password secret
+"""
+
+import os
+import pty
+import sys
+import json
+import time
+import zlib
+import fcntl
+import base64
+import struct
+import socket
+import hashlib
+import termios
+import argparse
+import threading
+import socketserver
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+class TtydHandler(socketserver.BaseRequestHandler):
+    """One HTTP request: /token, or a /ws upgrade that runs a shell until closed"""
+
+    def handle(self):
+        self.buffer = b''
+        while b'\r\n\r\n' not in self.buffer:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return
+            self.buffer += chunk
+        head, self.buffer = self.buffer.split(b'\r\n\r\n', 1)
+        request_line, *lines = head.decode('latin-1').split('\r\n')
+        path = request_line.split(' ')[1]
+        self.headers = {name.strip().lower(): value.strip()
+                        for name, _, value in (line.partition(':') for line in lines)}
+
+        options = self.server.options
+        if options.credential and self.headers.get('authorization') != f'Basic {self.server.token}':
+            self.respond('401 Unauthorized', b'', ['WWW-Authenticate: Basic realm="ttyd"'])
+        elif path.endswith('/token'):
+            self.respond('200 OK', json.dumps({'token': self.server.token}).encode(),
+                         ['Content-Type: application/json'])
+        elif path.endswith('/ws') and self.headers.get('upgrade', '').lower() == 'websocket':
+            self.websocket()
+        else:
+            self.respond('404 Not Found', b'')
+
+    def respond(self, status, body, headers=()):
+        lines = [f'HTTP/1.1 {status}', f'Content-Length: {len(body)}', 'Connection: close', *headers]
+        self.request.sendall(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+
+    def websocket(self):
+        accept = base64.b64encode(hashlib.sha1(
+            (self.headers['sec-websocket-key'] + WEBSOCKET_GUID).encode()).digest()).decode()
+        headers = ['HTTP/1.1 101 Switching Protocols', 'Upgrade: websocket', 'Connection: Upgrade',
+                   f'Sec-WebSocket-Accept: {accept}', 'Sec-WebSocket-Protocol: tty']
+        self.deflater = None
+        if self.server.options.compression and \
+                'permessage-deflate' in self.headers.get('sec-websocket-extensions', ''):
+            headers.append('Sec-WebSocket-Extensions: permessage-deflate')
+            self.deflater = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.request.sendall(('\r\n'.join(headers) + '\r\n\r\n').encode())
+        self.send_lock = threading.Lock()
+
+        # The first message carries the auth token and terminal size
+        message = self.read_message()
+        if message is None:
+            return
+        hello = json.loads(message)
+        if self.server.options.credential and hello.get('AuthToken') != self.server.token:
+            self.send_frame(8, (1008).to_bytes(2, 'big'))
+            return
+
+        pid, master = pty.fork()
+        if pid == 0:
+            os.environ.update(TERM='xterm-256color', PS1='standin$ ')
+            os.execvp(self.server.options.shell[0], self.server.options.shell)
+        self.resize(master, hello.get('columns', 80), hello.get('rows', 24))
+        self.send_message(b'1' + b'ttyd stand-in')
+        self.send_message(b'2' + b'{}')
+
+        threading.Thread(target=self.pump_output, args=(master,), daemon=True).start()
+        try:
+            while True:
+                message = self.read_message()
+                if message is None:
+                    break
+                if message[:1] == b'0':
+                    if self.server.options.rtt_ms:
+                        time.sleep(self.server.options.rtt_ms / 1000)
+                    os.write(master, message[1:])
+                elif message[:1] == b'1':
+                    size = json.loads(message[1:])
+                    self.resize(master, size['columns'], size['rows'])
+        finally:
+            os.close(master)
+            try:
+                os.kill(pid, 9)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+
+    def resize(self, master, columns, rows):
+        fcntl.ioctl(master, termios.TIOCSWINSZ, struct.pack('HHHH', rows, columns, 0, 0))
+
+    def pump_output(self, master):
+        """Forward pty output as OUTPUT messages, one per read, like ttyd"""
+        while True:
+            try:
+                data = os.read(master, 1 << 16)
+            except OSError:
+                data = b''
+            if not data:
+                self.send_frame(8, (1000).to_bytes(2, 'big'))
+                return
+            self.send_message(b'0' + data)
+
+    def send_message(self, payload):
+        if self.deflater:
+            payload = self.deflater.compress(payload) + self.deflater.flush(zlib.Z_SYNC_FLUSH)
+            self.send_frame(2, payload[:-4], compressed=True)
+        else:
+            self.send_frame(2, payload)
+
+    def send_frame(self, opcode, payload, compressed=False):
+        length = len(payload)
+        first = 0x80 | (0x40 if compressed else 0) | opcode
+        if length < 126:
+            header = bytes([first, length])
+        elif length < 1 << 16:
+            header = bytes([first, 126]) + length.to_bytes(2, 'big')
+        else:
+            header = bytes([first, 127]) + length.to_bytes(8, 'big')
+        with self.send_lock:
+            try:
+                self.request.sendall(header + payload)
+            except OSError:
+                pass
+
+    def read_exact(self, count):
+        while len(self.buffer) < count:
+            chunk = self.request.recv(1 << 16)
+            if not chunk:
+                return None
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:count], self.buffer[count:]
+        return data
+
+    def read_message(self):
+        """Next data message from the client (masked, never fragmented by our client), or None"""
+        while True:
+            header = self.read_exact(2)
+            if header is None:
+                return None
+            opcode, length = header[0] & 0x0f, header[1] & 0x7f
+            if length == 126:
+                length = int.from_bytes(self.read_exact(2) or b'\0\0', 'big')
+            elif length == 127:
+                length = int.from_bytes(self.read_exact(8) or b'\0' * 8, 'big')
+            mask = self.read_exact(4)
+            payload = self.read_exact(length)
+            if mask is None or payload is None:
+                return None
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+            if opcode == 8:
+                return None
+            if opcode == 9:
+                self.send_frame(10, payload)
+            elif opcode in (1, 2):
+                return payload
+
+
+class TtydStandin(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, options):
+        super().__init__((options.host, options.port), TtydHandler)
+        self.options = options
+        self.token = base64.b64encode(options.credential.encode()).decode() if options.credential else ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7681)
+    parser.add_argument('--credential', default='', help='user:password for basic auth (default: none)')
+    parser.add_argument('--rtt-ms', type=float, default=0, help='Delay added to every keystroke')
+    parser.add_argument('--no-compression', dest='compression', action='store_false',
+                        help='Refuse permessage-deflate')
+    parser.add_argument('shell', nargs='*', default=['/bin/bash', '--norc', '--noprofile'],
+                        help='Command to run on the pty')
+    options = parser.parse_args()
+
+    server = TtydStandin(options)
+    print(f'ttyd stand-in listening on http://{options.host}:{server.server_address[1]}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,7 +10,7 @@ echo "  GoldenShell Instance Quick Fix Script"
 echo "================================================"
 echo ""
 echo "This script will complete the failed installation."
-echo "Estimated time: 5-10 minutes"
+echo "Steps that are already current are skipped, so re-runs take seconds."
 echo ""
 
 # Check if running as root
@@ -30,28 +30,50 @@ if [ -f /var/lib/goldenshell-setup-complete ]; then
     fi
 fi
 
-echo "Phase 1: Installing AWS CLI..."
-cd /tmp
-if ! command -v aws &> /dev/null; then
-    curl -s "https://awscli.amazonaws.com/awscli-exe-linux-x86_64.zip" -o "awscliv2.zip"
-    unzip -q awscliv2.zip
-    sudo ./aws/install
-    rm -rf aws awscliv2.zip
-    echo "✓ AWS CLI installed: $(aws --version)"
-else
-    echo "✓ AWS CLI already installed: $(aws --version)"
+echo "Phase 1: Installing packages and tools..."
+# Prefer the provisioner installed by user-data; fall back to a copy of
+# terraform/provision.sh next to this script (for instances that predate it)
+PROVISIONER=/usr/local/sbin/goldenshell-provision
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+if [ ! -x "$PROVISIONER" ]; then
+    for candidate in "$SCRIPT_DIR/terraform/provision.sh" "$SCRIPT_DIR/provision.sh"; do
+        if [ -f "$candidate" ]; then
+            sudo install -m 0755 "$candidate" "$PROVISIONER"
+            break
+        fi
+    done
+fi
+if [ ! -x "$PROVISIONER" ]; then
+    echo "ERROR: $PROVISIONER not found. Copy terraform/provision.sh next to this script and re-run."
+    exit 1
 fi
+sudo "$PROVISIONER"
 
 echo ""
 echo "Phase 2: Configuring Tailscale..."
-export AWS_DEFAULT_REGION=us-east-1
+# Secrets helper from terraform/secrets-helper.py: one SSM call for every
+# secret under the prefix, without starting the AWS CLI
+SECRETS_HELPER=/usr/local/bin/goldenshell-secrets
+for candidate in "$SCRIPT_DIR/terraform/secrets-helper.py" "$SCRIPT_DIR/secrets-helper.py"; do
+    if [ -f "$candidate" ]; then
+        sudo install -m 0755 "$candidate" "$SECRETS_HELPER"
+        break
+    fi
+done
 if ! sudo tailscale status &> /dev/null; then
     echo "Retrieving auth key from SSM..."
-    TAILSCALE_AUTH_KEY=$(aws ssm get-parameter \
-      --name "/goldenshell/tailscale-auth-key" \
-      --with-decryption \
-      --query "Parameter.Value" \
-      --output text)
+    if [ -x "$SECRETS_HELPER" ]; then
+        sudo "$SECRETS_HELPER" fetch "${SSM_PREFIX:-/goldenshell}"
+        TAILSCALE_AUTH_KEY=$(sudo "$SECRETS_HELPER" get tailscale-auth-key)
+        sudo "$SECRETS_HELPER" clear
+    else
+        TAILSCALE_AUTH_KEY=$(aws ssm get-parameter \
+          --region us-east-1 \
+          --name "${SSM_PREFIX:-/goldenshell}/tailscale-auth-key" \
+          --with-decryption \
+          --query "Parameter.Value" \
+          --output text)
+    fi
 
     echo "Authenticating Tailscale..."
     sudo tailscale up --authkey="$TAILSCALE_AUTH_KEY" --ssh
@@ -63,37 +85,7 @@ fi
 sudo tailscale status
 
 echo ""
-echo "Phase 3: Upgrading Node.js to v20 LTS..."
-NODE_VERSION=$(node --version)
-if [[ "$NODE_VERSION" < "v18" ]]; then
-    echo "Current version: $NODE_VERSION (upgrading...)"
-    curl -fsSL https://deb.nodesource.com/setup_20.x | sudo -E bash -
-    sudo apt-get install -y nodejs
-    echo "✓ Node.js upgraded: $(node --version)"
-else
-    echo "✓ Node.js version sufficient: $(node --version)"
-fi
-
-echo ""
-echo "Phase 4: Reinstalling Claude Code CLI..."
-sudo npm uninstall -g @anthropic-ai/claude-code 2>/dev/null || true
-sudo npm install -g @anthropic-ai/claude-code
-echo "✓ Claude Code CLI installed: $(claude --version 2>&1 | head -1)"
-
-echo ""
-echo "Phase 5: Installing Zellij..."
-if ! command -v zellij &> /dev/null; then
-    ZELLIJ_VERSION="0.41.2"
-    wget -q "https://github.com/zellij-org/zellij/releases/download/v${ZELLIJ_VERSION}/zellij-x86_64-unknown-linux-musl.tar.gz" -O /tmp/zellij.tar.gz
-    sudo tar -xzf /tmp/zellij.tar.gz -C /usr/local/bin/
-    sudo chmod +x /usr/local/bin/zellij
-    rm /tmp/zellij.tar.gz
-    echo "✓ Zellij installed: $(zellij --version)"
-else
-    echo "✓ Zellij already installed: $(zellij --version)"
-fi
-
-echo "Configuring Zellij..."
+echo "Phase 3: Configuring Zellij..."
 mkdir -p ~/.config/zellij
 cat > ~/.config/zellij/config.kdl << 'EOF'
 // Zellij configuration for GoldenShell
@@ -119,19 +111,10 @@ EOF
 echo "✓ Zellij configured"
 
 echo ""
-echo "Phase 6: Installing ttyd Web Terminal..."
-if ! command -v ttyd &> /dev/null; then
-    TTYD_VERSION="1.7.7"
-    wget -q "https://github.com/tsl0922/ttyd/releases/download/${TTYD_VERSION}/ttyd.x86_64" -O /tmp/ttyd
-    sudo mv /tmp/ttyd /usr/local/bin/ttyd
-    sudo chmod +x /usr/local/bin/ttyd
-    echo "✓ ttyd installed: $(ttyd --version 2>&1 | head -1)"
-else
-    echo "✓ ttyd already installed"
-fi
-
-echo "Creating ttyd systemd service..."
-sudo tee /etc/systemd/system/ttyd.service > /dev/null << 'EOF'
+echo "Phase 4: Configuring ttyd Web Terminal..."
+# Defaults to the "balanced" web terminal profile; set TTYD_OPTIONS to override
+TTYD_OPTIONS="${TTYD_OPTIONS:--P 15 -t disableReconnect=false -t rendererType=webgl}"
+sudo tee /etc/systemd/system/ttyd.service > /dev/null << EOF
 [Unit]
 Description=ttyd - Web Terminal with Zellij for GoldenShell
 After=network.target
@@ -140,7 +123,7 @@ After=network.target
 Type=simple
 User=ubuntu
 WorkingDirectory=/home/ubuntu
-ExecStart=/usr/local/bin/ttyd -p 7681 -W -t disableReconnect=true -c ubuntu:GoldenShell2025! /usr/local/bin/zellij attach --create default
+ExecStart=/usr/local/bin/ttyd -p 7681 -W $TTYD_OPTIONS -c ubuntu:GoldenShell2025! /usr/local/bin/zellij attach --create default
 Restart=always
 RestartSec=5
 
@@ -154,84 +137,54 @@ sudo systemctl start ttyd.service
 echo "✓ ttyd service started"
 
 echo ""
-echo "Phase 7: Configuring Auto-Shutdown..."
-sudo tee /usr/local/bin/check-idle-shutdown.sh > /dev/null << 'EOF'
-#!/bin/bash
-
-# Configuration
-IDLE_THRESHOLD_MINUTES=30
-IDLE_THRESHOLD_SECONDS=$((IDLE_THRESHOLD_MINUTES * 60))
-
-# Get instance metadata using IMDSv2
-TOKEN=$(curl -X PUT "http://169.254.169.254/latest/api/token" -H "X-aws-ec2-metadata-token-ttl-seconds: 21600" -s)
-REGION=$(curl -H "X-aws-ec2-metadata-token: $TOKEN" -s http://169.254.169.254/latest/meta-data/placement/region)
-INSTANCE_ID=$(curl -H "X-aws-ec2-metadata-token: $TOKEN" -s http://169.254.169.254/latest/meta-data/instance-id)
-
-# Check for active sessions and connections
-ACTIVE_SESSIONS=$(who | wc -l)
-RECENT_CONNECTIONS=$(ss -tn | grep ESTAB | grep -v ':22' | wc -l)
-WEB_TERMINAL_CONNECTIONS=$(sudo ss -tn | grep ':7681' | grep ESTAB | wc -l)
-
-# If there are active sessions or connections, reset idle timer
-if [ "$ACTIVE_SESSIONS" -gt 0 ] || [ "$RECENT_CONNECTIONS" -gt 0 ] || [ "$WEB_TERMINAL_CONNECTIONS" -gt 0 ]; then
-    echo "$(date): Active sessions detected. Not shutting down."
-    echo "$(date)" > /tmp/last-activity
-    exit 0
-fi
-
-# Check last activity timestamp
-if [ ! -f /tmp/last-activity ]; then
-    echo "$(date)" > /tmp/last-activity
-    exit 0
+echo "Phase 5: Configuring Auto-Shutdown..."
+# Resident idle monitor from terraform/idle-monitor.py; replaces the old
+# check-idle-shutdown.sh script and its 5-minute timer
+IDLE_MONITOR=/usr/local/bin/goldenshell-idle-monitor
+for candidate in "$SCRIPT_DIR/terraform/idle-monitor.py" "$SCRIPT_DIR/idle-monitor.py"; do
+    if [ -f "$candidate" ]; then
+        sudo install -m 0755 "$candidate" "$IDLE_MONITOR"
+        break
+    fi
+done
+if [ ! -x "$IDLE_MONITOR" ]; then
+    echo "ERROR: $IDLE_MONITOR not found. Copy terraform/idle-monitor.py next to this script and re-run."
+    exit 1
 fi
 
-LAST_ACTIVITY=$(cat /tmp/last-activity)
-LAST_ACTIVITY_EPOCH=$(date -d "$LAST_ACTIVITY" +%s)
-CURRENT_EPOCH=$(date +%s)
-IDLE_SECONDS=$((CURRENT_EPOCH - LAST_ACTIVITY_EPOCH))
-
-echo "$(date): Idle for $IDLE_SECONDS seconds (threshold: $IDLE_THRESHOLD_SECONDS)"
-
-if [ "$IDLE_SECONDS" -gt "$IDLE_THRESHOLD_SECONDS" ]; then
-    echo "$(date): Idle threshold exceeded. Shutting down instance..."
-    aws ec2 stop-instances --instance-ids "$INSTANCE_ID" --region "$REGION"
+if [ -f /etc/systemd/system/goldenshell-idle-monitor.timer ]; then
+    sudo systemctl disable --now goldenshell-idle-monitor.timer 2> /dev/null || true
+    sudo rm -f /etc/systemd/system/goldenshell-idle-monitor.timer /usr/local/bin/check-idle-shutdown.sh
 fi
-EOF
-
-sudo chmod +x /usr/local/bin/check-idle-shutdown.sh
 
 sudo tee /etc/systemd/system/goldenshell-idle-monitor.service > /dev/null << 'EOF'
 [Unit]
 Description=GoldenShell Idle Monitor
-After=network.target
+After=network-online.target
+Wants=network-online.target
 
 [Service]
-Type=oneshot
-ExecStart=/usr/local/bin/check-idle-shutdown.sh
+Type=simple
+Environment=IDLE_THRESHOLD_MINUTES=30
+ExecStart=/usr/bin/python3 /usr/local/bin/goldenshell-idle-monitor
+Restart=always
+RestartSec=10
+Nice=10
+CPUWeight=10
+IOSchedulingClass=idle
+MemoryMax=64M
 
 [Install]
 WantedBy=multi-user.target
 EOF
 
-sudo tee /etc/systemd/system/goldenshell-idle-monitor.timer > /dev/null << 'EOF'
-[Unit]
-Description=GoldenShell Idle Monitor Timer
-
-[Timer]
-OnBootSec=5min
-OnUnitActiveSec=5min
-
-[Install]
-WantedBy=timers.target
-EOF
-
 sudo systemctl daemon-reload
-sudo systemctl enable goldenshell-idle-monitor.timer
-sudo systemctl start goldenshell-idle-monitor.timer
+sudo systemctl enable goldenshell-idle-monitor.service
+sudo systemctl restart goldenshell-idle-monitor.service
 echo "✓ Auto-shutdown configured (30 minute idle timeout)"
 
 echo ""
-echo "Phase 8: Configuring User Environment..."
+echo "Phase 6: Configuring User Environment..."
 cat > ~/.bash_profile << 'EOF'
 echo "================================================"
 echo "  Welcome to GoldenShell Development Instance  "
@@ -260,7 +213,7 @@ grep -q "bash_profile" ~/.bashrc || echo "source ~/.bash_profile" >> ~/.bashrc
 echo "✓ User environment configured"
 
 echo ""
-echo "Phase 9: Setting Completion Flag..."
+echo "Phase 7: Setting Completion Flag..."
 sudo touch /var/lib/goldenshell-setup-complete
 sudo chmod 644 /var/lib/goldenshell-setup-complete
 echo "✓ Setup completion flag set"
@@ -278,7 +231,7 @@ echo "Claude CLI: $(claude --version 2>&1 | head -1)"
 echo "Zellij: $(zellij --version 2>&1 | head -1)"
 echo "ttyd: $(ttyd --version 2>&1 | head -1)"
 echo "ttyd service: $(systemctl is-active ttyd.service)"
-echo "Auto-shutdown: $(systemctl is-active goldenshell-idle-monitor.timer)"
+echo "Auto-shutdown: $(systemctl is-active goldenshell-idle-monitor.service)"
 echo ""
 echo "Web Terminal Access:"
 PUBLIC_IP=$(curl -s http://169.254.169.254/latest/meta-data/public-ipv4)
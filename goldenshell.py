@@ -5,39 +5,529 @@ GoldenShell - Deploy ephemeral Linux development environments in AWS
 
 import os
 import sys
+import time
+# Start of this module's import, for the start-up spans of --profile/--trace
+IMPORT_STARTED_NS = time.time_ns()
+import threading
 import click
-import yaml
 import json
-import boto3
+from contextlib import contextmanager
 from pathlib import Path
-from python_terraform import Terraform
+
+# Heavy dependencies (boto3, yaml, python_terraform) are imported inside the
+# functions that use them, so lightweight commands like `config` and `ssh`
+# don't pay for loading botocore.
 
 CONFIG_DIR = Path.home() / ".goldenshell"
 CONFIG_FILE = CONFIG_DIR / "config.yaml"
+# Parsed copy of config.yaml, used while config.yaml is unchanged, and the
+# lock file serializing config writers (see Config)
+CONFIG_CACHE_FILE = CONFIG_DIR / "config.json"
+CONFIG_LOCK_FILE = CONFIG_DIR / "config.lock"
+INSTANCE_CACHE_FILE = CONFIG_DIR / "instance-cache.json"
+DEPLOY_CACHE_FILE = CONFIG_DIR / "deploy-cache.json"
+# Boot timelines fetched by `goldenshell boot-report`
+BOOT_REPORTS_DIR = CONFIG_DIR / "boot-reports"
+# Per-environment copies of the Terraform directory for isolated deploys
+WORKSPACES_DIR = CONFIG_DIR / "workspaces"
+# ControlMaster sockets, one per host (see ssh_command)
+SSH_CONTROL_DIR = CONFIG_DIR / "ssh"
+CONNECTION_CACHE_FILE = CONFIG_DIR / "connection-cache.json"
+# Seconds from `start` to SSH answering, split into resumes and cold boots
+START_TIMES_FILE = CONFIG_DIR / "start-times.json"
+START_TIMES_KEPT = 20
+# A noted start that nobody waited on this long is dropped, not recorded
+START_TIMES_MAX_WAIT = 600
+
+# Saved plan written (and removed) inside the Terraform working directory
+DEPLOY_PLAN_FILE = '.goldenshell.tfplan'
+# Top-level paths in the Terraform directory that don't affect the deployment
+TERRAFORM_FINGERPRINT_IGNORE = (
+    '.terraform', 'terraform.tfstate', 'terraform.tfstate.backup', 'terraform.tfstate.d',
+    '.terraform.tfstate.lock.info', DEPLOY_PLAN_FILE,
+)
+# ...and those an environment's workspace keeps from its own runs: state (per
+# Terraform workspace, in terraform.tfstate.d) and the provider lock file
+WORKSPACE_LOCAL_PATHS = TERRAFORM_FINGERPRINT_IGNORE + ('.terraform.lock.hcl',)
+
+# Environments deployed at once by `deploy --env/--region`
+DEPLOY_PARALLELISM = 3
+
+# Baked images: the stock image they start from (as data.aws_ami.ubuntu in
+# main.tf) and the tag `goldenshell bake` puts on its output
+UBUNTU_AMI_OWNER = '099720109477'
+UBUNTU_AMI_NAME = 'ubuntu/images/hvm-ssd/ubuntu-jammy-22.04-amd64-server-*'
+BAKED_AMI_TAG = 'GoldenShellBaked'
+BAKED_AMIS_KEPT = 3
+# Provisioning from a stock image takes minutes; allow for slow mirrors
+BAKE_TIMEOUT = 2400
+BOOT_PROBE_CONSOLE_INTERVAL = 10
+# Written by terraform/user-data.sh, one JSON object per line
+BOOT_LOG_PATH = '/var/log/goldenshell-boot.jsonl'
+# Instance tag the on-instance idle monitor (terraform/idle-monitor.py) keeps
+# up to date; it re-publishes every 10 minutes, so older reports are stale
+IDLE_TAG = 'GoldenShellIdle'
+IDLE_TAG_STALE = 1800
+
+# StateReason code of an instance stopped with Hibernate=True, and the errors
+# EC2 answers a hibernate request with when the instance can't hibernate
+HIBERNATE_STATE_REASON = 'Client.UserInitiatedHibernate'
+HIBERNATE_FALLBACK_ERRORS = ('UnsupportedHibernationConfiguration', 'UnsupportedOperation')
+# StateReason code of a spot instance EC2 stopped to reclaim its capacity
+SPOT_INTERRUPTED_STATE_REASON = 'Server.SpotInstanceShutdown'
+
+# Seconds a cached instance state is trusted (override with `instance_cache_ttl`)
+INSTANCE_CACHE_TTL = 30
+# States that are about to change, so they are never served from the cache
+TRANSITIONAL_STATES = ('pending', 'stopping', 'shutting-down')
+
+# Interactive menu: seconds between background refreshes of every known
+# environment (override with `menu_refresh_seconds`), and finished
+# background jobs kept on screen
+MENU_REFRESH_SECONDS = 15
+MENU_JOBS_SHOWN = 3
+
+# SSM secrets (web terminal password, ...) cached locally, encrypted, for
+# this many seconds (override with `secrets_cache_ttl`; 0 disables caching)
+SECRETS_CACHE_FILE = CONFIG_DIR / "secrets-cache.json"
+SECRETS_CACHE_TTL = 3600
+
+# Lifecycle polling: start fast, back off while nothing changes
+LIFECYCLE_POLL_INITIAL = 2.0
+LIFECYCLE_POLL_MAX = 15.0
+LIFECYCLE_POLL_BACKOFF = 1.5
+LIFECYCLE_TIMEOUT = 900
+
+# How long an idle SSH master connection is kept open (override with `ssh_control_persist`)
+SSH_CONTROL_PERSIST = '10m'
+SSH_BENCH_RUNS = 5
+# A cached connection path that fails within this many seconds is re-probed
+SSH_RETRY_WINDOW = 15
+# Seconds a resolved connection path is reused (override with `connection_cache_ttl`)
+CONNECTION_CACHE_TTL = 600
+CONNECTION_PROBE_TIMEOUT = 3.0
+# Tags user-data puts on the instance once it has joined the tailnet
+TAILSCALE_HOST_TAG = 'GoldenShellTailscaleHost'
+TAILSCALE_IP_TAG = 'GoldenShellTailscaleIP'
+
+# `goldenshell sync`: local content-hash cache, parallel transfer streams and
+# watch-mode timing
+SYNC_HASH_CACHE_FILE = CONFIG_DIR / "sync-hashes.json"
+SYNC_STREAMS = 4
+SYNC_DEBOUNCE = 1.0
+SYNC_POLL_INTERVAL = 0.5
+SYNC_DEFAULT_EXCLUDES = ('__pycache__', '.venv', 'node_modules', '.DS_Store')
+
+# ttyd tuning per web terminal profile (mirrors local.web_terminal_profiles in
+# main.tf): reconnect after a dropped connection, WebSocket ping interval in
+# seconds and the xterm.js renderer. Pick one with `web_terminal_profile` and
+# override single settings with `web_terminal_<setting>` in config.yaml.
+WEB_TERMINAL_PROFILES = {
+    'lan': {'reconnect': True, 'ping_interval': 30, 'renderer': 'webgl'},
+    'balanced': {'reconnect': True, 'ping_interval': 15, 'renderer': 'webgl'},
+    'mobile': {'reconnect': True, 'ping_interval': 5, 'renderer': 'canvas'},
+}
+WEB_TERMINAL_DEFAULT_PROFILE = 'balanced'
+WEB_TERMINAL_RENDERERS = ('webgl', 'canvas', 'dom')
+WEB_TERMINAL_PORT = 7681
+WEBTERM_BENCH_KEYSTROKES = 20
+WEBTERM_BENCH_BYTES = 1024 * 1024
+
+# Instance types offered by `resize`: vCPUs, memory (GiB), on-demand $/hour in
+# us-east-1 and, for burstable types, the CPU share per vCPU that credits pay for
+INSTANCE_TYPES = {
+    't3.micro': {'vcpus': 2, 'memory': 1, 'hourly': 0.0104, 'baseline': 0.10},
+    't3.small': {'vcpus': 2, 'memory': 2, 'hourly': 0.0208, 'baseline': 0.20},
+    't3.medium': {'vcpus': 2, 'memory': 4, 'hourly': 0.0416, 'baseline': 0.20},
+    't3.large': {'vcpus': 2, 'memory': 8, 'hourly': 0.0832, 'baseline': 0.30},
+    't3.xlarge': {'vcpus': 4, 'memory': 16, 'hourly': 0.1664, 'baseline': 0.40},
+    't3.2xlarge': {'vcpus': 8, 'memory': 32, 'hourly': 0.3328, 'baseline': 0.40},
+    'c6i.large': {'vcpus': 2, 'memory': 4, 'hourly': 0.085, 'baseline': None},
+    'c6i.xlarge': {'vcpus': 4, 'memory': 8, 'hourly': 0.17, 'baseline': None},
+}
+HOURS_PER_MONTH = 730
+# `resize --recommend`: look-back window, metric resolution, percentile, and the
+# utilization the recommended type should run at (leaving headroom)
+RECOMMEND_DAYS = 14
+RECOMMEND_PERIOD = 300
+RECOMMEND_PERCENTILE = 95
+RECOMMEND_CPU_TARGET = 70
+RECOMMEND_MEMORY_TARGET = 80
+
+# Capacity engine (`capacity`, `deploy --vcpus/--memory/--market`): candidates
+# are current-generation types with up to CAPACITY_MAX_OVERSIZE times the
+# vCPUs and memory asked for. Each (type, zone, market) scores its $/hour,
+# raised for spot by its Spot Instance Advisor interruption band (unknown
+# counts as the worst) and for every 100ms of round trip to the region.
+DEFAULT_INSTANCE_TYPE = 't3.medium'
+CAPACITY_MAX_OVERSIZE = 2
+SPOT_INTERRUPTION_BANDS = ('<5%', '5-10%', '10-15%', '15-20%', '>20%')
+CAPACITY_INTERRUPTION_PENALTY = (0.05, 0.10, 0.20, 0.30, 0.50)
+CAPACITY_LATENCY_PENALTY = 0.05
+CAPACITY_PROBE_TIMEOUT = 3
+CAPACITY_SHOWN = 10
+PRICING_API_REGION = 'us-east-1'
+PRICE_CACHE_FILE = CONFIG_DIR / "prices.json"
+PRICE_CACHE_TTL = 7 * 86400
+# Types the Pricing API couldn't price (or a failed call) are retried after this
+PRICE_MISS_TTL = 3600
+# Whether this process has reported a failed Pricing API call (only the first is)
+_pricing_failure_reported = False
+SPOT_ADVISOR_URL = 'https://spot-bid-advisor.s3.amazonaws.com/spot-advisor-data.json'
+SPOT_ADVISOR_CACHE_FILE = CONFIG_DIR / "spot-advisor.json"
+SPOT_ADVISOR_CACHE_TTL = 86400
+
+# `resize --live`: files under /home newer than this marker are copied at the
+# cutover. The replacement keeps its hostname and host keys, and holds
+# tailscaled back until the old instance has let go of the node identity.
+SWAP_MARKER = '/var/tmp/goldenshell-swap-marker'
+SWAP_USER_DATA = """#cloud-config
+preserve_hostname: true
+ssh_deletekeys: false
+bootcmd:
+  - [cloud-init-per, instance, goldenshell-hold-tailscale, systemctl, mask, --runtime, tailscaled.service]
+"""
+# A relaunched spot instance keeps them too; its predecessor is already down,
+# so Tailscale can take over the node identity right away
+RELAUNCH_USER_DATA = """#cloud-config
+preserve_hostname: true
+ssh_deletekeys: false
+"""
+# Either way the old instance is left stopped for a rollback, tagged with the
+# ID of its replacement; `destroy` terminates it along with the replacement
+REPLACED_BY_TAG = 'GoldenShellReplacedBy'
+
+# Warm pool: provisioned, stopped instances that `deploy --env` claims. They
+# are tagged GoldenShellPool=provisioning|ready|claimed; warm_pool_size in
+# config.yaml sets the size per region, capped so the pool spends at most
+# WARM_POOL_BUDGET_SHARE of monthly_budget_limit
+WARM_POOL_TAG = 'GoldenShellPool'
+WARM_POOL_LOG_FILE = CONFIG_DIR / "pool.log"
+WARM_POOL_MAX_AGE_DAYS = 14
+WARM_POOL_BUDGET_SHARE = 0.25
+# Provisioning run time of a pool instance (for its share of the cost) and
+# the root volume size assumed by `pool status` (Terraform's ebs_volume_size)
+WARM_POOL_FILL_MINUTES = 15
+WARM_POOL_DEFAULT_VOLUME_GB = 30
+EBS_GB_MONTH = 0.08
+DEFAULT_MONTHLY_BUDGET = 50
+# Run over SSH on a claimed instance: take the environment's name as hostname
+# and Tailscale name, then print the tailnet name and address
+WARM_POOL_CLAIM_SCRIPT = """set -e
+sudo hostnamectl set-hostname {hostname}
+echo 'preserve_hostname: true' | sudo tee /etc/cloud/cloud.cfg.d/99-goldenshell-hostname.cfg >/dev/null
+sudo tailscale set --hostname={hostname}
+for i in $(seq 10); do
+    sudo tailscale status --json | jq -r .Self.DNSName | grep -q '^{hostname}' && break
+    sleep 1
+done
+sudo tailscale status --json | jq -r '[(.Self.DNSName | rtrimstr(".")), .Self.TailscaleIPs[0]] | @tsv'
+"""
+
+# Maximum number of instance IDs sent in a single EC2 API call
+EC2_BATCH_SIZE = 100
+
+# Per-process boto3 session/client pool (see aws_client)
+AWS_MAX_POOL_CONNECTIONS = 20
+_aws_sessions = {}
+_aws_clients = {}
+_aws_pool_lock = threading.Lock()
+
+
+def process_started_ns():
+    """When this process started, from /proc (Linux, 10ms resolution), else None"""
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time_ns() - int((uptime - start_ticks / os.sysconf('SC_CLK_TCK')) * 1e9)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class Telemetry:
+    """Timing spans for one CLI invocation (--profile and --trace).
+
+    Spans cover start-up, config loads, AWS client builds and API calls,
+    Terraform runs and ssh spawns. They nest per thread. While disabled (the
+    default) a span costs one flag check; enabled, it costs a dict and a list
+    append, so CI wrappers can leave GOLDENSHELL_TRACE set. Exported spans
+    use OpenTelemetry's field names, one JSON object per line.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_id = None
+        self.spans = []
+        self._local = threading.local()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def enable(self):
+        import random
+
+        self.enabled = True
+        self.trace_id = f'{random.getrandbits(128):032x}'
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def begin(self, name, attributes=None, start_ns=None):
+        """Open a span in this thread (a child of its open span); close it with end()"""
+        stack = self._stack()
+        with self._lock:
+            self._next_id += 1
+            span_id = f'{self._next_id:016x}'
+        span = {
+            'name': name,
+            'span_id': span_id,
+            'parent_span_id': stack[-1]['span_id'] if stack else None,
+            'start_time_unix_nano': start_ns or time.time_ns(),
+            'attributes': attributes or {},
+        }
+        stack.append(span)
+        return span
+
+    def end(self, span, error=None, end_ns=None):
+        span['end_time_unix_nano'] = end_ns or time.time_ns()
+        span['status'] = 'ERROR' if error else 'OK'
+        if error:
+            span['attributes']['error'] = str(error) or type(error).__name__
+        stack = self._stack()
+        if span in stack:
+            stack.remove(span)
+        self.spans.append(span)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time the enclosed block; yields the attribute dict so the block can add to it"""
+        if not self.enabled:
+            yield attributes
+            return
+        span = self.begin(name, attributes)
+        try:
+            yield attributes
+        except SystemExit as e:
+            self.end(span, f'exit {e.code}' if e.code else None)
+            raise
+        except BaseException as e:
+            self.end(span, e)
+            raise
+        self.end(span)
+
+    def traced(self, name):
+        """Decorator running each call of a function in a span"""
+        import functools
+
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def instrument_client(self, client, region):
+        """Record a span for every API call made through a boto3 client (retries included)"""
+        service = client.meta.service_model.service_name
+
+        def before_call(model, context, **kwargs):
+            if self.enabled:
+                context['goldenshell_span'] = self.begin(
+                    'aws.call', {'service': service, 'operation': model.name, 'region': region})
+
+        def after_call(context, parsed=None, **kwargs):
+            span = context.pop('goldenshell_span', None)
+            if span:
+                metadata = (parsed or {}).get('ResponseMetadata', {})
+                span['attributes']['http.status_code'] = metadata.get('HTTPStatusCode')
+                span['attributes']['retries'] = metadata.get('RetryAttempts', 0)
+                self.end(span, (parsed or {}).get('Error', {}).get('Code'))
+
+        def after_call_error(context, exception=None, **kwargs):
+            span = context.pop('goldenshell_span', None)
+            if span:
+                self.end(span, exception or 'failed')
+
+        client.meta.events.register('before-call.*.*', before_call)
+        client.meta.events.register('after-call.*.*', after_call)
+        client.meta.events.register('after-call-error.*.*', after_call_error)
+
+    def summary(self, root):
+        """Human-readable breakdown: time per span name, under the command's wall time"""
+        wall = (root['end_time_unix_nano'] - root['start_time_unix_nano']) / 1e9
+        groups = {}
+        for span in self.spans:
+            if span is root:
+                continue
+            attributes = span['attributes']
+            key = span['name']
+            if span['name'] == 'aws.call':
+                key = f"aws {attributes['service']}.{attributes['operation']} ({attributes['region']})"
+            elif 'detail' in attributes:
+                key = f"{span['name']} {attributes['detail']}"
+            seconds = (span['end_time_unix_nano'] - span['start_time_unix_nano']) / 1e9
+            count, total, longest, errors = groups.get(key, (0, 0.0, 0.0, 0))
+            groups[key] = (count + 1, total + seconds, max(longest, seconds),
+                           errors + (span['status'] == 'ERROR'))
+
+        lines = [click.style(f"Profile: goldenshell {root['attributes']['command']} took {wall:.3f}s", bold=True),
+                 f"  {'Span':52} {'Calls':>5} {'Total':>9} {'Max':>9}"]
+        for key, (count, total, longest, errors) in sorted(groups.items(), key=lambda item: -item[1][1]):
+            line = f"  {key[:52]:52} {count:5} {total:8.3f}s {longest:8.3f}s"
+            lines.append(line + (click.style(f'  {errors} failed', fg='red') if errors else ''))
+        lines.append('  (spans in parallel threads overlap, so totals can exceed the wall time)')
+        return '\n'.join(lines)
+
+    def export(self, path, resource):
+        """Append every span to `path` as JSON lines"""
+        with open(path, 'a') as f:
+            for span in self.spans:
+                f.write(json.dumps({'trace_id': self.trace_id, **span, 'resource': resource}) + '\n')
+
+
+telemetry = Telemetry()
+
+
+# Layout version of config.yaml, stored in it as `schema_version`
+CONFIG_SCHEMA_VERSION = 1
+
+
+def _config_v1(config):
+    """Unversioned config.yaml (written before schema_version existed): same layout"""
+    return config
+
+
+# CONFIG_MIGRATIONS[n] upgrades a version-n config to version n + 1
+CONFIG_MIGRATIONS = [_config_v1]
+
+
+def migrate_config(config):
+    """Upgrade a parsed config.yaml to CONFIG_SCHEMA_VERSION, without the version key"""
+    version = config.pop('schema_version', 0)
+    if version > CONFIG_SCHEMA_VERSION:
+        raise click.ClickException(f'{CONFIG_FILE} was written by a newer GoldenShell '
+                                   f'(schema version {version}); update goldenshell.py')
+    for migrate in CONFIG_MIGRATIONS[version:]:
+        config = migrate(config)
+    return config
+
+
+@contextmanager
+def config_lock(exclusive=False):
+    """Hold the config lock: shared to read, exclusive to read-modify-write"""
+    try:
+        import fcntl
+    except ImportError:
+        # No advisory locks (Windows); writes are still atomic
+        yield
+        return
+    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    with open(CONFIG_LOCK_FILE, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
 
 
 class Config:
-    """Manage GoldenShell configuration"""
+    """Manage GoldenShell configuration.
+
+    config.yaml stays the file to read and edit. Loads come from a JSON copy
+    (config.json) while config.yaml's size, mtime and inode match the ones
+    recorded there, so YAML is only parsed after config.yaml changes. Saves
+    take the exclusive lock, re-read the file and apply only the keys (and
+    environments) this process changed, so concurrent commands don't undo
+    each other's updates; both files are replaced atomically.
+    """
 
     def __init__(self):
+        import copy
+
         self.config_dir = CONFIG_DIR
         self.config_file = CONFIG_FILE
         self.config = self._load_config()
+        self._loaded = copy.deepcopy(self.config)
 
     def _load_config(self):
         """Load configuration from file"""
-        if self.config_file.exists():
-            with open(self.config_file, 'r') as f:
-                return yaml.safe_load(f) or {}
-        return {}
+        if not self.config_file.exists():
+            return {}
+        with telemetry.span('config.load'), config_lock():
+            return self._read()
+
+    def _source_stamp(self):
+        stat = os.stat(self.config_file)
+        return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+    def _read(self):
+        """The saved configuration, from config.json if config.yaml hasn't changed"""
+        try:
+            source = self._source_stamp()
+        except FileNotFoundError:
+            return {}
+        cached = read_json(CONFIG_CACHE_FILE, {})
+        if cached.get('source') == source and cached.get('schema_version') == CONFIG_SCHEMA_VERSION:
+            return cached['config']
+
+        import yaml
+
+        with telemetry.span('config.parse_yaml'), open(self.config_file, 'r') as f:
+            config = migrate_config(yaml.safe_load(f) or {})
+        self._write_cache(config, source)
+        return config
+
+    def _write_atomic(self, path, text):
+        tmp_file = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp_file, 'w') as f:
+            f.write(text)
+        # Set secure permissions (owner read/write only)
+        os.chmod(tmp_file, 0o600)
+        os.replace(tmp_file, path)
+
+    def _write_cache(self, config, source):
+        try:
+            text = json.dumps({'schema_version': CONFIG_SCHEMA_VERSION, 'source': source, 'config': config})
+            self._write_atomic(CONFIG_CACHE_FILE, text)
+        except (OSError, TypeError, ValueError):
+            # Values JSON can't hold (e.g. YAML dates) just mean no fast path
+            pass
+
+    def _merge(self, saved):
+        """Apply the changes made since loading to `saved`, per key and per environment"""
+        merged = dict(saved)
+        for key in self._loaded.keys() - self.config.keys():
+            merged.pop(key, None)
+        for key, value in self.config.items():
+            if key == 'environments' and isinstance(value, dict):
+                loaded = self._loaded.get(key) or {}
+                environments = dict(merged.get(key) or {})
+                for name in loaded.keys() - value.keys():
+                    environments.pop(name, None)
+                environments.update({name: deployment for name, deployment in value.items()
+                                     if loaded.get(name) != deployment})
+                merged[key] = environments
+            elif key not in self._loaded or self._loaded[key] != value:
+                merged[key] = value
+        return merged
 
     def save(self):
         """Save configuration to file"""
+        import copy
+        import yaml
+
         self.config_dir.mkdir(parents=True, exist_ok=True)
-        with open(self.config_file, 'w') as f:
-            yaml.dump(self.config, f, default_flow_style=False)
-        # Set secure permissions (owner read/write only)
-        os.chmod(self.config_file, 0o600)
+        with config_lock(exclusive=True):
+            config = self._merge(self._read())
+            self._write_atomic(self.config_file, yaml.dump(
+                {'schema_version': CONFIG_SCHEMA_VERSION, **config}, default_flow_style=False))
+            self._write_cache(config, self._source_stamp())
+        self.config = config
+        self._loaded = copy.deepcopy(config)
 
     def get(self, key, default=None):
         """Get configuration value"""
@@ -49,6 +539,8 @@ class Config:
 
     def display(self):
         """Display current configuration (masking sensitive values)"""
+        import yaml
+
         display_config = self.config.copy()
 
         # Mask sensitive values
@@ -61,9 +553,3906 @@ class Config:
 
         return yaml.dump(display_config, default_flow_style=False)
 
+    def environments(self):
+        """Get the named environment registry"""
+        return self.config.get('environments') or {}
+
+    def set_environment(self, name, deployment):
+        """Register (or replace) a named environment"""
+        environments = self.environments()
+        environments[name] = deployment
+        self.config['environments'] = environments
+
+    def remove_environment(self, name):
+        """Remove a named environment, returning True if it existed"""
+        environments = self.environments()
+        if name not in environments:
+            return False
+        del environments[name]
+        self.config['environments'] = environments
+        return True
+
+
+def read_json(path, default=None):
+    """Read a JSON file, returning `default` if it's missing or corrupt"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json_atomic(path, data):
+    """Write a JSON file via write-and-rename so readers never see a partial file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(data, f)
+    # Set secure permissions (owner read/write only)
+    os.chmod(tmp_file, 0o600)
+    os.replace(tmp_file, path)
+
+
+class InstanceCache:
+    """Local cache of instance metadata (state, type, public IP) with a TTL"""
+
+    def __init__(self, ttl=INSTANCE_CACHE_TTL):
+        self.cache_file = INSTANCE_CACHE_FILE
+        self.ttl = ttl
+        self.entries = self._load()
+
+    def _load(self):
+        """Load cached entries from file"""
+        return read_json(self.cache_file, {})
+
+    def save(self):
+        """Atomically write the cache to file"""
+        write_json_atomic(self.cache_file, self.entries)
+
+    def get(self, instance_id):
+        """Get a cached entry if it is fresh and not mid-transition, else None"""
+        entry = self.entries.get(instance_id)
+        if not entry or entry.get('state') in TRANSITIONAL_STATES:
+            return None
+        if time.time() - entry.get('fetched_at', 0) > self.ttl:
+            return None
+        return entry
+
+    def update(self, instance):
+        """Store the metadata of a describe_instances result"""
+        entry = {
+            'state': instance['State']['Name'],
+            'instance_type': instance.get('InstanceType'),
+            'public_ip': instance.get('PublicIpAddress'),
+            'tags': {t['Key']: t['Value'] for t in instance.get('Tags', [])},
+            'hibernation': (instance.get('HibernationOptions') or {}).get('Configured', False),
+            'hibernated': (instance.get('StateReason') or {}).get('Code') == HIBERNATE_STATE_REASON,
+            'spot': instance.get('InstanceLifecycle') == 'spot',
+            'interrupted': (instance.get('StateReason') or {}).get('Code') == SPOT_INTERRUPTED_STATE_REASON,
+            'zone': (instance.get('Placement') or {}).get('AvailabilityZone'),
+            'fetched_at': time.time(),
+        }
+        self.entries[instance['InstanceId']] = entry
+        return entry
+
+    def set_state(self, instance_id, state, hibernated=None):
+        """Record a state change made by one of our own API calls"""
+        entry = self.entries.setdefault(instance_id, {})
+        entry['state'] = state
+        entry['fetched_at'] = time.time()
+        entry['interrupted'] = False
+        if hibernated is not None:
+            entry['hibernated'] = hibernated
+        if state != 'running':
+            # Public IPs are released on stop and reassigned on start
+            entry['public_ip'] = None
+
+    def invalidate(self, instance_id):
+        """Forget an instance so the next lookup goes to EC2"""
+        self.entries.pop(instance_id, None)
+
+
+def instance_cache(config):
+    """Create an InstanceCache using the configured TTL"""
+    return InstanceCache(ttl=config.get('instance_cache_ttl', INSTANCE_CACHE_TTL))
+
+
+def _keystream_xor(key, nonce, data):
+    """XOR `data` with HMAC-SHA256(key, nonce + counter) blocks, a PRF in counter mode"""
+    import hmac
+    import hashlib
+
+    out = bytearray()
+    for offset in range(0, len(data), 32):
+        block = hmac.new(key, nonce + (offset // 32).to_bytes(8, 'big'), hashlib.sha256).digest()
+        out += bytes(a ^ b for a, b in zip(data[offset:offset + 32], block))
+    return bytes(out)
+
+
+class SecretStore:
+    """SSM secrets under a prefix, fetched with one get_parameters_by_path call.
+
+    Decrypted values are cached in SECRETS_CACHE_FILE for `ttl` seconds,
+    encrypted (counter-mode keystream, then an HMAC tag) with keys derived
+    from the AWS secret key. That keeps the values out of backups and casual
+    reads of the file and makes entries from old credentials unreadable, but
+    it is no protection from anyone who can also read the secret key (e.g.
+    in config.yaml): they could fetch the secrets from SSM anyway.
+
+    Each entry records the parameters' versions. Past the TTL they are
+    checked with describe_parameters, which needs no decryption, and the
+    values are only refetched if one changed. Deploys and destroys call
+    invalidate(), since they may rotate secrets; callers whose login with a
+    cached value fails pass refresh=True.
+    """
+
+    def __init__(self, config, ttl=None):
+        self.config = config
+        self.cache_file = SECRETS_CACHE_FILE
+        self.ttl = config.get('secrets_cache_ttl', SECRETS_CACHE_TTL) if ttl is None else ttl
+        self.entries = read_json(self.cache_file, {})
+
+    def _keys(self):
+        """(encryption key, MAC key), or None without credentials"""
+        import hmac
+        import hashlib
+
+        credentials = aws_session(self.config).get_credentials()
+        if credentials is None:
+            return None
+        master = hashlib.sha256(credentials.get_frozen_credentials().secret_key.encode()).digest()
+        return (hmac.new(master, b'goldenshell secrets: encrypt', hashlib.sha256).digest(),
+                hmac.new(master, b'goldenshell secrets: authenticate', hashlib.sha256).digest())
+
+    def _decrypt(self, entry, keys):
+        """The cached values, or None if the entry is corrupt or from other credentials"""
+        import hmac
+        import base64
+        import hashlib
+
+        try:
+            nonce, data, tag = (base64.b64decode(entry[field]) for field in ('nonce', 'data', 'tag'))
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not hmac.compare_digest(tag, hmac.new(keys[1], nonce + data, hashlib.sha256).digest()):
+            return None
+        return json.loads(_keystream_xor(keys[0], nonce, data))
+
+    def _encrypt(self, values, keys):
+        import hmac
+        import base64
+        import hashlib
+
+        nonce = os.urandom(16)
+        data = _keystream_xor(keys[0], nonce, json.dumps(values).encode())
+        tag = hmac.new(keys[1], nonce + data, hashlib.sha256).digest()
+        return {field: base64.b64encode(value).decode()
+                for field, value in (('nonce', nonce), ('data', data), ('tag', tag))}
+
+    @staticmethod
+    def _version(parameter):
+        """What identifies a parameter's current value: [Version, LastModifiedDate]"""
+        modified = parameter.get('LastModifiedDate')
+        return [parameter.get('Version'), modified.isoformat() if hasattr(modified, 'isoformat') else modified]
+
+    def _versions(self, ssm, prefix):
+        """{name: version} of the parameters directly under `prefix`, without their values"""
+        paginator = ssm.get_paginator('describe_parameters')
+        filters = [{'Key': 'Path', 'Option': 'OneLevel', 'Values': [prefix]}]
+        return {parameter['Name'].rsplit('/', 1)[1]: self._version(parameter)
+                for page in paginator.paginate(ParameterFilters=filters)
+                for parameter in page['Parameters']}
+
+    def get_all(self, prefix, region=None, refresh=False):
+        """{name: value} for every parameter directly under `prefix`"""
+        region = region or self.config.get('aws_region')
+        cache_key = f'{region}:{prefix}'
+        keys = self._keys()
+        entry = self.entries.get(cache_key)
+        cached = None
+        if keys and entry and not refresh and self.ttl > 0:
+            with telemetry.span('secrets.cache_read'):
+                cached = self._decrypt(entry, keys)
+            if not isinstance(cached, dict) or 'values' not in cached:
+                cached = None
+            elif time.time() - entry.get('fetched_at', 0) < self.ttl:
+                return cached['values']
+
+        ssm = aws_client(self.config, 'ssm', region)
+        if cached is not None and self._versions(ssm, prefix) == cached.get('versions'):
+            # Unchanged since they were fetched: keep them another TTL
+            entry['fetched_at'] = time.time()
+            write_json_atomic(self.cache_file, self.entries)
+            return cached['values']
+
+        values, versions = {}, {}
+        paginator = ssm.get_paginator('get_parameters_by_path')
+        for page in paginator.paginate(Path=prefix, WithDecryption=True, Recursive=False):
+            for parameter in page['Parameters']:
+                name = parameter['Name'].rsplit('/', 1)[1]
+                values[name] = parameter['Value']
+                versions[name] = self._version(parameter)
+        if keys and self.ttl > 0:
+            self.entries[cache_key] = {'fetched_at': time.time(),
+                                       **self._encrypt({'values': values, 'versions': versions}, keys)}
+            write_json_atomic(self.cache_file, self.entries)
+        return values
+
+    def get(self, prefix, name, region=None, refresh=False):
+        """One secret under `prefix` (RuntimeError if it doesn't exist)"""
+        values = self.get_all(prefix, region, refresh=refresh)
+        if name not in values and not refresh:
+            # Maybe created since the cache was filled
+            values = self.get_all(prefix, region, refresh=True)
+        if name not in values:
+            raise RuntimeError(f'SSM parameter {prefix}/{name} not found')
+        return values[name]
+
+    def invalidate(self):
+        """Forget every cached secret"""
+        self.entries = {}
+        try:
+            os.unlink(self.cache_file)
+        except FileNotFoundError:
+            pass
+
+
+def lookup_instances(config, region, instance_ids, cache, refresh=False):
+    """Get cached metadata for instances, describing only stale or missing ones.
+
+    Returns a dict of instance_id -> entry (see InstanceCache.update).
+    Instances EC2 doesn't know about are left out. The cache is saved if
+    anything was fetched.
+    """
+    found = {}
+    stale = []
+    for instance_id in instance_ids:
+        entry = None if refresh else cache.get(instance_id)
+        if entry:
+            found[instance_id] = entry
+        else:
+            stale.append(instance_id)
+
+    if stale:
+        ec2 = aws_client(config, 'ec2', region)
+        for instance_id, instance in describe_instances_batched(ec2, stale).items():
+            found[instance_id] = cache.update(instance)
+        for instance_id in stale:
+            if instance_id not in found:
+                cache.invalidate(instance_id)
+        cache.save()
+
+    return found
+
+
+def aws_credentials(config):
+    """Get the (access key, secret key) pair from config, or (None, None) for the default chain"""
+    return config.get('aws_access_key_id'), config.get('aws_secret_access_key')
+
+
+def aws_session(config):
+    """Get the shared boto3 session for the configured credentials.
+
+    The session owns botocore's loader, so service models are parsed once per
+    process no matter how many clients or regions are used.
+    """
+    key = aws_credentials(config)
+    with _aws_pool_lock:
+        session = _aws_sessions.get(key)
+        if session is None:
+            with telemetry.span('aws.session'):
+                import boto3
+
+                session = boto3.Session(aws_access_key_id=key[0], aws_secret_access_key=key[1])
+            _aws_sessions[key] = session
+        return session
+
+
+def aws_client(config, service, region=None):
+    """Get a pooled boto3 client keyed by (service, region, credentials).
+
+    Clients are created lazily on first use and reused by every command in
+    the process (including each selection in the interactive menu). They
+    keep HTTP connections alive between calls.
+    """
+    region = region or config.get('aws_region')
+    key = (service, region) + aws_credentials(config)
+    client = _aws_clients.get(key)
+    if client is not None:
+        return client
+
+    session = aws_session(config)
+    with _aws_pool_lock:
+        client = _aws_clients.get(key)
+        if client is None:
+            with telemetry.span('aws.client', service=service, region=region):
+                from botocore.config import Config as BotoConfig
+
+                client = session.client(service, region_name=region, config=BotoConfig(
+                    max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+                    tcp_keepalive=True,
+                ))
+            telemetry.instrument_client(client, region)
+            _aws_clients[key] = client
+        return client
+
+
+def reset_aws_pool():
+    """Drop all pooled sessions and clients (e.g. after credentials change)"""
+    with _aws_pool_lock:
+        _aws_sessions.clear()
+        _aws_clients.clear()
+
+
+def stop_instances(ec2, instance_ids, hibernate=False):
+    """Stop instances with one call, hibernating them if asked.
+
+    EC2 rejects the whole hibernate request if an instance can't hibernate
+    (not enabled at launch, or its hibernation agent isn't ready yet after
+    boot); the instances are then stopped normally. Returns (state changes,
+    whether they hibernate).
+    """
+    from botocore.exceptions import ClientError
+
+    if hibernate:
+        try:
+            return ec2.stop_instances(InstanceIds=instance_ids, Hibernate=True)['StoppingInstances'], True
+        except ClientError as e:
+            if e.response['Error']['Code'] not in HIBERNATE_FALLBACK_ERRORS:
+                raise
+            click.echo(click.style(f"Can't hibernate ({e.response['Error']['Message']}); stopping normally",
+                                   fg='yellow'))
+    return ec2.stop_instances(InstanceIds=instance_ids)['StoppingInstances'], False
+
+
+def note_start(modes):
+    """Remember when instances were started and whether they resume ({instance_id: 'resume'|'boot'})"""
+    times = read_json(START_TIMES_FILE, {})
+    pending = times.setdefault('pending', {})
+    for instance_id, mode in modes.items():
+        pending[instance_id] = {'mode': mode, 'at': time.time()}
+    write_json_atomic(START_TIMES_FILE, times)
+
+
+def record_start_ready(instance_id):
+    """Record the seconds from note_start() until SSH answered, if a start was noted"""
+    times = read_json(START_TIMES_FILE, {})
+    start = times.get('pending', {}).pop(instance_id, None)
+    if start is None:
+        return None
+    seconds = time.time() - start['at']
+    if seconds > START_TIMES_MAX_WAIT:
+        write_json_atomic(START_TIMES_FILE, times)
+        return None
+    history = times.setdefault('history', {}).setdefault(instance_id, [])
+    history.append({'mode': start['mode'], 'seconds': round(seconds, 1), 'at': int(time.time())})
+    del history[:-START_TIMES_KEPT]
+    write_json_atomic(START_TIMES_FILE, times)
+    return seconds
+
+
+def start_time_summary(instance_id):
+    """Median start-to-SSH seconds and sample count per mode: {'resume': (median, n), ...}"""
+    import statistics
+
+    history = read_json(START_TIMES_FILE, {}).get('history', {}).get(instance_id, [])
+    summary = {}
+    for mode in ('resume', 'boot'):
+        seconds = [start['seconds'] for start in history if start['mode'] == mode]
+        if seconds:
+            summary[mode] = (statistics.median(seconds), len(seconds))
+    return summary
+
+
+def select_environments(config, env_names, all_envs):
+    """Resolve --env/--all selectors into a list of (name, deployment) pairs"""
+    environments = config.environments()
+
+    if all_envs:
+        selected = list(environments.items())
+    else:
+        missing = [name for name in env_names if name not in environments]
+        if missing:
+            raise click.BadParameter(
+                f"Unknown environment(s): {', '.join(missing)}. "
+                'Run "goldenshell env list" to see registered environments.',
+                param_hint="'--env'"
+            )
+        selected = [(name, environments[name]) for name in env_names]
+
+    return [(name, dep) for name, dep in selected if dep and dep.get('instance_id')]
+
+
+def group_by_region(config, selected):
+    """Group (name, deployment) pairs by AWS region"""
+    by_region = {}
+    for name, deployment in selected:
+        region = deployment.get('region') or config.get('aws_region')
+        by_region.setdefault(region, []).append((name, deployment))
+    return by_region
+
+
+def chunked(items, size=EC2_BATCH_SIZE):
+    """Split a list into chunks of at most `size` items"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def describe_instances_batched(ec2, instance_ids):
+    """Describe many instances with one paginated call per chunk of IDs.
+
+    Uses an instance-id filter rather than InstanceIds so that a single
+    terminated or unknown instance doesn't fail the whole batch.
+    """
+    instances = {}
+    paginator = ec2.get_paginator('describe_instances')
+    for chunk in chunked(list(instance_ids)):
+        pages = paginator.paginate(Filters=[{'Name': 'instance-id', 'Values': chunk}])
+        for page in pages:
+            for reservation in page['Reservations']:
+                for instance in reservation['Instances']:
+                    instances[instance['InstanceId']] = instance
+    return instances
+
+
+def state_color(state):
+    """Pick a display color for an instance state"""
+    return 'green' if state == 'running' else 'yellow' if state == 'stopped' else 'red'
+
+
+def format_minutes(seconds):
+    """Format a duration as e.g. 45s, 12m or 2h05m"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+def describe_idle(tags, now=None):
+    """Summarize the idle monitor's GoldenShellIdle tag, or None if there isn't one.
+
+    The tag looks like "last_active=<epoch>;threshold=<s>;activity=cpu,disk;updated=<epoch>".
+    """
+    value = (tags or {}).get(IDLE_TAG)
+    if not value:
+        return None
+    try:
+        fields = dict(part.split('=', 1) for part in value.split(';'))
+        last_active = int(fields['last_active'])
+        threshold = int(fields['threshold'])
+        updated = int(fields['updated'])
+    except (KeyError, ValueError):
+        return None
+
+    now = now or time.time()
+    activity = fields.get('activity', 'none')
+    if activity != 'none':
+        summary = f"active ({activity.replace(',', ', ')})"
+    else:
+        idle = now - last_active
+        if threshold <= 0:
+            summary = f"idle {format_minutes(idle)} (auto-stop disabled)"
+        else:
+            summary = f"idle {format_minutes(idle)} of {format_minutes(threshold)}"
+            if idle < threshold:
+                summary += f", auto-stop in {format_minutes(threshold - idle)}"
+    if now - updated > IDLE_TAG_STALE:
+        summary += f" (last report {format_minutes(now - updated)} ago)"
+    return summary
+
+
+def fleet_status(config, selected, refresh=False):
+    """Print the status of several environments, one describe call per region chunk"""
+    cache = instance_cache(config)
+
+    click.echo(click.style('Fleet Status:', fg='cyan', bold=True))
+    click.echo(f"{'Environment':20} {'Instance ID':21} {'State':13} {'Type':12} {'Public IP':16} Idle")
+
+    for region, members in group_by_region(config, selected).items():
+        instances = lookup_instances(config, region, [dep['instance_id'] for _, dep in members],
+                                     cache, refresh=refresh)
+
+        for name, deployment in members:
+            instance = instances.get(deployment['instance_id']) or {}
+            state = instance.get('state', 'not-found')
+            note = ((state == 'running' and describe_idle(instance.get('tags')))
+                    or ('spot interruption' if instance.get('interrupted') else '-'))
+            click.echo(
+                f"{name:20} {deployment['instance_id']:21} "
+                f"{click.style(f'{state:13}', fg=state_color(state))} "
+                f"{instance.get('instance_type') or 'N/A':12} "
+                f"{instance.get('public_ip') or 'N/A':16} "
+                f"{note}"
+            )
+
+
+def fleet_transition(config, selected, action, refresh=False, hibernate=False):
+    """Start or stop several environments with batched EC2 calls per region.
+
+    `action` is 'start' or 'stop'. Instances already in (or moving to) the
+    target state are skipped, everything else is sent in chunks of
+    EC2_BATCH_SIZE IDs. With `hibernate`, instances launched with hibernation
+    are hibernated and the rest stopped normally. Spot instances stopped by
+    an interruption can't be started, so they are relaunched elsewhere.
+    """
+    skip_states = {
+        'start': ('running', 'pending'),
+        'stop': ('stopped', 'stopping'),
+    }[action]
+    cache = instance_cache(config)
+    failures = 0
+    transitioned = []
+    interrupted = []
+
+    for region, members in group_by_region(config, selected).items():
+        ec2 = aws_client(config, 'ec2', region)
+        instances = lookup_instances(config, region, [dep['instance_id'] for _, dep in members],
+                                     cache, refresh=refresh)
+
+        pending = []
+        for name, deployment in members:
+            instance = instances.get(deployment['instance_id'])
+            if not instance:
+                click.echo(click.style(f'{name}: instance not found', fg='yellow'))
+                continue
+            state = instance['state']
+            if state in skip_states:
+                click.echo(f'{name}: already {state}')
+                continue
+            if action == 'start' and instance.get('interrupted'):
+                interrupted.append((name, deployment))
+                continue
+            if hibernate and not instance.get('hibernation'):
+                click.echo(f'{name}: hibernation not enabled, stopping normally')
+            pending.append((name, deployment))
+
+        # One hibernate request can't include instances that don't support it
+        batches = []
+        for hibernating in (True, False):
+            group = [(name, deployment) for name, deployment in pending
+                     if bool(hibernate and instances[deployment['instance_id']].get('hibernation')) == hibernating]
+            batches += [(chunk, hibernating) for chunk in chunked(group)]
+
+        for chunk, hibernating in batches:
+            ids = [deployment['instance_id'] for _, deployment in chunk]
+            hibernated = None
+            try:
+                if action == 'start':
+                    note_start({i: 'resume' if instances[i].get('hibernated') else 'boot' for i in ids})
+                    response = ec2.start_instances(InstanceIds=ids)
+                    changes = response['StartingInstances']
+                else:
+                    changes, hibernated = stop_instances(ec2, ids, hibernate=hibernating)
+            except Exception as e:
+                failures += len(chunk)
+                for name, deployment in chunk:
+                    cache.invalidate(deployment['instance_id'])
+                    click.echo(click.style(f'{name}: error: {str(e)}', fg='red'))
+                continue
+
+            new_states = {c['InstanceId']: c['CurrentState']['Name'] for c in changes}
+            if action == 'stop':
+                connections = load_connection_cache()
+                for _, deployment in chunk:
+                    close_ssh_masters(config, deployment, cache, connections)
+            forget_connection(*(deployment['instance_id'] for _, deployment in chunk))
+            for name, deployment in chunk:
+                state = new_states.get(deployment['instance_id'], 'unknown')
+                cache.set_state(deployment['instance_id'], state, hibernated=hibernated)
+                click.echo(f"{name}: {click.style(state, fg=state_color(state))}"
+                           + (' (hibernating)' if hibernated else ''))
+            transitioned += chunk
+
+        cache.save()
+
+    if interrupted:
+        click.echo(f'{len(interrupted)} spot instance(s) lost their capacity; relaunching them...')
+        failures += relaunch_interrupted(config, interrupted)
+    return failures, transitioned
+
+
+def run_fleet_command(config, command, env_names, all_envs, refresh=False, wait=False, hibernate=False):
+    """Run status/start/stop against the environments picked by --env/--all"""
+    selected = select_environments(config, env_names, all_envs)
+    if not selected:
+        click.echo(click.style('No matching environments found.', fg='yellow'))
+        return
+
+    try:
+        if command == 'status':
+            fleet_status(config, selected, refresh=refresh)
+            return
+
+        click.echo(f"{'Starting' if command == 'start' else 'Stopping'} {len(selected)} environment(s)...")
+        failures, transitioned = fleet_transition(config, selected, command, refresh=refresh,
+                                                  hibernate=hibernate)
+        if wait and transitioned:
+            click.echo(f"\nWaiting for {len(transitioned)} environment(s)...")
+            action = 'wait-running' if command == 'start' else 'wait-stopped'
+            failures += run_lifecycle(config, action, transitioned, wait_ready=True)
+    except Exception as e:
+        click.echo(click.style(f'Error: {str(e)}', fg='red'))
+        sys.exit(1)
+
+    if failures:
+        click.echo(click.style(f'\n✗ {failures} environment(s) failed', fg='red'))
+        sys.exit(1)
+    click.echo(click.style('\n✓ Done!', fg='green'))
+
+
+def ssh_key_file(config):
+    """Path of the private key for the configured EC2 key pair"""
+    return os.path.expanduser(f"~/.ssh/{config.get('ssh_key_name', 'goldenshell-key')}.pem")
+
+
+def known_public_ip(config, deployment, cache=None):
+    """Most recent public IP of a deployment: the instance cache's, else the one saved at deploy"""
+    entry = (cache or InstanceCache()).entries.get(deployment.get('instance_id')) or {}
+    if 'public_ip' in entry:
+        return entry['public_ip']
+    return deployment.get('public_ip')
+
+
+def ssh_command(config, host, key_file=None, multiplex=True, batch=False, proxy_command=None):
+    """Build an ssh command line for ubuntu@host.
+
+    With `multiplex`, every invocation for the same host shares one master
+    connection (ControlMaster/ControlPersist), so only the first pays for the
+    TCP and key exchange. `batch` never prompts and accepts new host keys.
+    """
+    command = ['ssh']
+    if proxy_command:
+        command += ['-o', f'ProxyCommand={proxy_command}']
+    if multiplex:
+        SSH_CONTROL_DIR.mkdir(parents=True, exist_ok=True, mode=0o700)
+        command += [
+            '-o', 'ControlMaster=auto',
+            '-o', f'ControlPath={ssh_control_path(host)}',
+            '-o', f"ControlPersist={config.get('ssh_control_persist', SSH_CONTROL_PERSIST)}",
+            # Drop a master whose instance went away instead of hanging on it
+            '-o', 'ServerAliveInterval=15',
+            '-o', 'ServerAliveCountMax=3',
+        ]
+    else:
+        command += ['-o', 'ControlMaster=no', '-o', 'ControlPath=none']
+    if batch:
+        command += ['-o', 'BatchMode=yes', '-o', 'ConnectTimeout=10',
+                    '-o', 'StrictHostKeyChecking=accept-new']
+    if key_file:
+        command += ['-i', key_file]
+    return command + [f'ubuntu@{host}']
+
+
+def ssh_control_path(host):
+    """Socket of the master connection for ubuntu@host (hashed to stay under the socket path limit)"""
+    import hashlib
+
+    return SSH_CONTROL_DIR / hashlib.sha1(f'ubuntu@{host}'.encode()).hexdigest()[:20]
+
+
+@telemetry.traced('ssh.control')
+def ssh_control(config, host, operation):
+    """Send a control command ('check' or 'exit') to the master for host; returns the exit code"""
+    import subprocess
+
+    command = ssh_command(config, host)
+    result = subprocess.run(command[:-1] + ['-O', operation, command[-1]],
+                            stdin=subprocess.DEVNULL, capture_output=True)
+    return result.returncode
+
+
+@telemetry.traced('ssh.master')
+def warm_ssh_master(config, host, key_file=None, timeout=30):
+    """Open the master connection for host unless one is already up; returns True if it is"""
+    import subprocess
+
+    if ssh_control(config, host, 'check') == 0:
+        return True
+    try:
+        # The master stays in the background holding whatever stdout/stderr it
+        # was given, so never hand it a pipe we'd wait on
+        result = subprocess.run(ssh_command(config, host, key_file, batch=True) + ['true'],
+                                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return False
+    return result.returncode == 0
+
+
+def close_ssh_masters(config, deployment, cache=None, connections=None):
+    """Close any master connections to a deployment's hosts (e.g. before it stops)
+
+    Pass the instance and connection caches when closing for several
+    deployments so they are read once. Only hosts with a live control socket
+    cost an ssh process.
+    """
+    if connections is None:
+        connections = load_connection_cache()
+    hosts = {known_public_ip(config, deployment, cache), deployment.get('tailscale_hostname'),
+             (connections.get(deployment.get('instance_id')) or {}).get('host')}
+    for host in hosts:
+        if host and ssh_control_path(host).exists():
+            ssh_control(config, host, 'exit')
+
+
+def load_connection_cache():
+    """Resolved connection paths by instance ID (see resolve_connection)"""
+    return read_json(CONNECTION_CACHE_FILE, {})
+
+
+def forget_connection(*instance_ids):
+    """Drop the cached connection paths of instances, e.g. when their public IPs change"""
+    cache = load_connection_cache()
+    dropped = [cache.pop(instance_id, None) for instance_id in instance_ids]
+    if any(entry is not None for entry in dropped):
+        write_json_atomic(CONNECTION_CACHE_FILE, cache)
+
+
+def connection_candidates(deployment, instance):
+    """Endpoints an instance can be reached on, from its cache entry's tags and public IP"""
+    tags = instance.get('tags') or {}
+    candidates = []
+    tailscale = (tags.get(TAILSCALE_IP_TAG) or tags.get(TAILSCALE_HOST_TAG)
+                 or deployment.get('tailscale_hostname'))
+    if tailscale:
+        candidates.append({'method': 'tailscale', 'host': tailscale})
+    if instance.get('public_ip'):
+        candidates.append({'method': 'public-ip', 'host': instance['public_ip']})
+    candidates.append({'method': 'ssm', 'host': deployment['instance_id']})
+    return candidates
+
+
+async def probe_ssh_endpoint(host, timeout):
+    """Seconds until host:22 sends an SSH banner"""
+    import asyncio
+
+    started = time.monotonic()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, 22), timeout)
+    try:
+        banner = await asyncio.wait_for(reader.readline(), timeout)
+    finally:
+        writer.close()
+    if not banner.startswith(b'SSH-'):
+        raise ConnectionError('no SSH banner')
+    return time.monotonic() - started
+
+
+def check_ssm_endpoint(config, region, instance_id):
+    """Raise unless an SSH-over-Session-Manager connection to the instance can work"""
+    import shutil
+
+    if not shutil.which('aws') or not shutil.which('session-manager-plugin'):
+        raise RuntimeError('needs the AWS CLI and session-manager-plugin')
+    ssm = aws_client(config, 'ssm', region)
+    info = ssm.describe_instance_information(
+        Filters=[{'Key': 'InstanceIds', 'Values': [instance_id]}])['InstanceInformationList']
+    if not info or info[0].get('PingStatus') != 'Online':
+        raise RuntimeError('SSM agent is not online')
+
+
+def probe_connections(config, region, candidates, timeout=CONNECTION_PROBE_TIMEOUT):
+    """Probe all candidates at once and return (winner or None, {method: result}).
+
+    All probes start together, so the first SSH banner to arrive comes from
+    the lowest-latency path and wins immediately. Session Manager has no
+    comparable latency and only wins when no SSH path answers.
+    """
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    # A dedicated pool so a slow SSM check doesn't hold up the winner
+    pool = ThreadPoolExecutor(max_workers=1)
+    results = {}
+
+    async def probe(candidate):
+        if candidate['method'] == 'ssm':
+            started = time.monotonic()
+            await asyncio.get_running_loop().run_in_executor(
+                pool, check_ssm_endpoint, config, region, candidate['host'])
+            return time.monotonic() - started
+        return await probe_ssh_endpoint(candidate['host'], timeout)
+
+    async def race():
+        tasks = {asyncio.create_task(probe(c)): c for c in candidates}
+        pending = set(tasks)
+        fallback = None
+        deadline = time.monotonic() + timeout
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(deadline - time.monotonic(), 0),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    candidate = tasks[task]
+                    if task.exception():
+                        results[candidate['method']] = str(task.exception()) or type(task.exception()).__name__
+                        continue
+                    results[candidate['method']] = task.result()
+                    if candidate['method'] != 'ssm':
+                        return dict(candidate, latency=task.result())
+                    fallback = dict(candidate, latency=task.result())
+            for task in pending:
+                results.setdefault(tasks[task]['method'], 'timed out')
+            return fallback
+        finally:
+            for task in pending:
+                task.cancel()
+
+    try:
+        return asyncio.run(race()), results
+    finally:
+        pool.shutdown(wait=False)
+
+
+def resolve_connection(config, deployment, region, refresh=False):
+    """Find the fastest reachable way to connect to a deployment's instance.
+
+    Returns (endpoint, cached). The winner is cached per instance for
+    `connection_cache_ttl` seconds; `refresh` re-describes the instance and
+    probes again.
+    """
+    instance_id = deployment['instance_id']
+    cache = load_connection_cache()
+    ttl = config.get('connection_cache_ttl', CONNECTION_CACHE_TTL)
+    entry = cache.get(instance_id)
+    if entry and not refresh and time.time() - entry.get('resolved_at', 0) < ttl:
+        return entry, True
+
+    instance = lookup_instances(config, region, [instance_id], instance_cache(config),
+                                refresh=refresh).get(instance_id)
+    if not instance:
+        raise RuntimeError(f'Instance {instance_id} not found')
+    if instance['state'] != 'running':
+        raise RuntimeError(f"Instance is {instance['state']}. Start it with: goldenshell start")
+
+    winner, results = probe_connections(config, region, connection_candidates(deployment, instance))
+    if not winner:
+        tried = '; '.join(f'{method}: {result}' for method, result in results.items())
+        raise RuntimeError(f'No reachable connection path ({tried})')
+
+    entry = dict(winner, region=region, resolved_at=time.time())
+    cache[instance_id] = entry
+    write_json_atomic(CONNECTION_CACHE_FILE, cache)
+    return entry, False
+
+
+def endpoint_command(config, endpoint, batch=False):
+    """Return (ssh command line, environment or None) for a connection endpoint"""
+    if endpoint['method'] == 'ssm':
+        # SSH tunnelled through Session Manager, authenticated with our AWS credentials
+        proxy = ('aws ssm start-session --target %h --document-name AWS-StartSSHSession '
+                 f"--parameters portNumber=%p --region {endpoint['region']}")
+        env = dict(os.environ)
+        access_key, secret_key = aws_credentials(config)
+        if access_key:
+            env.update(AWS_ACCESS_KEY_ID=access_key, AWS_SECRET_ACCESS_KEY=secret_key)
+        return ssh_command(config, endpoint['host'], ssh_key_file(config), batch=batch,
+                           proxy_command=proxy), env
+    key_file = ssh_key_file(config) if endpoint['method'] == 'public-ip' else None
+    return ssh_command(config, endpoint['host'], key_file, batch=batch), None
+
+
+def bench_ssh(config, paths, runs):
+    """Print cold vs. multiplexed connect latency for each (label, host, key_file) path"""
+    import subprocess
+    import statistics
+
+    def connect(command):
+        started = time.monotonic()
+        result = subprocess.run(command + ['true'], stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return time.monotonic() - started if result.returncode == 0 else None
+
+    click.echo(click.style(f'SSH connect latency (median of {runs}):', fg='cyan', bold=True))
+    click.echo(f"{'Path':10} {'Host':28} {'Cold':>8} {'Master':>8} {'Muxed':>8} {'Speedup':>8}")
+    for label, host, key_file in paths:
+        cold = [connect(ssh_command(config, host, key_file, multiplex=False, batch=True))
+                for _ in range(runs)]
+        if None in cold:
+            click.echo(f"{label:10} {host:28} {click.style('unreachable', fg='red')}")
+            continue
+
+        # Time setting up a fresh master, then commands riding on it
+        ssh_control(config, host, 'exit')
+        started = time.monotonic()
+        if not warm_ssh_master(config, host, key_file):
+            click.echo(f"{label:10} {host:28} {statistics.median(cold):>7.2f}s "
+                       f"{click.style('master failed', fg='red')}")
+            continue
+        master = time.monotonic() - started
+        muxed = [connect(ssh_command(config, host, key_file, batch=True)) for _ in range(runs)]
+        if None in muxed:
+            click.echo(f"{label:10} {host:28} {statistics.median(cold):>7.2f}s {master:>7.2f}s "
+                       f"{click.style('failed', fg='red')}")
+            continue
+
+        cold_s, muxed_s = statistics.median(cold), statistics.median(muxed)
+        click.echo(f"{label:10} {host:28} {cold_s:>7.2f}s {master:>7.2f}s {muxed_s:>7.2f}s "
+                   f"{cold_s / muxed_s:>7.1f}x")
+
+
+def scan_tree(root, hash_cache, excludes=(), names=None):
+    """Manifest of the regular files under root: {relative path: [size, sha256]}.
+
+    `hash_cache` maps absolute paths to [size, mtime_ns, sha256] and is
+    updated in place, so files that haven't changed are never read again.
+    `names` limits the scan to those top-level entries. Symlinks are skipped.
+    This also runs on the instance (see sync_remote_scan), so it may only use
+    the standard library.
+    """
+    import os
+    import stat
+    import fnmatch
+    import hashlib
+
+    def excluded(name):
+        return any(fnmatch.fnmatch(name, pattern) for pattern in excludes)
+
+    def add(path, relative):
+        st = os.lstat(path)
+        if not stat.S_ISREG(st.st_mode):
+            return
+        cached = hash_cache.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            digest = cached[2]
+        else:
+            sha = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(block)
+            digest = sha.hexdigest()
+            hash_cache[path] = [st.st_size, st.st_mtime_ns, digest]
+        manifest[relative] = [st.st_size, digest]
+
+    manifest = {}
+    if not os.path.isdir(root):
+        return manifest
+    for dirpath, dirnames, filenames in os.walk(root):
+        relative_dir = os.path.relpath(dirpath, root)
+        if relative_dir == '.':
+            relative_dir = ''
+            if names is not None:
+                dirnames[:] = [d for d in dirnames if d in names]
+                filenames = [f for f in filenames if f in names]
+        dirnames[:] = [d for d in dirnames if not excluded(d)]
+        for name in filenames:
+            if not excluded(name):
+                add(os.path.join(dirpath, name), os.path.join(relative_dir, name))
+
+    # Forget hashes of files that are gone
+    for path in [p for p in hash_cache if p.startswith(root.rstrip(os.sep) + os.sep)]:
+        relative = os.path.relpath(path, root)
+        if relative not in manifest and (names is None or relative.split(os.sep)[0] in names):
+            del hash_cache[path]
+    return manifest
+
+
+def sync_remote_main(request):
+    """Instance side of `goldenshell sync`: scan roots and/or delete files, print JSON"""
+    import os
+    import sys
+    import json
+
+    cache_file = os.path.expanduser('~/.cache/goldenshell/sync-hashes.json')
+    try:
+        with open(cache_file) as f:
+            hash_cache = json.load(f)
+    except (OSError, ValueError):
+        hash_cache = {}
+
+    for root, relative in request.get('delete', []):
+        try:
+            os.remove(os.path.join(os.path.expanduser(root), relative))
+        except FileNotFoundError:
+            pass
+
+    result = []
+    for root, names in request.get('roots', []):
+        # Relative paths are relative to the login directory, like scp
+        root = os.path.abspath(os.path.expanduser(root))
+        missing = not os.path.exists(root)
+        is_file = os.path.isfile(root)
+        if is_file:
+            # A single file is scanned as the only entry of its directory
+            root, names = os.path.dirname(root), [os.path.basename(root)]
+        elif missing and request.get('mkdir'):
+            os.makedirs(root, exist_ok=True)
+        result.append({'root': root, 'file': is_file, 'missing': missing,
+                       'manifest': scan_tree(root, hash_cache, request.get('excludes', []), names)})
+
+    # A delete-only call hashed nothing
+    if request.get('roots'):
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file + '.tmp', 'w') as f:
+            json.dump(hash_cache, f)
+        os.replace(cache_file + '.tmp', cache_file)
+    json.dump(result, sys.stdout)
+
+
+@telemetry.traced('ssh.sync_call')
+def sync_remote_call(config, endpoint, request):
+    """Run sync_remote_main on the instance in one round trip and return its result.
+
+    Only a fixed bootstrap goes on the command line; the code and the request
+    (which can list thousands of deletions) are sent over stdin, as one JSON
+    line each, so they never hit the kernel's per-argument limit.
+    """
+    import json
+    import shlex
+    import inspect
+    import subprocess
+
+    source = (inspect.getsource(scan_tree) + '\n' + inspect.getsource(sync_remote_main)
+              + '\nsync_remote_main(json.loads(sys.stdin.readline()))\n')
+    bootstrap = 'import sys, json; exec(json.loads(sys.stdin.readline()))'
+    command, env = endpoint_command(config, endpoint, batch=True)
+    result = subprocess.run(command + ['--', 'python3', '-c', shlex.quote(bootstrap)],
+                            input=json.dumps(source) + '\n' + json.dumps(request) + '\n',
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f'ssh exited with {result.returncode}')
+    return json.loads(result.stdout)
+
+
+def remote_relative(path):
+    """A remote path as seen from the login directory (rsync and tar don't expand ~)"""
+    if path == '~':
+        return '.'
+    if path.startswith('~/'):
+        return path[2:]
+    return path
+
+
+def split_by_size(files, sizes, count):
+    """Split files into at most `count` groups of roughly equal total size"""
+    groups = [[] for _ in range(min(count, len(files)))]
+    totals = [0] * len(groups)
+    for name in sorted(files, key=lambda f: -sizes[f]):
+        smallest = totals.index(min(totals))
+        groups[smallest].append(name)
+        totals[smallest] += sizes[name]
+    return groups
+
+
+def transfer_files(config, endpoint, direction, local_root, remote_root, files, sizes, streams):
+    """Copy files between local_root and remote_root over parallel compressed streams.
+
+    Uses rsync (delta transfer, -z) when it is installed locally, otherwise
+    tar+gzip. `direction` is 'push' or 'pull'. Raises on the first failure.
+    """
+    import shlex
+    import shutil
+    import tarfile
+    import threading
+    import subprocess
+    from concurrent.futures import ThreadPoolExecutor
+
+    command, env = endpoint_command(config, endpoint, batch=True)
+    remote = remote_relative(remote_root)
+    use_rsync = shutil.which('rsync') is not None
+
+    def rsync(group):
+        target = f'{command[-1]}:{remote}/'
+        # -I: our manifests already decided these differ, so skip rsync's size/mtime check
+        rsync_command = ['rsync', '-ptzI', '--from0', '--files-from=-', '-e', shlex.join(command[:-1])]
+        rsync_command += [f'{local_root}/', target] if direction == 'push' else [target, f'{local_root}/']
+        if direction == 'pull':
+            os.makedirs(local_root, exist_ok=True)
+        result = subprocess.run(rsync_command, input='\0'.join(group).encode(),
+                                capture_output=True, env=env)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode().strip() or f'rsync exited with {result.returncode}')
+
+    def tar_push(group):
+        process = subprocess.Popen(
+            command + ['--', f'mkdir -p {shlex.quote(remote)} && tar -xzf - -C {shlex.quote(remote)}'],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env)
+        with tarfile.open(fileobj=process.stdin, mode='w|gz') as tar:
+            for name in group:
+                tar.add(os.path.join(local_root, name), arcname=name, recursive=False)
+        process.stdin.close()
+        if process.wait() != 0:
+            raise RuntimeError(process.stderr.read().decode().strip() or 'remote tar failed')
+
+    def tar_pull(group):
+        process = subprocess.Popen(
+            command + ['--', f'tar -czf - -C {shlex.quote(remote)} --null -T -'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+
+        # Feed the file list from a thread so a full stdout pipe can't deadlock us
+        def feed():
+            process.stdin.write('\0'.join(group).encode())
+            process.stdin.close()
+        threading.Thread(target=feed, daemon=True).start()
+
+        os.makedirs(local_root, exist_ok=True)
+        with tarfile.open(fileobj=process.stdout, mode='r|gz') as tar:
+            tar.extractall(local_root, filter='data')
+        if process.wait() != 0:
+            raise RuntimeError(process.stderr.read().decode().strip() or 'remote tar failed')
+
+    worker = rsync if use_rsync else tar_push if direction == 'push' else tar_pull
+    groups = split_by_size(files, sizes, streams)
+    with ThreadPoolExecutor(max_workers=len(groups) or 1) as pool:
+        for future in [pool.submit(worker, group) for group in groups]:
+            future.result()
+    return 'rsync' if use_rsync else 'tar+gzip'
+
+
+def sync_units(direction, paths, destination):
+    """Pair each path with where it goes: [(local root, remote root, names or None)]"""
+    import posixpath
+
+    units = []
+    for path in paths:
+        if direction == 'push':
+            path = os.path.abspath(path)
+            if os.path.isdir(path):
+                units.append((path, posixpath.join(destination, os.path.basename(path)), None))
+            else:
+                units.append((os.path.dirname(path), destination, [os.path.basename(path)]))
+        else:
+            path = path.rstrip('/') or '/'
+            units.append((os.path.abspath(os.path.join(destination, posixpath.basename(path))), path, None))
+    return units
+
+
+def sync_once(config, endpoint, direction, units, excludes, delete, streams, hash_cache, remote_state=None):
+    """Sync every unit once. Returns the remote manifests after the sync.
+
+    The remote side is scanned in a single round trip, unless `remote_state`
+    (what a previous sync left there) is given, as in watch mode.
+    """
+    started = time.monotonic()
+    if remote_state is None:
+        request = {'roots': [[remote, names] for _, remote, names in units],
+                   'excludes': list(excludes), 'mkdir': direction == 'push'}
+        remote_state = sync_remote_call(config, endpoint, request)
+        if direction == 'pull':
+            missing = [remote for (_, remote, _), state in zip(units, remote_state) if state['missing']]
+            if missing:
+                raise RuntimeError(f"Not found on the instance: {', '.join(missing)}")
+
+    copied = bytes_copied = removed = 0
+    engine = None
+    deletions = []
+    new_state = []
+    for (local_root, remote_root, names), remote in zip(units, remote_state):
+        remote_manifest = remote['manifest']
+        if direction == 'pull' and remote['file']:
+            # A single remote file lands directly in the destination directory
+            local_root, names = os.path.dirname(local_root), list(remote_manifest)
+        remote_root = remote['root'] if remote['file'] else remote_root
+        local_manifest = scan_tree(local_root, hash_cache, excludes, names)
+
+        source, target = ((local_manifest, remote_manifest) if direction == 'push'
+                          else (remote_manifest, local_manifest))
+        changed = sorted(name for name, (_, digest) in source.items()
+                         if target.get(name, [None, None])[1] != digest)
+        stale = sorted(name for name in target if name not in source) if delete else []
+
+        if changed:
+            sizes = {name: source[name][0] for name in changed}
+            engine = transfer_files(config, endpoint, direction, local_root, remote_root,
+                                    changed, sizes, streams)
+            copied += len(changed)
+            bytes_copied += sum(sizes.values())
+        if direction == 'push':
+            deletions += [(remote_root, name) for name in stale]
+        else:
+            for name in stale:
+                os.remove(os.path.join(local_root, name))
+        removed += len(stale)
+
+        after = dict(target)
+        after.update({name: source[name] for name in changed})
+        for name in stale:
+            after.pop(name, None)
+        new_state.append(dict(remote, missing=False,
+                              manifest=after if direction == 'push' else remote_manifest))
+
+    if deletions:
+        sync_remote_call(config, endpoint, {'delete': deletions})
+    write_json_atomic(SYNC_HASH_CACHE_FILE, hash_cache)
+
+    elapsed = time.monotonic() - started
+    if copied or removed:
+        summary = f"{'Pushed' if direction == 'push' else 'Pulled'} {copied} file(s) ({bytes_copied / 1024:.1f} KB)"
+        if engine:
+            summary += f" via {engine}"
+        if removed:
+            summary += f", deleted {removed}"
+        click.echo(click.style(f'✓ {summary} in {elapsed:.2f}s', fg='green'))
+    else:
+        click.echo(f'Already in sync ({elapsed:.2f}s)')
+    return new_state
+
+
+def watch_push(config, endpoint, units, excludes, delete, streams, hash_cache, debounce):
+    """Push local changes as they happen, once the tree has been quiet for `debounce` seconds"""
+    remote_state = sync_once(config, endpoint, 'push', units, excludes, delete, streams, hash_cache)
+
+    def snapshot():
+        return [scan_tree(local_root, hash_cache, excludes, names) for local_root, _, names in units]
+
+    click.echo(click.style('Watching for changes (Ctrl+C to stop)...', fg='cyan'))
+    last_seen = snapshot()
+    changed_at = None
+    try:
+        while True:
+            time.sleep(SYNC_POLL_INTERVAL)
+            current = snapshot()
+            if current != last_seen:
+                last_seen = current
+                changed_at = time.monotonic()
+            elif changed_at is not None and time.monotonic() - changed_at >= debounce:
+                changed_at = None
+                try:
+                    remote_state = sync_once(config, endpoint, 'push', units, excludes, delete,
+                                             streams, hash_cache, remote_state=remote_state)
+                except (RuntimeError, OSError) as e:
+                    # Re-scan the instance next time rather than trusting our copy
+                    click.echo(click.style(f'Sync failed: {str(e)}', fg='red'))
+                    remote_state = None
+    except KeyboardInterrupt:
+        click.echo('\nStopped watching.')
+
+
+def web_terminal_settings(config):
+    """Effective ttyd settings: the configured profile plus per-setting overrides"""
+    profile = config.get('web_terminal_profile', WEB_TERMINAL_DEFAULT_PROFILE)
+    if profile not in WEB_TERMINAL_PROFILES:
+        raise ValueError(f"Unknown web_terminal_profile '{profile}' "
+                         f"(choose from {', '.join(WEB_TERMINAL_PROFILES)})")
+    settings = dict(WEB_TERMINAL_PROFILES[profile], profile=profile)
+    for key in ('reconnect', 'ping_interval', 'renderer'):
+        if config.get(f'web_terminal_{key}') is not None:
+            settings[key] = config.get(f'web_terminal_{key}')
+    if settings['renderer'] not in WEB_TERMINAL_RENDERERS:
+        raise ValueError(f"Unknown web_terminal_renderer '{settings['renderer']}' "
+                         f"(choose from {', '.join(WEB_TERMINAL_RENDERERS)})")
+    return settings
+
+
+def web_terminal_tf_vars(config):
+    """Terraform variables for the configured web terminal profile and overrides"""
+    settings = web_terminal_settings(config)
+    tf_vars = {'web_terminal_profile': settings['profile']}
+    for key in ('reconnect', 'ping_interval', 'renderer'):
+        value = config.get(f'web_terminal_{key}')
+        if value is not None:
+            # Terraform only parses lowercase booleans
+            tf_vars[f'web_terminal_{key}'] = str(value).lower() if isinstance(value, bool) else value
+    return tf_vars
+
+
+def ttyd_options(settings):
+    """ttyd flags for the settings, like local.ttyd_options in main.tf"""
+    return (f"-P {int(settings['ping_interval'])} "
+            f"-t disableReconnect={'false' if settings['reconnect'] else 'true'} "
+            f"-t rendererType={settings['renderer']}")
+
+
+class WebTerminalClient:
+    """Just enough of a ttyd WebSocket client (subprotocol "tty") for `webterm bench`.
+
+    Offers permessage-deflate like a browser does; `wire_bytes` counts frame
+    bytes as received and `data_bytes` the payload after inflating.
+    """
+
+    def __init__(self, url, username=None, password=None, timeout=10.0):
+        from urllib.parse import urlsplit
+
+        parts = urlsplit(url if '://' in url else f'http://{url}')
+        self.secure = parts.scheme in ('https', 'wss')
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.secure else 80)
+        self.base_path = parts.path.rstrip('/') + '/'
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.sock = None
+        self.compressed = False
+        self.wire_bytes = self.data_bytes = 0
+        self._buffer = b''
+        self._message = None
+        self._inflater = None
+        self._reset_inflater = False
+
+    def _credential(self):
+        import base64
+
+        return base64.b64encode(f'{self.username}:{self.password}'.encode()).decode()
+
+    def _auth_token(self):
+        """ttyd hands the page its auth token at /token"""
+        import urllib.request
+
+        if not self.password:
+            return ''
+        scheme = 'https' if self.secure else 'http'
+        request = urllib.request.Request(f'{scheme}://{self.host}:{self.port}{self.base_path}token',
+                                         headers={'Authorization': f'Basic {self._credential()}'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read()).get('token') or self._credential()
+        except (OSError, ValueError):
+            return self._credential()
+
+    def connect(self, columns=80, rows=24):
+        """Open the WebSocket and start the terminal. Returns the seconds the upgrade took."""
+        import ssl
+        import zlib
+        import base64
+        import socket
+
+        token = self._auth_token()
+        started = time.monotonic()
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.secure:
+            self.sock = ssl.create_default_context().wrap_socket(self.sock, server_hostname=self.host)
+
+        key = base64.b64encode(os.urandom(16)).decode()
+        headers = [f'GET {self.base_path}ws HTTP/1.1', f'Host: {self.host}:{self.port}',
+                   'Upgrade: websocket', 'Connection: Upgrade', f'Sec-WebSocket-Key: {key}',
+                   'Sec-WebSocket-Version: 13', 'Sec-WebSocket-Protocol: tty',
+                   'Sec-WebSocket-Extensions: permessage-deflate; client_max_window_bits']
+        if self.password:
+            headers.append(f'Authorization: Basic {self._credential()}')
+        self.sock.sendall(('\r\n'.join(headers) + '\r\n\r\n').encode())
+
+        while b'\r\n\r\n' not in self._buffer:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionError('web terminal closed the connection during the handshake')
+            self._buffer += chunk
+        head, self._buffer = self._buffer.split(b'\r\n\r\n', 1)
+        status, *lines = head.decode('latin-1').split('\r\n')
+        if ' 401 ' in f'{status} ':
+            raise PermissionError(f'web terminal rejected the credentials: {status}')
+        if ' 101 ' not in f'{status} ':
+            raise ConnectionError(f'WebSocket upgrade refused: {status}')
+        response = {name.strip().lower(): value.strip()
+                    for name, _, value in (line.partition(':') for line in lines)}
+        extensions = response.get('sec-websocket-extensions', '')
+        if extensions.startswith('permessage-deflate'):
+            self.compressed = True
+            self._inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+            self._reset_inflater = 'server_no_context_takeover' in extensions
+        elapsed = time.monotonic() - started
+
+        self._send(2, json.dumps({'AuthToken': token, 'columns': columns, 'rows': rows}).encode())
+        return elapsed
+
+    def _send(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = bytes([0x80 | opcode, 0x80 | length])
+        elif length < 1 << 16:
+            header = bytes([0x80 | opcode, 0x80 | 126]) + length.to_bytes(2, 'big')
+        else:
+            header = bytes([0x80 | opcode, 0x80 | 127]) + length.to_bytes(8, 'big')
+        # Clients must mask every frame
+        mask = os.urandom(4)
+        masked = (int.from_bytes(payload, 'big')
+                  ^ int.from_bytes((mask * (length // 4 + 1))[:length], 'big')).to_bytes(length, 'big')
+        self.sock.sendall(header + mask + masked)
+
+    def send_input(self, data):
+        """Type data into the terminal"""
+        self._send(2, b'0' + data)
+
+    def _parse_frame(self):
+        """The next complete frame in the buffer as (fin, rsv1, opcode, payload), or None"""
+        buffer = self._buffer
+        if len(buffer) < 2:
+            return None
+        length, position = buffer[1] & 0x7f, 2
+        if length == 126:
+            if len(buffer) < 4:
+                return None
+            length, position = int.from_bytes(buffer[2:4], 'big'), 4
+        elif length == 127:
+            if len(buffer) < 10:
+                return None
+            length, position = int.from_bytes(buffer[2:10], 'big'), 10
+        if len(buffer) < position + length:
+            return None
+        self._buffer = buffer[position + length:]
+        self.wire_bytes += position + length
+        return buffer[0] & 0x80, buffer[0] & 0x40, buffer[0] & 0x0f, buffer[position:position + length]
+
+    def _read_message(self, deadline):
+        """The next complete data message, or None once the deadline passes"""
+        import zlib
+        import socket
+
+        while True:
+            frame = self._parse_frame()
+            if frame is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.sock.settimeout(remaining)
+                try:
+                    chunk = self.sock.recv(1 << 16)
+                except socket.timeout:
+                    return None
+                if not chunk:
+                    raise ConnectionError('web terminal closed the connection')
+                self._buffer += chunk
+                continue
+
+            fin, rsv1, opcode, payload = frame
+            if opcode == 8:
+                raise ConnectionError('web terminal closed the connection')
+            if opcode == 9:
+                self._send(10, payload)
+                continue
+            if opcode == 10:
+                continue
+            if opcode != 0:
+                self._message = [bool(rsv1), []]
+            self._message[1].append(payload)
+            if not fin:
+                continue
+
+            compressed, parts = self._message
+            self._message = None
+            data = b''.join(parts)
+            if compressed:
+                data = self._inflater.decompress(data + b'\x00\x00\xff\xff')
+                if self._reset_inflater:
+                    self._inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+            self.data_bytes += len(data)
+            return data
+
+    def read_output(self, timeout):
+        """Terminal output from the next OUTPUT message, or None if nothing arrives in time"""
+        deadline = time.monotonic() + timeout
+        while True:
+            message = self._read_message(deadline)
+            if message is None or message[:1] == b'0':
+                return message and message[1:]
+
+    def drain(self, quiet=0.5, limit=5.0):
+        """Discard output until the terminal has been quiet for `quiet` seconds"""
+        stop = time.monotonic() + limit
+        while time.monotonic() < stop and self.read_output(quiet) is not None:
+            pass
+
+    def close(self):
+        if self.sock:
+            try:
+                self._send(8, (1000).to_bytes(2, 'big'))
+            except OSError:
+                pass
+            self.sock.close()
+            self.sock = None
+
+
+def bench_web_terminal(client, keystrokes, size):
+    """Keystroke round trips and bulk output throughput over one ttyd connection"""
+    import statistics
+
+    connect = client.connect()
+    client.drain()
+
+    # Alternately type a character and erase it, timing each echo
+    round_trips = []
+    for i in range(keystrokes):
+        started = time.monotonic()
+        client.send_input(b'\x7f' if i % 2 else b'x')
+        if client.read_output(client.timeout) is None:
+            raise RuntimeError('No echo from the web terminal (is a shell prompt showing?)')
+        round_trips.append(time.monotonic() - started)
+        client.drain(quiet=0.05, limit=0.5)
+    if keystrokes % 2:
+        client.send_input(b'\x7f')
+        client.drain(quiet=0.05, limit=0.5)
+
+    # The marker only appears in the output once the shell has expanded it
+    wire_before, data_before = client.wire_bytes, client.data_bytes
+    started = time.monotonic()
+    client.send_input(f'head -c {size} /dev/urandom | base64; echo GS_BENCH_$((6*7))_DONE\r'.encode())
+    tail = b''
+    while b'GS_BENCH_42_DONE' not in tail:
+        output = client.read_output(client.timeout)
+        if output is None:
+            raise RuntimeError('Timed out waiting for the throughput test to finish')
+        tail = (tail + output)[-64:]
+    elapsed = time.monotonic() - started
+    client.close()
+
+    return {
+        'connect': connect,
+        'compressed': client.compressed,
+        'keystrokes': len(round_trips),
+        'median': statistics.median(round_trips),
+        'p95': statistics.quantiles(round_trips, n=20)[-1] if len(round_trips) > 1 else round_trips[0],
+        'elapsed': elapsed,
+        'data_bytes': client.data_bytes - data_before,
+        'wire_bytes': client.wire_bytes - wire_before,
+    }
+
+
+def instance_type_menu_label(instance_type, spec=None):
+    """Menu description of a catalog type, e.g. '2 vCPU, 4GB RAM - ~$30/month (default)'"""
+    spec = spec or INSTANCE_TYPES[instance_type]
+    label = f"{spec['vcpus']} vCPU, {spec['memory']:g}GB RAM - "
+    if instance_type.startswith('c'):
+        label += 'Compute optimized '
+    label += f"~${spec['hourly'] * HOURS_PER_MONTH:.0f}/month"
+    if spec.get('estimate'):
+        label += ' (us-east-1 price)'
+    if instance_type == DEFAULT_INSTANCE_TYPE:
+        label += ' (default)'
+    return label
+
+
+def instance_type_spec(ec2, instance_type):
+    """vCPUs, memory and price of a type: from the catalog, else EC2 (with no price)"""
+    if instance_type in INSTANCE_TYPES:
+        return INSTANCE_TYPES[instance_type]
+    info = ec2.describe_instance_types(InstanceTypes=[instance_type])['InstanceTypes'][0]
+    return {'vcpus': info['VCpuInfo']['DefaultVCpus'], 'memory': info['MemoryInfo']['SizeInMiB'] / 1024,
+            'hourly': None, 'baseline': None}
+
+
+def fetch_utilization(config, region, instance_id, days):
+    """CPU, memory and CPU credit datapoints for the last `days`, in one batched query.
+
+    Returns {query id: [values]} at RECOMMEND_PERIOD resolution; periods when
+    the instance was stopped have no datapoints.
+    """
+    from datetime import datetime, timedelta, timezone
+
+    dimensions = [{'Name': 'InstanceId', 'Value': instance_id}]
+    queries = [
+        ('cpu', 'AWS/EC2', 'CPUUtilization', 'Average'),
+        ('credits', 'AWS/EC2', 'CPUCreditBalance', 'Minimum'),
+        ('surplus', 'AWS/EC2', 'CPUSurplusCreditsCharged', 'Sum'),
+        ('memory', 'GoldenShell', 'MemoryUtilization', 'Maximum'),
+    ]
+    end = datetime.now(timezone.utc)
+    series = {query_id: [] for query_id, *_ in queries}
+    paginator = aws_client(config, 'cloudwatch', region).get_paginator('get_metric_data')
+    for page in paginator.paginate(
+            MetricDataQueries=[{
+                'Id': query_id,
+                'MetricStat': {
+                    'Metric': {'Namespace': namespace, 'MetricName': name, 'Dimensions': dimensions},
+                    'Period': RECOMMEND_PERIOD,
+                    'Stat': stat,
+                },
+            } for query_id, namespace, name, stat in queries],
+            StartTime=end - timedelta(days=days), EndTime=end, ScanBy='TimestampAscending'):
+        for result in page['MetricDataResults']:
+            series[result['Id']] += result['Values']
+    return series
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * percent // 100) - 1)]
+
+
+def summarize_utilization(series):
+    """Reduce fetch_utilization() output to the figures the recommendation uses"""
+    cpu, memory = series['cpu'], series['memory']
+    return {
+        'samples': len(cpu),
+        'cpu_p95': percentile(cpu, RECOMMEND_PERCENTILE) if cpu else None,
+        'cpu_mean': sum(cpu) / len(cpu) if cpu else None,
+        'memory_p95': percentile(memory, RECOMMEND_PERCENTILE) if memory else None,
+        'credits_min': min(series['credits']) if series['credits'] else None,
+        'surplus_charged': sum(series['surplus']),
+    }
+
+
+def recommend_instance_type(current, usage, catalog=INSTANCE_TYPES):
+    """Rank `catalog` against measured usage of an instance with spec `current`.
+
+    A type fits when the p95 CPU and memory demand stay under the target
+    utilization and, for burstable types, the mean CPU demand stays within the
+    baseline its credits pay for. Returns (cheapest fitting type or None,
+    [(type, spec, problems)] for every catalog type, cheapest first).
+    """
+    cpu_p95 = usage['cpu_p95'] / 100 * current['vcpus']
+    cpu_mean = usage['cpu_mean'] / 100 * current['vcpus']
+    if usage['memory_p95'] is not None:
+        memory = usage['memory_p95'] / 100 * current['memory']
+    else:
+        # Without memory data, never go below what the instance has now
+        memory = current['memory'] * RECOMMEND_MEMORY_TARGET / 100
+
+    ranked = []
+    for instance_type, spec in sorted(catalog.items(), key=lambda item: item[1]['hourly']):
+        problems = []
+        if spec['vcpus'] * RECOMMEND_CPU_TARGET / 100 < cpu_p95:
+            problems.append(f'CPU: needs {cpu_p95 / (RECOMMEND_CPU_TARGET / 100):.1f} vCPU')
+        if spec['memory'] * RECOMMEND_MEMORY_TARGET / 100 < memory:
+            problems.append(f'memory: needs {memory / (RECOMMEND_MEMORY_TARGET / 100):.1f} GiB')
+        if spec['baseline'] is not None and spec['baseline'] * spec['vcpus'] < cpu_mean:
+            problems.append(f"credits: baseline {spec['baseline'] * spec['vcpus']:.2f} vCPU "
+                            f"< {cpu_mean:.2f} vCPU average use")
+        ranked.append((instance_type, spec, problems))
+    best = next((instance_type for instance_type, _, problems in ranked if not problems), None)
+    return best, ranked
+
+
+def recommend_resize(config, ec2, region, instance_id, current_type, days):
+    """Print a usage report and ranked candidates; return the recommended type (or None)"""
+    catalog = priced_catalog(config, region)
+    current = catalog.get(current_type) or instance_type_spec(ec2, current_type)
+    usage = summarize_utilization(fetch_utilization(config, region, instance_id, days))
+    if not usage['samples']:
+        click.echo(click.style(f'No CloudWatch data for {instance_id} in the last {days} days.', fg='yellow'))
+        return None
+
+    hours = usage['samples'] * RECOMMEND_PERIOD / 3600
+    click.echo(click.style(f'Usage over the last {days} days ({hours:.0f}h running):', fg='cyan'))
+    click.echo(f"  CPU:     p{RECOMMEND_PERCENTILE} {usage['cpu_p95']:.1f}% "
+               f"({usage['cpu_p95'] / 100 * current['vcpus']:.2f} of {current['vcpus']} vCPU), "
+               f"mean {usage['cpu_mean']:.1f}%")
+    if usage['memory_p95'] is not None:
+        click.echo(f"  Memory:  p{RECOMMEND_PERCENTILE} {usage['memory_p95']:.1f}% "
+                   f"({usage['memory_p95'] / 100 * current['memory']:.1f} of {current['memory']:g} GiB)")
+    else:
+        click.echo(f"  Memory:  {click.style('not reported', fg='yellow')} "
+                   '(the idle monitor publishes it; redeploy to update it) - keeping at least the current memory')
+    if usage['credits_min'] is not None:
+        if usage['credits_min'] < 1 or usage['surplus_charged'] > 0:
+            # Surplus credits cost $0.05 per vCPU-hour (one credit is a vCPU-minute)
+            cost = usage['surplus_charged'] * 0.05 / 60
+            click.echo(f"  Credits: {click.style('exhausted', fg='red')} - balance hit "
+                       f"{usage['credits_min']:.0f}, {usage['surplus_charged']:.0f} surplus credits "
+                       f"charged (~${cost:.2f}); CPU demand may be higher than measured")
+        else:
+            click.echo(f"  Credits: lowest balance {usage['credits_min']:.0f}, never exhausted")
+
+    best, ranked = recommend_instance_type(current, usage, catalog)
+    click.echo(click.style('\nCandidates (cheapest first):', fg='cyan'))
+    for instance_type, spec, problems in ranked:
+        marker = '→' if instance_type == best else ' '
+        note = click.style('fits', fg='green') if not problems else '; '.join(problems)
+        if instance_type == current_type:
+            note += ' (current)'
+        if spec.get('estimate'):
+            note += ' (us-east-1 price)'
+        click.echo(f"  {marker} {instance_type:12} ~${spec['hourly'] * HOURS_PER_MONTH:>4.0f}/month  {note}")
+
+    if best is None:
+        click.echo(click.style('\nNo type in the menu fits this workload; pick a larger type with '
+                               '--instance-type.', fg='yellow'))
+        return None
+    if best == current_type:
+        click.echo(click.style(f'\n{current_type} is already the cheapest type that fits.', fg='green'))
+        return None
+    change = ''
+    if current['hourly'] is not None:
+        delta = (catalog[best]['hourly'] - current['hourly']) * HOURS_PER_MONTH
+        change = f" ({'saves' if delta < 0 else 'adds'} ~${abs(delta):.0f}/month)"
+    click.echo(click.style(f'\nRecommendation: {best}{change}', fg='green', bold=True))
+    return best
+
+
+def on_demand_prices(config, region, instance_types):
+    """On-demand Linux $/hour of each type in `region`, from the AWS Pricing API.
+
+    Looked up in parallel and cached in PRICE_CACHE_FILE for PRICE_CACHE_TTL;
+    types the API can't price, or whose lookup failed (e.g. pricing:GetProducts
+    denied), are cached as misses for PRICE_MISS_TTL; the first failed call
+    in a process is reported. Misses are left out, except in us-east-1, where
+    the INSTANCE_TYPES catalog (priced for us-east-1) stands in.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    global _pricing_failure_reported
+    cache = read_json(PRICE_CACHE_FILE, {})
+    cached = cache.setdefault(region, {})
+    now = time.time()
+    fresh = {instance_type: cached[instance_type][0] for instance_type in instance_types
+             if instance_type in cached and now - cached[instance_type][1]
+             < (PRICE_CACHE_TTL if cached[instance_type][0] else PRICE_MISS_TTL)}
+    prices = {instance_type: hourly for instance_type, hourly in fresh.items() if hourly}
+    missing = [instance_type for instance_type in instance_types if instance_type not in fresh]
+    errors = []
+
+    def lookup(instance_type):
+        filters = {'instanceType': instance_type, 'regionCode': region, 'operatingSystem': 'Linux',
+                   'tenancy': 'Shared', 'preInstalledSw': 'NA', 'capacitystatus': 'Used',
+                   'licenseModel': 'No License required'}
+        try:
+            response = aws_client(config, 'pricing', PRICING_API_REGION).get_products(
+                ServiceCode='AmazonEC2', MaxResults=10,
+                Filters=[{'Type': 'TERM_MATCH', 'Field': field, 'Value': value} for field, value in filters.items()])
+        except Exception as e:
+            errors.append(e)
+            return None
+        for item in response['PriceList']:
+            for term in json.loads(item)['terms'].get('OnDemand', {}).values():
+                for dimension in term['priceDimensions'].values():
+                    return float(dimension['pricePerUnit']['USD'])
+        return None
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(len(missing), AWS_MAX_POOL_CONNECTIONS)) as pool:
+            for instance_type, hourly in zip(missing, pool.map(lookup, missing)):
+                if hourly:
+                    prices[instance_type] = hourly
+                cached[instance_type] = [hourly, now]
+        write_json_atomic(PRICE_CACHE_FILE, cache)
+        if errors and not _pricing_failure_reported:
+            _pricing_failure_reported = True
+            click.echo(click.style(f'Could not get on-demand prices for {region} from the Pricing API '
+                                   f'({errors[0]}); retrying in {PRICE_MISS_TTL // 60} minutes', fg='yellow'),
+                       err=True)
+
+    if region == 'us-east-1':
+        for instance_type in instance_types:
+            if instance_type not in prices and instance_type in INSTANCE_TYPES:
+                prices[instance_type] = INSTANCE_TYPES[instance_type]['hourly']
+    return prices
+
+
+def priced_catalog(config, region):
+    """INSTANCE_TYPES with on-demand prices for `region` where the Pricing API has them.
+
+    Other types keep the catalog's us-east-1 price, marked 'estimate'.
+    """
+    prices = on_demand_prices(config, region, list(INSTANCE_TYPES))
+    return {instance_type: dict(spec, hourly=prices[instance_type]) if instance_type in prices
+            else dict(spec, estimate=True)
+            for instance_type, spec in INSTANCE_TYPES.items()}
+
+
+def spot_interruption_bands(region):
+    """{instance type: interruption band} for Linux spot in `region`.
+
+    Bands come from the Spot Instance Advisor (0: <5% of instances interrupted
+    a month, ... 4: >20%), cached in SPOT_ADVISOR_CACHE_FILE for a day. If the
+    advisor can't be reached, stale data is used, else nothing.
+    """
+    import urllib.request
+
+    cache = read_json(SPOT_ADVISOR_CACHE_FILE, {})
+    if time.time() - cache.get('fetched_at', 0) > SPOT_ADVISOR_CACHE_TTL:
+        try:
+            with urllib.request.urlopen(SPOT_ADVISOR_URL, timeout=10) as response:
+                advisor = json.loads(response.read())['spot_advisor']
+            cache = {'fetched_at': time.time(), 'regions': {
+                name: {instance_type: entry['r'] for instance_type, entry in systems.get('Linux', {}).items()}
+                for name, systems in advisor.items()}}
+            write_json_atomic(SPOT_ADVISOR_CACHE_FILE, cache)
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+    return cache.get('regions', {}).get(region, {})
+
+
+def region_latency(region, attempts=3):
+    """Median seconds to open a TCP connection to the region's EC2 endpoint, or None"""
+    import socket
+    import statistics
+
+    try:
+        address = socket.getaddrinfo(f'ec2.{region}.amazonaws.com', 443, type=socket.SOCK_STREAM)[0][4]
+    except OSError:
+        return None
+    samples = []
+    for _ in range(attempts):
+        started = time.monotonic()
+        try:
+            socket.create_connection(address[:2], timeout=CAPACITY_PROBE_TIMEOUT).close()
+        except OSError:
+            continue
+        samples.append(time.monotonic() - started)
+    return statistics.median(samples) if samples else None
+
+
+def fitting_instance_types(ec2, requirement):
+    """{type: (vcpus, GiB, arch)} of current-generation types meeting `requirement`.
+
+    Types get at most CAPACITY_MAX_OVERSIZE times the vCPUs and memory asked
+    for, or are exactly requirement['instance_types'] (any architecture)
+    when that is given.
+    """
+    filters = [{'Name': 'bare-metal', 'Values': ['false']}]
+    if requirement.get('instance_types'):
+        filters.append({'Name': 'instance-type', 'Values': requirement['instance_types']})
+    else:
+        filters += [{'Name': 'current-generation', 'Values': ['true']},
+                    {'Name': 'processor-info.supported-architecture', 'Values': [requirement['arch']]}]
+
+    fitting = {}
+    for page in ec2.get_paginator('describe_instance_types').paginate(Filters=filters):
+        for info in page['InstanceTypes']:
+            vcpus = info['VCpuInfo']['DefaultVCpus']
+            memory = info['MemoryInfo']['SizeInMiB'] / 1024
+            if not requirement.get('instance_types') and not (
+                    requirement['vcpus'] <= vcpus <= requirement['vcpus'] * CAPACITY_MAX_OVERSIZE
+                    and requirement['memory'] <= memory <= requirement['memory'] * CAPACITY_MAX_OVERSIZE):
+                continue
+            architectures = info['ProcessorInfo']['SupportedArchitectures']
+            arch = requirement['arch'] if requirement['arch'] in architectures else architectures[0]
+            fitting[info['InstanceType']] = (vcpus, memory, arch)
+    return fitting
+
+
+def region_capacity(config, region, requirement, market, zones=None):
+    """Unscored candidates for one region: every (type, zone, market) that could launch"""
+    from datetime import datetime, timezone
+    from concurrent.futures import ThreadPoolExecutor
+
+    ec2 = aws_client(config, 'ec2', region)
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        latency = pool.submit(region_latency, region)
+        bands = pool.submit(spot_interruption_bands, region) if market != 'on-demand' else None
+        types = fitting_instance_types(ec2, requirement)
+        if not types:
+            return []
+        names = sorted(types)
+
+        def offerings():
+            offered = {}
+            for page in ec2.get_paginator('describe_instance_type_offerings').paginate(
+                    LocationType='availability-zone', Filters=[{'Name': 'instance-type', 'Values': names}]):
+                for offering in page['InstanceTypeOfferings']:
+                    offered.setdefault(offering['InstanceType'], []).append(offering['Location'])
+            return offered
+
+        def spot_prices():
+            latest = {}
+            for page in ec2.get_paginator('describe_spot_price_history').paginate(
+                    InstanceTypes=names, ProductDescriptions=['Linux/UNIX'],
+                    StartTime=datetime.now(timezone.utc)):
+                for entry in page['SpotPriceHistory']:
+                    key = (entry['InstanceType'], entry['AvailabilityZone'])
+                    if key not in latest or entry['Timestamp'] > latest[key][1]:
+                        latest[key] = (float(entry['SpotPrice']), entry['Timestamp'])
+            return {key: price for key, (price, _) in latest.items()}
+
+        offered = pool.submit(offerings)
+        spot = pool.submit(spot_prices) if market != 'on-demand' else None
+        on_demand = pool.submit(on_demand_prices, config, region, names)
+        offered, on_demand, latency = offered.result(), on_demand.result(), latency.result()
+        spot = spot.result() if spot else {}
+        bands = bands.result() if bands else {}
+
+    candidates = []
+    for instance_type, (vcpus, memory, arch) in types.items():
+        allowed = sorted(zone for zone in offered.get(instance_type, [])
+                         if not zones or zone in zones)
+        base = {'region': region, 'instance_type': instance_type, 'vcpus': vcpus, 'memory': memory,
+                'arch': arch, 'on_demand': on_demand.get(instance_type), 'latency': latency}
+        if market != 'spot' and allowed and instance_type in on_demand:
+            # Any zone will do on-demand; take the first that offers the type
+            candidates.append(dict(base, zone=allowed[0], market='on-demand',
+                                   hourly=on_demand[instance_type], interruption=None))
+        if market != 'on-demand':
+            for zone in allowed:
+                if (instance_type, zone) in spot:
+                    candidates.append(dict(base, zone=zone, market='spot', hourly=spot[(instance_type, zone)],
+                                           interruption=bands.get(instance_type)))
+    return candidates
+
+
+def score_capacity(candidate):
+    """$/hour, raised by the expected cost of spot interruptions and by distance from the user"""
+    if candidate['market'] == 'spot':
+        band = candidate['interruption']
+        penalty = (CAPACITY_INTERRUPTION_PENALTY[band] if band is not None
+                   else CAPACITY_INTERRUPTION_PENALTY[-1])
+    else:
+        penalty = 0.0
+    if candidate['latency'] is not None:
+        penalty += CAPACITY_LATENCY_PENALTY * candidate['latency'] / 0.1
+    return candidate['hourly'] * (1 + penalty)
+
+
+def find_capacity(config, requirement, regions, zones=None):
+    """Rank where an instance meeting `requirement` could run, best first.
+
+    `requirement` has 'vcpus', 'memory' (GiB), 'arch' ('x86_64' or 'arm64'),
+    'market' ('spot', 'on-demand' or 'auto' for both) and optionally
+    'instance_types' to consider only those. Regions are queried in parallel
+    (types, zone offerings, on-demand and spot prices, interruption bands and
+    latency), and `zones` ({region: [zone, ...]}) can limit the zones used.
+    Each candidate is a dict with region, zone, instance_type, market, vcpus,
+    memory, arch, hourly, on_demand, interruption, latency and score; cheaper
+    scores first, then more vCPUs.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    zones = zones or {}
+    with ThreadPoolExecutor(max_workers=len(regions)) as pool:
+        per_region = pool.map(lambda region: region_capacity(config, region, requirement,
+                                                             requirement['market'], zones.get(region)),
+                              regions)
+        candidates = [candidate for found in per_region for candidate in found]
+    for candidate in candidates:
+        candidate['score'] = score_capacity(candidate)
+    return sorted(candidates, key=lambda candidate: (candidate['score'], -candidate['vcpus']))
+
+
+def describe_capacity(candidate):
+    """One-line summary, e.g. 'c7i.large spot in us-east-1b, $0.0301/h (on-demand $0.0893/h, <5% interrupted)'"""
+    text = (f"{candidate['instance_type']} {candidate['market']} in {candidate['zone']}, "
+            f"${candidate['hourly']:.4f}/h")
+    notes = []
+    if candidate['market'] == 'spot':
+        if candidate['on_demand']:
+            notes.append(f"on-demand ${candidate['on_demand']:.4f}/h")
+        notes.append(f"{SPOT_INTERRUPTION_BANDS[candidate['interruption']]} interrupted"
+                     if candidate['interruption'] is not None else 'interruption rate unknown')
+    return text + (f" ({', '.join(notes)})" if notes else '')
+
+
+def capacity_requirement(config, vcpus=None, memory=None, arch=None, market=None, instance_type=None,
+                         always=False):
+    """The requirement to hand find_capacity(), or None for a plain on-demand deploy.
+
+    Options override the `capacity` section of config.yaml; anything unset
+    defaults to DEFAULT_INSTANCE_TYPE's size, x86_64 and 'auto' (`always`
+    returns that even when nothing is set). An explicit --instance-type only
+    lets the engine pick the zone and market (with --market).
+    """
+    if instance_type:
+        if vcpus is not None or memory is not None:
+            raise click.UsageError('--instance-type cannot be combined with --vcpus/--memory')
+        if market is None:
+            return None
+        return {'vcpus': 0, 'memory': 0, 'arch': arch or 'x86_64', 'market': market,
+                'instance_types': [instance_type]}
+
+    settings = dict(config.get('capacity') or {})
+    for key, value in (('vcpus', vcpus), ('memory', memory), ('arch', arch), ('market', market)):
+        if value is not None:
+            settings[key] = value
+    if not settings and not always:
+        return None
+    default = INSTANCE_TYPES[DEFAULT_INSTANCE_TYPE]
+    return {
+        'vcpus': int(settings.get('vcpus', default['vcpus'])),
+        'memory': float(settings.get('memory', default['memory'])),
+        'arch': settings.get('arch', 'x86_64'),
+        'market': settings.get('market', 'auto'),
+    }
+
+
+def requirement_of(ec2, instance, market='auto'):
+    """A requirement matching an existing instance's vCPUs, memory and architecture"""
+    info = ec2.describe_instance_types(InstanceTypes=[instance['InstanceType']])['InstanceTypes'][0]
+    return {'vcpus': info['VCpuInfo']['DefaultVCpus'], 'memory': info['MemoryInfo']['SizeInMiB'] / 1024,
+            'arch': instance.get('Architecture', 'x86_64'), 'market': market}
+
+
+def pinned_zones(config, region):
+    """{region: [zone]} when terraform.tfvars pins subnet_id (Terraform then ignores the zone), else {}"""
+    import re
+
+    tfvars_file = Path(__file__).parent / 'terraform' / 'terraform.tfvars'
+    if region != config.get('aws_region') or not tfvars_file.exists():
+        return {}
+    match = re.search(r'^\s*subnet_id\s*=\s*"([^"]+)"', tfvars_file.read_text(), re.MULTILINE)
+    if not match:
+        return {}
+    subnets = aws_client(config, 'ec2', region).describe_subnets(SubnetIds=[match.group(1)])['Subnets']
+    return {region: [subnets[0]['AvailabilityZone']]} if subnets else {}
+
+
+def current_placement(config, region, deployment):
+    """(zone, market, type) of a deployment's live instance, or None if it has none"""
+    if not deployment or not deployment.get('instance_id'):
+        return None
+    instance = describe_instances_batched(aws_client(config, 'ec2', region),
+                                          [deployment['instance_id']]).get(deployment['instance_id'])
+    if not instance or instance['State']['Name'] in ('shutting-down', 'terminated'):
+        return None
+    return (instance['Placement']['AvailabilityZone'],
+            'spot' if instance.get('InstanceLifecycle') == 'spot' else 'on-demand',
+            instance['InstanceType'])
+
+
+def choose_capacity(config, requirement, region, deployment=None, label=None, ranked=None):
+    """Pick the best candidate for one deployment in `region`, printing the choice.
+
+    An existing instance keeps its zone and market (moving it would replace
+    it, disk and all), and a spot instance its type too, since EC2 can't
+    change that in place. `ranked` is a dict reused across calls so that
+    deployments asking the same question share one find_capacity(). Raises
+    RuntimeError when nothing fits.
+    """
+    zones = pinned_zones(config, region)
+    placement = current_placement(config, region, deployment)
+    if placement:
+        zones = {region: [placement[0]]}
+        requirement = dict(requirement, market=placement[1])
+        if placement[1] == 'spot':
+            requirement['instance_types'] = [placement[2]]
+    key = json.dumps([region, zones, requirement], sort_keys=True)
+    ranked = {} if ranked is None else ranked
+    if key not in ranked:
+        ranked[key] = find_capacity(config, requirement, [region], zones=zones)
+    candidates = ranked[key]
+    if not candidates:
+        raise RuntimeError(f"No {requirement['market']} capacity in {region} fits "
+                           f"{requirement['vcpus']} vCPU / {requirement['memory']:g} GiB ({requirement['arch']})")
+    best = candidates[0]
+    prefix = f'{label}: ' if label else ''
+    click.echo(f"{prefix}Capacity: {describe_capacity(best)}, best of {len(candidates)}"
+               + (f"; keeping {placement[1]} in {placement[0]}" if placement else ''))
+    return best
+
+
+def placement_tf_vars(deployment, candidate=None):
+    """Terraform variables placing the instance: the engine's choice, else where it already is"""
+    if candidate:
+        return {'instance_type': candidate['instance_type'], 'availability_zone': candidate['zone'],
+                'market_type': candidate['market']}
+    deployment = deployment or {}
+    return {'availability_zone': deployment.get('availability_zone', ''),
+            'market_type': deployment.get('market', 'on-demand')}
+
+
+def placement_from_outputs(outputs):
+    """The zone and market `terraform output` reports, for the deployment's config entry"""
+    placement = {'availability_zone': output_value(outputs, 'availability_zone'),
+                 'market': output_value(outputs, 'market_type')}
+    return {key: value for key, value in placement.items() if value}
+
+
+@telemetry.traced('ssh.run')
+def ssh_run(config, host, command):
+    """Run a shell command as ubuntu@host over the shared connection, never prompting"""
+    import subprocess
+
+    return subprocess.run(ssh_command(config, host, ssh_key_file(config), batch=True) + ['--', command],
+                          stdin=subprocess.DEVNULL, capture_output=True, text=True)
+
+
+def copy_changed_home(config, source_host, target_host):
+    """Stream files under /home changed since SWAP_MARKER from one instance to another"""
+    import subprocess
+
+    sender = subprocess.Popen(
+        ssh_command(config, source_host, ssh_key_file(config), batch=True) + [
+            '--', f'cd / && sudo find home -newer {SWAP_MARKER} \\( -type f -o -type l \\) -print0 '
+                  '| sudo tar -czf - --null -T -'],
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    receiver = subprocess.run(ssh_command(config, target_host, ssh_key_file(config), batch=True)
+                              + ['--', 'sudo tar -xzpf - -C /'],
+                              stdin=sender.stdout, capture_output=True, text=True)
+    sender.stdout.close()
+    if sender.wait() != 0:
+        raise RuntimeError(f'Could not read changed files: {sender.stderr.read().decode().strip()}')
+    if receiver.returncode != 0:
+        raise RuntimeError(f'Could not write changed files: {receiver.stderr.strip()}')
+
+
+def spot_market_options(hibernate=False):
+    """InstanceMarketOptions matching main.tf: a persistent request that stops (or hibernates) on interruption"""
+    return {'MarketType': 'spot', 'SpotOptions': {
+        'SpotInstanceType': 'persistent', 'InstanceInterruptionBehavior': 'hibernate' if hibernate else 'stop'}}
+
+
+async def clone_launch_options(engine, ec2, old, new_type):
+    """run_instances arguments for a `new_type` clone of `old`, launched from an image of it.
+
+    The clone gets the same key, role, network, market, tags and volume tags
+    (minus runtime tags); with hibernation configured, its root volume grows
+    by whatever RAM the new type adds.
+    """
+    import math
+
+    root = next(mapping['Ebs']['VolumeId'] for mapping in old['BlockDeviceMappings']
+                if mapping['DeviceName'] == old['RootDeviceName'])
+    volume = (await engine._call(ec2.describe_volumes, VolumeIds=[root]))['Volumes'][0]
+    # Runtime tags (idle accounting, replacement) belong to the old instance; aws: tags are reserved
+    tags = [tag for tag in old.get('Tags', [])
+            if not tag['Key'].startswith('aws:') and tag['Key'] not in (IDLE_TAG, REPLACED_BY_TAG)]
+    volume_tags = [tag for tag in volume.get('Tags', []) if not tag['Key'].startswith('aws:')]
+    hibernation = (old.get('HibernationOptions') or {}).get('Configured', False)
+
+    options = launch_options_like(old)
+    options['TagSpecifications'] = [spec for spec in ({'ResourceType': 'instance', 'Tags': tags},
+                                                      {'ResourceType': 'volume', 'Tags': volume_tags})
+                                    if spec['Tags']]
+    if old.get('InstanceLifecycle') == 'spot':
+        options['InstanceMarketOptions'] = spot_market_options(hibernation)
+    if hibernation:
+        # The root volume holds RAM while hibernated; grow it if the new type has more
+        old_memory = (await engine._call(instance_type_spec, ec2=ec2, instance_type=old['InstanceType']))['memory']
+        new_memory = (await engine._call(instance_type_spec, ec2=ec2, instance_type=new_type))['memory']
+        options['HibernationOptions'] = {'Configured': True}
+        options['BlockDeviceMappings'] = [{'DeviceName': old['RootDeviceName'], 'Ebs': {
+            'VolumeSize': volume['Size'] + max(0, math.ceil(new_memory - old_memory))}}]
+    return options
+
+
+def subnet_in_zone(ec2, vpc_id, zone):
+    """A subnet of `vpc_id` in `zone`: the zone's default subnet, else the one with most free addresses"""
+    subnets = ec2.describe_subnets(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]},
+                                            {'Name': 'availability-zone', 'Values': [zone]}])['Subnets']
+    if not subnets:
+        raise RuntimeError(f'{vpc_id} has no subnet in {zone}')
+    return max(subnets, key=lambda subnet: (subnet.get('DefaultForAz', False),
+                                            subnet['AvailableIpAddressCount']))['SubnetId']
+
+
+async def swap_instance(engine, ec2, region, instance_id, new_type):
+    """Replace a running instance with a clone of type `new_type`, keeping it online.
+
+    The old instance keeps serving while its root volume is imaged and the
+    clone boots and starts its services. The cutover then stops Tailscale and
+    the web terminal on the old instance, copies files under /home changed
+    since the snapshot, and brings Tailscale up on the clone with the same
+    identity; only then is the old instance stopped (not terminated) and
+    tagged REPLACED_BY_TAG. Anything
+    that fails before the cutover leaves the old instance untouched. Returns
+    (clone description, seconds the user was offline).
+    """
+    import asyncio
+
+    config = engine.config
+    old = (await engine._call(describe_instances_batched, ec2=ec2, instance_ids=[instance_id]))[instance_id]
+    old_host = old.get('PublicIpAddress')
+    if not old_host:
+        raise RuntimeError('A live resize needs the instance to have a public IP for SSH')
+
+    # Everything changed after this point is copied over at the cutover
+    result = await engine._call(ssh_run, config=config, host=old_host,
+                                command=f'sudo touch {SWAP_MARKER} && sync')
+    if result.returncode != 0:
+        raise RuntimeError(f'Could not reach the instance over SSH: {result.stderr.strip()}')
+
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.gmtime())
+    swap_tags = [{'Key': 'Project', 'Value': 'GoldenShell'}, {'Key': 'ManagedBy', 'Value': 'goldenshell-resize'}]
+    image = await engine._call(
+        ec2.create_image, InstanceId=instance_id, NoReboot=True, Name=f'goldenshell-swap-{instance_id}-{stamp}',
+        Description=f'GoldenShell live resize of {instance_id}',
+        TagSpecifications=[{'ResourceType': 'image', 'Tags': swap_tags},
+                           {'ResourceType': 'snapshot', 'Tags': swap_tags}])
+    image_id = image['ImageId']
+    engine.on_event(instance_id, f'snapshotting root volume into {image_id} (still online)')
+
+    clone_id = None
+    cut_over = False
+    try:
+        await engine._call(ec2.get_waiter('image_available').wait, ImageIds=[image_id],
+                           WaiterConfig={'Delay': 10, 'MaxAttempts': 180})
+        engine.on_event(instance_id, f'image {image_id} available')
+
+        response = await engine._call(
+            ec2.run_instances, ImageId=image_id, InstanceType=new_type, MinCount=1, MaxCount=1,
+            UserData=SWAP_USER_DATA, **(await clone_launch_options(engine, ec2, old, new_type)))
+        clone_id = response['Instances'][0]['InstanceId']
+        engine.names[clone_id] = 'new'
+        engine.on_event(clone_id, f'launched from {image_id}')
+
+        await engine._call(ec2.get_waiter('instance_exists').wait, InstanceIds=[clone_id])
+        clone = await engine._after_start(region, clone_id, wait_ready=True)
+        clone_host = clone.get('PublicIpAddress')
+        if not clone_host:
+            raise RuntimeError('The replacement instance has no public IP')
+
+        # Cutover: from here until Tailscale is up on the clone, the user is offline
+        cutover_started = time.monotonic()
+        cut_over = True
+        engine.on_event(instance_id, 'cutting over')
+        result = await engine._call(ssh_run, config=config, host=old_host,
+                                    command='sudo systemctl stop tailscaled ttyd')
+        if result.returncode != 0:
+            raise RuntimeError(f'Could not stop services on the old instance: {result.stderr.strip()}')
+        await engine._call(copy_changed_home, config=config, source_host=old_host, target_host=clone_host)
+        result = await engine._call(
+            ssh_run, config=config, host=clone_host,
+            command=('sudo systemctl unmask --runtime tailscaled && sudo systemctl start tailscaled '
+                     '&& for i in $(seq 30); do sudo tailscale status >/dev/null 2>&1 && exit 0; sleep 1; done; '
+                     'exit 1'))
+        if result.returncode != 0:
+            raise RuntimeError(f'Tailscale did not come up on the replacement: {result.stderr.strip()}')
+        downtime = time.monotonic() - cutover_started
+        engine.on_event(clone_id, f'Tailscale identity moved over ({downtime:.1f}s offline)')
+    except BaseException:
+        if cut_over:
+            await asyncio.shield(engine._call(ssh_run, config=config, host=old_host,
+                                              command='sudo systemctl start tailscaled ttyd'))
+            engine.on_event(instance_id, 'restarted services on the old instance')
+        if clone_id:
+            await asyncio.shield(engine._call(ec2.terminate_instances, InstanceIds=[clone_id]))
+            engine.on_event(clone_id, 'terminated replacement')
+        raise
+    finally:
+        # The old instance keeps its own volume, so the swap image isn't needed either way
+        try:
+            for image in (await engine._call(ec2.describe_images, ImageIds=[image_id]))['Images']:
+                await asyncio.shield(engine._call(delete_image, ec2=ec2, image=image))
+        except Exception as e:
+            engine.on_event(instance_id, click.style(f'could not delete {image_id}: {e}', fg='yellow'))
+
+    await engine._call(ec2.create_tags, Resources=[instance_id],
+                       Tags=[{'Key': REPLACED_BY_TAG, 'Value': clone_id}])
+    await engine.stop(region, [instance_id])
+    return clone, downtime
+
+
+async def relaunch_instance(engine, ec2, region, old, candidate):
+    """Replace an interrupted spot instance with a clone on `candidate` capacity.
+
+    Only EC2 may restart a spot instance it stopped, and only once capacity
+    comes back. Instead, the stopped root volume is imaged and a clone
+    launched from it with the candidate's type, zone and market, keeping the
+    key, role, security groups, tags, hostname, host keys and Tailscale
+    identity. Once the clone runs, the old instance's spot request is
+    cancelled so EC2 won't bring it back too; the old instance stays stopped,
+    tagged REPLACED_BY_TAG. Returns the clone's description.
+    """
+    import asyncio
+
+    instance_id = old['InstanceId']
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.gmtime())
+    relaunch_tags = [{'Key': 'Project', 'Value': 'GoldenShell'},
+                     {'Key': 'ManagedBy', 'Value': 'goldenshell-relaunch'}]
+    image = await engine._call(
+        ec2.create_image, InstanceId=instance_id, Name=f'goldenshell-relaunch-{instance_id}-{stamp}',
+        Description=f'GoldenShell relaunch of interrupted {instance_id}',
+        TagSpecifications=[{'ResourceType': 'image', 'Tags': relaunch_tags},
+                           {'ResourceType': 'snapshot', 'Tags': relaunch_tags}])
+    image_id = image['ImageId']
+    engine.on_event(instance_id, f'imaging root volume into {image_id}')
+
+    clone_id = None
+    try:
+        await engine._call(ec2.get_waiter('image_available').wait, ImageIds=[image_id],
+                           WaiterConfig={'Delay': 10, 'MaxAttempts': 180})
+        engine.on_event(instance_id, f'image {image_id} available')
+
+        options = await clone_launch_options(engine, ec2, old, candidate['instance_type'])
+        if candidate['zone'] != old['Placement']['AvailabilityZone']:
+            options['NetworkInterfaces'][0]['SubnetId'] = await engine._call(
+                subnet_in_zone, ec2=ec2, vpc_id=old['VpcId'], zone=candidate['zone'])
+        options.pop('InstanceMarketOptions', None)
+        if candidate['market'] == 'spot':
+            options['InstanceMarketOptions'] = spot_market_options('HibernationOptions' in options)
+        response = await engine._call(
+            ec2.run_instances, ImageId=image_id, InstanceType=candidate['instance_type'],
+            MinCount=1, MaxCount=1, UserData=RELAUNCH_USER_DATA, **options)
+        clone_id = response['Instances'][0]['InstanceId']
+        engine.names[clone_id] = f"{engine.names.get(instance_id, instance_id)} (new)"
+        engine.on_event(clone_id, f"launched from {image_id}: {candidate['instance_type']} "
+                                  f"{candidate['market']} in {candidate['zone']}")
+
+        await engine._call(ec2.get_waiter('instance_exists').wait, InstanceIds=[clone_id])
+        clone = await engine._after_start(region, clone_id, wait_ready=False)
+    except BaseException:
+        if clone_id:
+            await asyncio.shield(engine._call(ec2.terminate_instances, InstanceIds=[clone_id]))
+            engine.on_event(clone_id, 'terminated replacement')
+        raise
+    finally:
+        # The clone has its own volume now, so the image isn't needed either way
+        try:
+            for image in (await engine._call(ec2.describe_images, ImageIds=[image_id]))['Images']:
+                await asyncio.shield(engine._call(delete_image, ec2=ec2, image=image))
+        except Exception as e:
+            engine.on_event(instance_id, click.style(f'could not delete {image_id}: {e}', fg='yellow'))
+
+    await engine._call(ec2.create_tags, Resources=[instance_id],
+                       Tags=[{'Key': REPLACED_BY_TAG, 'Value': clone['InstanceId']}])
+    if old.get('SpotInstanceRequestId'):
+        await engine._call(ec2.cancel_spot_instance_requests,
+                           SpotInstanceRequestIds=[old['SpotInstanceRequestId']])
+        engine.on_event(instance_id, f"cancelled {old['SpotInstanceRequestId']}; left stopped")
+    return clone
+
+
+def terminate_replaced(ec2, instance_id):
+    """Terminate the instances `instance_id` replaced, and the ones those replaced; returns their IDs"""
+    replaced = {}
+    paginator = ec2.get_paginator('describe_instances')
+    for page in paginator.paginate(Filters=[
+            {'Name': 'tag-key', 'Values': [REPLACED_BY_TAG]},
+            {'Name': 'instance-state-name', 'Values': ['pending', 'running', 'stopping', 'stopped']}]):
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+                replaced.setdefault(tags[REPLACED_BY_TAG], []).append(instance['InstanceId'])
+
+    found = []
+    pending = [instance_id]
+    while pending:
+        for old_id in replaced.get(pending.pop(), []):
+            if old_id not in found:
+                found.append(old_id)
+                pending.append(old_id)
+    if found:
+        ec2.terminate_instances(InstanceIds=found)
+    return found
+
+
+def monthly_budget_limit(config):
+    """The monthly budget in USD: config.yaml, else terraform.tfvars, else the Terraform default"""
+    import re
+
+    if config.get('monthly_budget_limit') is not None:
+        return float(config.get('monthly_budget_limit'))
+    tfvars_file = Path(__file__).parent / 'terraform' / 'terraform.tfvars'
+    if tfvars_file.exists():
+        match = re.search(r'^\s*monthly_budget_limit\s*=\s*([\d.]+)', tfvars_file.read_text(), re.MULTILINE)
+        if match:
+            return float(match.group(1))
+    return DEFAULT_MONTHLY_BUDGET
+
+
+def warm_pool_plan(config, volume_gb, instance_type):
+    """Size the warm pool of one region against the budget.
+
+    Returns (instances to keep, monthly cost per instance, monthly allowance).
+    A pool instance costs its stopped EBS volume plus one provisioning run per
+    age-out cycle; the pool as a whole may spend WARM_POOL_BUDGET_SHARE of
+    monthly_budget_limit, so warm_pool_size is capped to fit.
+    """
+    wanted = int(config.get('warm_pool_size', 0))
+    max_age = config.get('warm_pool_max_age_days', WARM_POOL_MAX_AGE_DAYS)
+    hourly = (INSTANCE_TYPES.get(instance_type) or {}).get('hourly') or 0
+    per_instance = volume_gb * EBS_GB_MONTH + hourly * WARM_POOL_FILL_MINUTES / 60 * 30 / max_age
+    allowance = monthly_budget_limit(config) * WARM_POOL_BUDGET_SHARE
+    return min(wanted, int(allowance // per_instance)), per_instance, allowance
+
+
+def pool_tag(instance):
+    """Pool state of an instance from its tags: 'provisioning', 'ready', 'claimed' or None"""
+    return next((tag['Value'] for tag in instance.get('Tags', []) if tag['Key'] == WARM_POOL_TAG), None)
+
+
+def list_pool_instances(ec2):
+    """Unclaimed warm-pool instances in a region, oldest first"""
+    instances = []
+    paginator = ec2.get_paginator('describe_instances')
+    for page in paginator.paginate(Filters=[
+            {'Name': f'tag:{WARM_POOL_TAG}', 'Values': ['provisioning', 'ready']},
+            {'Name': 'instance-state-name', 'Values': ['pending', 'running', 'stopping', 'stopped']}]):
+        for reservation in page['Reservations']:
+            instances += reservation['Instances']
+    return sorted(instances, key=lambda instance: instance['LaunchTime'])
+
+
+def instance_age_days(instance):
+    """Days since an instance (a describe_instances entry) was launched"""
+    from datetime import datetime, timezone
+
+    return (datetime.now(timezone.utc) - instance['LaunchTime']).total_seconds() / 86400
+
+
+def pool_template(config, region):
+    """Describe the Terraform-deployed instance whose key, role and network pool instances copy"""
+    ec2 = aws_client(config, 'ec2', region)
+    candidates = []
+    deployment = config.get('last_deployment') or {}
+    if deployment.get('instance_id') and config.get('aws_region') == region:
+        candidates.append(deployment['instance_id'])
+    candidates += [dep['instance_id'] for dep in config.environments().values()
+                   if dep and dep.get('instance_id') and dep.get('source') != 'pool'
+                   and (dep.get('region') or config.get('aws_region')) == region]
+
+    instances = describe_instances_batched(ec2, candidates) if candidates else {}
+    for instance_id in candidates:
+        instance = instances.get(instance_id)
+        if instance and instance['State']['Name'] not in ('shutting-down', 'terminated'):
+            return instance
+    raise RuntimeError(f'No GoldenShell instance deployed by Terraform in {region} to copy settings from; '
+                       f'run "goldenshell deploy" there first')
+
+
+def launch_options_like(instance):
+    """run_instances arguments giving a new instance the same key, role, subnet and security groups"""
+    options = {
+        'IamInstanceProfile': {'Arn': instance['IamInstanceProfile']['Arn']},
+        'NetworkInterfaces': [{'DeviceIndex': 0, 'SubnetId': instance['SubnetId'], 'AssociatePublicIpAddress': True,
+                               'Groups': [group['GroupId'] for group in instance['SecurityGroups']]}],
+        'MetadataOptions': {'HttpTokens': 'required', 'HttpEndpoint': 'enabled',
+                            'HttpPutResponseHopLimit': 1, 'InstanceMetadataTags': 'enabled'},
+    }
+    if instance.get('KeyName'):
+        options['KeyName'] = instance['KeyName']
+    return options
+
+
+async def provision_pool_instances(engine, ec2, region, count, template, image, instance_type, user_data,
+                                   volume_gb):
+    """Launch `count` pool instances and wait for each to set itself up and power off.
+
+    Instances are tagged 'provisioning' until user-data reports success on the
+    console, then 'ready'; one that fails is terminated. Returns the per-instance
+    results (instance ID or exception).
+    """
+    import asyncio
+
+    tags = [
+        {'Key': 'Name', 'Value': 'goldenshell-pool'},
+        {'Key': 'Project', 'Value': 'GoldenShell'},
+        {'Key': 'ManagedBy', 'Value': 'goldenshell-pool'},
+        {'Key': 'AutoShutdown', 'Value': 'enabled'},
+        {'Key': WARM_POOL_TAG, 'Value': 'provisioning'},
+    ]
+    response = await engine._call(
+        ec2.run_instances, ImageId=image['ImageId'], InstanceType=instance_type,
+        MinCount=count, MaxCount=count, UserData=user_data,
+        InstanceInitiatedShutdownBehavior='stop',
+        BlockDeviceMappings=[{'DeviceName': image['RootDeviceName'], 'Ebs': {
+            'VolumeSize': volume_gb, 'VolumeType': 'gp3', 'Encrypted': True, 'DeleteOnTermination': True}}],
+        TagSpecifications=[{'ResourceType': 'instance', 'Tags': tags},
+                           {'ResourceType': 'volume', 'Tags': tags[:3]}],
+        **launch_options_like(template))
+
+    async def settle(instance_id):
+        engine.on_event(instance_id, f"launched from {image['ImageId']}")
+        try:
+            await engine._call(ec2.get_waiter('instance_exists').wait, InstanceIds=[instance_id])
+            await engine.wait_for_state(region, instance_id, ('stopped',))
+            output = await engine._call(console_output, ec2=ec2, instance_id=instance_id, latest=False)
+            if 'GoldenShell pool setup failed' in output:
+                raise RuntimeError('Setup failed on the instance; see its console output')
+            if 'GoldenShell pool instance ready' not in output:
+                engine.on_event(instance_id, click.style(
+                    'console output unavailable; assuming setup completed', fg='yellow'))
+            await engine._call(ec2.create_tags, Resources=[instance_id],
+                               Tags=[{'Key': WARM_POOL_TAG, 'Value': 'ready'}])
+            engine.on_event(instance_id, click.style('ready', fg='green'))
+            return instance_id
+        except BaseException:
+            await asyncio.shield(engine._call(ec2.terminate_instances, InstanceIds=[instance_id]))
+            engine.on_event(instance_id, 'terminated')
+            raise
+
+    ids = [instance['InstanceId'] for instance in response['Instances']]
+    for number, instance_id in enumerate(ids, 1):
+        engine.names[instance_id] = f'pool-{number}'
+    return await asyncio.gather(*(engine.guard(instance_id, settle(instance_id)) for instance_id in ids))
+
+
+def fill_warm_pool(config, region):
+    """Age out stale pool instances in a region and provision up to the planned size.
+
+    Ready instances older than warm_pool_max_age_days, or built from an image
+    other than the newest baked (or stock) AMI, are replaced, as are ones stuck
+    provisioning. Returns the number of instances that failed to provision.
+    """
+    import asyncio
+
+    ec2 = aws_client(config, 'ec2', region)
+    instance_type = config.get('warm_pool_instance_type', 't3.medium')
+    template = pool_template(config, region)
+    image = find_baked_ami(ec2) or find_stock_ami(ec2)
+    root = next(mapping for mapping in template['BlockDeviceMappings']
+                if mapping['DeviceName'] == template['RootDeviceName'])
+    volume_gb = ec2.describe_volumes(VolumeIds=[root['Ebs']['VolumeId']])['Volumes'][0]['Size']
+    size, per_instance, allowance = warm_pool_plan(config, volume_gb, instance_type)
+    if size < int(config.get('warm_pool_size', 0)):
+        click.echo(click.style(
+            f"warm_pool_size {config.get('warm_pool_size')} capped to {size} in {region}: "
+            f"~${per_instance:.2f}/month each, pool allowance ${allowance:.2f}/month "
+            f"({WARM_POOL_BUDGET_SHARE:.0%} of monthly_budget_limit)", fg='yellow'))
+
+    max_age = config.get('warm_pool_max_age_days', WARM_POOL_MAX_AGE_DAYS)
+    keep, retire = [], []
+    for instance in list_pool_instances(ec2):
+        if pool_tag(instance) == 'provisioning':
+            stale = instance_age_days(instance) * 86400 > BAKE_TIMEOUT
+        else:
+            stale = instance_age_days(instance) > max_age or instance['ImageId'] != image['ImageId']
+        (retire if stale else keep).append(instance)
+    # Over the planned size: keep the newest
+    retire += keep[:max(0, len(keep) - size)]
+    keep = keep[max(0, len(keep) - size):]
+
+    if retire:
+        ids = [instance['InstanceId'] for instance in retire]
+        ec2.terminate_instances(InstanceIds=ids)
+        click.echo(f"Retired {len(ids)} pool instance(s) in {region}: {', '.join(ids)}")
+
+    missing = size - len(keep)
+    if missing <= 0:
+        click.echo(click.style(f'Warm pool in {region} is full ({len(keep)}/{size})', fg='green'))
+        return 0
+
+    click.echo(click.style(f"Provisioning {missing} pool instance(s) in {region} from {image['ImageId']}...",
+                           fg='cyan'))
+    environment = next((tag['Value'] for tag in template.get('Tags', []) if tag['Key'] == 'Environment'),
+                       'default')
+    user_data = render_user_data(
+        'pool', region,
+        ssm_prefix='/goldenshell' if environment == 'default' else f'/goldenshell/{environment}',
+        auto_shutdown_minutes=config.get('auto_shutdown_minutes', 30),
+        web_terminal=web_terminal_settings(config))
+    engine = LifecycleEngine(config, timeout=BAKE_TIMEOUT)
+    try:
+        results = asyncio.run(provision_pool_instances(engine, ec2, region, missing, template, image,
+                                                       instance_type, user_data, volume_gb))
+    finally:
+        engine.cache.save()
+    return sum(1 for result in results if isinstance(result, Exception))
+
+
+async def claim_pool_instance(engine, ec2, region, instance, name, instance_type):
+    """Turn a ready pool instance into environment `name` and return its registry entry.
+
+    The instance is tagged 'claimed' first so no other claim or fill counts it,
+    resized if the pool type differs, started, and renamed (hostname and
+    Tailscale name) to goldenshell-<name>.
+    """
+    instance_id = instance['InstanceId']
+    hostname = f'goldenshell-{name}'
+    await engine._call(ec2.create_tags, Resources=[instance_id], Tags=[
+        {'Key': WARM_POOL_TAG, 'Value': 'claimed'},
+        {'Key': 'Name', 'Value': hostname},
+        {'Key': 'Environment', 'Value': name},
+    ])
+    if instance['InstanceType'] != instance_type:
+        await engine._call(ec2.modify_instance_attribute, InstanceId=instance_id,
+                           InstanceType={'Value': instance_type})
+        engine.on_event(instance_id, f"changed type {instance['InstanceType']} → {instance_type}")
+    await engine.start(region, [instance_id], wait=False)
+    started = await engine._after_start(region, instance_id, wait_ready=True)
+    if not started.get('PublicIpAddress'):
+        raise RuntimeError('The instance has no public IP to finish the claim over SSH')
+
+    result = await engine._call(ssh_run, config=engine.config, host=started['PublicIpAddress'],
+                                command=WARM_POOL_CLAIM_SCRIPT.format(hostname=hostname))
+    if result.returncode != 0:
+        raise RuntimeError(f'Could not rename the instance: {result.stderr.strip()}')
+    ts_host, _, ts_ip = result.stdout.strip().partition('\t')
+    tags = [{'Key': TAILSCALE_HOST_TAG, 'Value': ts_host}, {'Key': TAILSCALE_IP_TAG, 'Value': ts_ip}]
+    await engine._call(ec2.create_tags, Resources=[instance_id], Tags=[tag for tag in tags if tag['Value']])
+    engine.on_event(instance_id, click.style(f'claimed as {ts_host or hostname}', fg='green'))
+    return {'instance_id': instance_id, 'public_ip': started['PublicIpAddress'], 'region': region,
+            'source': 'pool'}
+
+
+def claim_warm_instances(config, targets, instance_type):
+    """Claim ready pool instances for new environments in {name: region}.
+
+    Registers each claimed environment and returns {name: region} for them;
+    environments left over (no ready instance, or the claim failed) are for
+    Terraform to deploy.
+    """
+    import asyncio
+
+    plans = []
+    for region in sorted(set(targets.values())):
+        ec2 = aws_client(config, 'ec2', region)
+        ready = [instance for instance in list_pool_instances(ec2)
+                 if pool_tag(instance) == 'ready' and instance['State']['Name'] == 'stopped']
+        names = [name for name, target in targets.items() if target == region]
+        plans += [(name, region, ec2, instance) for name, instance in zip(names, ready)]
+    if not plans:
+        return {}
+
+    click.echo(click.style(f'Claiming {len(plans)} warm instance(s) from the pool...', fg='cyan'))
+    engine = LifecycleEngine(config, names={instance['InstanceId']: name for name, _, _, instance in plans})
+
+    async def run_all():
+        return await asyncio.gather(*(
+            engine.guard(instance['InstanceId'],
+                         claim_pool_instance(engine, ec2, region, instance, name, instance_type))
+            for name, region, ec2, instance in plans))
+
+    try:
+        results = asyncio.run(run_all())
+    finally:
+        engine.cache.save()
+
+    claimed = {}
+    for (name, region, ec2, instance), result in zip(plans, results):
+        if isinstance(result, Exception):
+            # Never hand a half-claimed instance out again
+            try:
+                ec2.terminate_instances(InstanceIds=[instance['InstanceId']])
+            except Exception as e:
+                click.echo(click.style(f"Could not terminate {instance['InstanceId']}: {e}", fg='yellow'))
+            click.echo(click.style(f'{name}: deploying with Terraform instead', fg='yellow'))
+            continue
+        config.set_environment(name, result)
+        claimed[name] = region
+    config.save()
+    return claimed
+
+
+def refill_warm_pool_in_background(regions):
+    """Start a detached `goldenshell pool fill` for the regions, logging to WARM_POOL_LOG_FILE"""
+    import subprocess
+
+    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    with open(WARM_POOL_LOG_FILE, 'a') as log:
+        subprocess.Popen([sys.executable, str(Path(__file__).resolve()), 'pool', 'fill']
+                         + [f'--region={region}' for region in sorted(regions)],
+                         stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                         start_new_session=True)
+
+
+def terraform_init_blocks(text):
+    """Extract the top-level terraform/provider/module blocks from HCL source.
+
+    These are the only blocks whose changes require a new `terraform init`.
+    """
+    blocks = []
+    current = None
+    depth = 0
+    for line in text.splitlines():
+        if current is None:
+            if line.split(' ', 1)[0] not in ('terraform', 'provider', 'module') or '{' not in line:
+                continue
+            current = []
+        current.append(line)
+        depth += line.count('{') - line.count('}')
+        if depth <= 0:
+            blocks.append('\n'.join(current))
+            current = None
+            depth = 0
+    return blocks
+
+
+def terraform_fingerprints(tf_dir, tf_vars):
+    """Fingerprint a Terraform directory and its variables.
+
+    Returns (deploy_fingerprint, init_fingerprint). The first changes when any
+    file or variable that could change the plan changes. The second changes only
+    when providers, backend or modules (what `terraform init` installs) change.
+    Variables are hashed, never stored.
+    """
+    import hashlib
+
+    deploy_hash = hashlib.sha256()
+    init_hash = hashlib.sha256()
+
+    for path in sorted(p for p in tf_dir.rglob('*') if p.is_file()):
+        relative = path.relative_to(tf_dir)
+        if relative.parts[0] in TERRAFORM_FINGERPRINT_IGNORE:
+            continue
+        content = path.read_bytes()
+        deploy_hash.update(str(relative).encode() + b'\0' + content + b'\0')
+
+        if path.name == '.terraform.lock.hcl':
+            init_hash.update(content)
+        elif path.suffix == '.tf':
+            for block in terraform_init_blocks(content.decode('utf-8', 'replace')):
+                init_hash.update(block.encode())
+
+    deploy_hash.update(json.dumps(tf_vars, sort_keys=True, default=str).encode())
+    return deploy_hash.hexdigest(), init_hash.hexdigest()
+
+
+def load_deploy_cache(tf_dir):
+    """Get the cached fingerprints and outputs of the last deploy from `tf_dir`"""
+    return read_json(DEPLOY_CACHE_FILE, {}).get(str(tf_dir)) or {}
+
+
+def save_deploy_cache(tf_dir, entry):
+    """Store (or with entry=None, drop) the deploy cache for `tf_dir`"""
+    cache = read_json(DEPLOY_CACHE_FILE, {})
+    if entry is None:
+        cache.pop(str(tf_dir), None)
+    else:
+        cache[str(tf_dir)] = entry
+    write_json_atomic(DEPLOY_CACHE_FILE, cache)
+
+
+def timed_terraform(timings, phase, fn, *args, **kwargs):
+    """Run a python_terraform call, recording its duration under `phase`"""
+    started = time.perf_counter()
+    try:
+        with telemetry.span(f'terraform.{phase}'):
+            return fn(*args, **kwargs)
+    finally:
+        timings.append((phase, time.perf_counter() - started))
+
+
+def echo_terraform_timings(timings):
+    """Print how long each Terraform phase took"""
+    if not timings:
+        return
+    total = sum(seconds for _, seconds in timings)
+    phases = ', '.join(f'{phase} {seconds:.1f}s' for phase, seconds in timings)
+    click.echo(click.style(f'Terraform timings: {phases} (total {total:.1f}s)', fg='cyan'))
+
+
+class TerraformError(Exception):
+    """A Terraform command exited with an error"""
+
+
+def select_terraform_workspace(tf, tf_dir, workspace, log=click.echo):
+    """Select (creating if needed) a Terraform workspace in an initialized `tf_dir`"""
+    workspace_file = tf_dir / '.terraform' / 'environment'
+    current = workspace_file.read_text().strip() if workspace_file.exists() else 'default'
+    if current != workspace:
+        log(f'Selecting Terraform workspace {workspace}...')
+        return_code, stdout, stderr = tf.set_workspace(workspace)
+        if return_code != 0:
+            return_code, stdout, stderr = tf.create_workspace(workspace)
+        if return_code != 0:
+            raise TerraformError(f'Error selecting workspace: {stderr}')
+
+
+def terraform_env(config, region):
+    """Environment for Terraform commands: this process's plus the configured credentials and `region`.
+
+    It is handed to each Terraform subprocess (see terraform_client) instead
+    of being written into os.environ, so one region never leaks into another.
+    """
+    env = dict(os.environ, AWS_DEFAULT_REGION=region)
+    for name, key in (('AWS_ACCESS_KEY_ID', 'aws_access_key_id'),
+                      ('AWS_SECRET_ACCESS_KEY', 'aws_secret_access_key')):
+        if config.get(key):
+            env[name] = config.get(key)
+    return env
+
+
+def terraform_vars(config, region, deployment, candidate=None, environment=None, ami_id='', instance_type=None):
+    """The -var values of a deployment's Terraform runs; apply, import and destroy all use these.
+
+    `candidate` is the capacity engine's choice (see placement_tf_vars); it
+    overrides `instance_type`, which defaults to the type the deployment was
+    last deployed with. `environment` names a `deploy --env` environment.
+    """
+    deployment = deployment or {}
+    tf_vars = {
+        'aws_region': region,
+        'instance_type': instance_type or deployment.get('instance_type') or DEFAULT_INSTANCE_TYPE,
+        'key_name': config.get('ssh_key_name'),
+        'tailscale_auth_key': config.get('tailscale_auth_key'),
+        'ami_id': ami_id,
+        **web_terminal_tf_vars(config),
+        **placement_tf_vars(deployment, candidate),
+    }
+    if environment:
+        tf_vars.update(environment=environment, instance_name=f'goldenshell-{environment}')
+    return tf_vars
+
+
+def terraform_client(tf_dir, env):
+    """A python_terraform.Terraform for `tf_dir` whose commands run with `env` (see terraform_env)"""
+    import subprocess
+    from python_terraform import Terraform
+
+    class EnvTerraform(Terraform):
+        # python_terraform only ever passes os.environ on, so run its command lines here
+        def cmd(self, cmd, *args, **kwargs):
+            kwargs.pop('capture_output', None)
+            command = self.generate_cmd_string(cmd, *args, **kwargs)
+            try:
+                result = subprocess.run(command, capture_output=True, text=True, cwd=self.working_dir, env=env)
+            finally:
+                self.temp_var_files.clean_up()
+            if result.returncode == 0:
+                self.read_state_file()
+            return result.returncode, result.stdout, result.stderr
+
+    return EnvTerraform(working_dir=str(tf_dir))
+
+
+def terraform_deploy(tf_dir, tf_vars, env, cached, force=False, timings=None, log=click.echo, workspace=None):
+    """Init/plan/apply `tf_dir` incrementally and return (outputs, cache_entry).
+
+    `env` is the commands' environment (see terraform_env). `cached` is the
+    deploy cache entry from the last run in `tf_dir`. When the fingerprint
+    still matches, no Terraform command runs and cache_entry is None.
+    `workspace` selects (creating if needed) a Terraform workspace so several
+    environments can share one state backend.
+    """
+    tf = terraform_client(tf_dir, env)
+    timings = [] if timings is None else timings
+    deploy_fingerprint, init_fingerprint = terraform_fingerprints(tf_dir, tf_vars)
+
+    if not force and cached.get('fingerprint') == deploy_fingerprint and cached.get('outputs'):
+        # Nothing that could change the plan has changed since the last deploy
+        log(f'No changes since the last deploy (fingerprint {deploy_fingerprint[:12]}); '
+            'reusing cached outputs. Use --force to re-plan.')
+        return cached['outputs'], None
+
+    # Initialize Terraform (only when providers/backend changed)
+    if (force or cached.get('init_fingerprint') != init_fingerprint
+            or not (tf_dir / '.terraform').is_dir()):
+        log('Initializing Terraform...')
+        return_code, stdout, stderr = timed_terraform(timings, 'init', tf.init)
+        if return_code != 0:
+            raise TerraformError(f'Error initializing: {stderr}')
+    else:
+        log('Providers and backend unchanged; skipping terraform init.')
+
+    if workspace:
+        select_terraform_workspace(tf, tf_dir, workspace, log=log)
+
+    # Plan, and only apply when the plan has changes (exit code 2)
+    log('Planning changes...')
+    return_code, stdout, stderr = timed_terraform(
+        timings, 'plan', tf.plan, out=DEPLOY_PLAN_FILE, var=tf_vars)
+
+    if return_code == 2:
+        log('Creating AWS resources...')
+        return_code, stdout, stderr = timed_terraform(
+            timings, 'apply', tf.apply, DEPLOY_PLAN_FILE, skip_plan=True, var=None)
+    elif return_code == 0:
+        log('Infrastructure is up to date; skipping apply.')
+    (tf_dir / DEPLOY_PLAN_FILE).unlink(missing_ok=True)
+
+    if return_code != 0:
+        raise TerraformError(f'Error deploying: {stderr}')
+
+    outputs = timed_terraform(timings, 'output', tf.output, json=True) or {}
+    return outputs, {
+        'fingerprint': deploy_fingerprint,
+        'init_fingerprint': init_fingerprint,
+        'outputs': outputs,
+        'deployed_at': time.time(),
+    }
+
+
+def output_value(outputs, name):
+    """Get a value from `terraform output -json` results"""
+    return (outputs.get(name) or {}).get('value')
+
+
+def prepare_workspace(name):
+    """Mirror the bundled Terraform directory into ~/.goldenshell/workspaces/<name>.
+
+    Each environment gets its own working directory so providers, plan files
+    and the selected Terraform workspace never clash between parallel runs.
+    Its state and lock file (WORKSPACE_LOCAL_PATHS) are never touched.
+    """
+    import shutil
+
+    src = Path(__file__).parent / 'terraform'
+    dst = WORKSPACES_DIR / name
+    dst.mkdir(parents=True, exist_ok=True)
+
+    # Drop files that were removed from the bundled directory
+    for path in dst.iterdir():
+        if path.name not in WORKSPACE_LOCAL_PATHS and not (src / path.name).exists():
+            shutil.rmtree(path) if path.is_dir() else path.unlink()
+
+    shutil.copytree(src, dst, dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns(*WORKSPACE_LOCAL_PATHS))
+    return dst
+
+
+def deploy_environment(name, region, tf_vars, env, cached, force=False):
+    """Deploy one environment in its own workspace (runs in a worker process).
+
+    Never raises: the result dict carries either `outputs` and `cache_entry`
+    or an `error`, plus the log lines and phase timings of the run.
+    """
+    result = {'name': name, 'region': region, 'log': [], 'timings': []}
+
+    try:
+        tf_dir = prepare_workspace(name)
+        result['tf_dir'] = str(tf_dir)
+        result['outputs'], result['cache_entry'] = terraform_deploy(
+            tf_dir, tf_vars, env, cached, force=force, timings=result['timings'],
+            log=result['log'].append, workspace=name)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+def parse_deploy_targets(config, env_specs, regions):
+    """Turn `--env NAME[=REGION]` and `--region REGION` into {name: region}"""
+    import re
+
+    targets = {}
+    specs = [(spec.partition('=')[0], spec.partition('=')[2]) for spec in env_specs]
+    specs += [(region, region) for region in regions]
+
+    for name, region in specs:
+        if not re.fullmatch(r'[A-Za-z0-9][A-Za-z0-9_-]*', name):
+            raise click.BadParameter(
+                f'Invalid environment name "{name}" (use letters, digits, "-" and "_")')
+        region = region or targets.get(name) or config.get('aws_region')
+        if targets.get(name, region) != region:
+            raise click.BadParameter(f'Environment "{name}" given more than one region')
+        targets[name] = region
+    return targets
+
+
+def deploy_parallel(config, targets, instance_type, force=False, parallel=DEPLOY_PARALLELISM, use_baked=True,
+                    placements=None, requirements=None):
+    """Deploy several environments concurrently, each in an isolated workspace.
+
+    `placements` maps environments to the capacity engine's choice for them
+    (see choose_capacity()) and `requirements` to the requirement it was
+    given, which is saved for later deploys; other environments keep their
+    zone and market. Returns the number of environments that failed.
+    Successful ones are registered in the config even when others fail.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    deploy_cache = read_json(DEPLOY_CACHE_FILE, {})
+    workers = max(1, min(parallel, len(targets)))
+
+    click.echo(click.style(
+        f'Deploying {len(targets)} environment(s), {workers} at a time...', fg='cyan'))
+
+    # Baked AMIs are per region; look each region up once, before forking
+    placements = placements or {}
+    requirements = requirements or {}
+    arches = {name: placements[name]['arch'] if name in placements else 'x86_64' for name in targets}
+    amis = {(region, arch): baked_ami_for(config, region, use_baked, arch)
+            for region, arch in {(targets[name], arches[name]) for name in targets}}
+    environments = config.environments()
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for name, region in targets.items():
+            tf_vars = terraform_vars(config, region, environments.get(name), placements.get(name),
+                                     environment=name, ami_id=amis[region, arches[name]],
+                                     instance_type=instance_type)
+            cached = deploy_cache.get(str(WORKSPACES_DIR / name)) or {}
+            futures[pool.submit(deploy_environment, name, region, tf_vars,
+                                terraform_env(config, region), cached, force)] = name
+            results[name] = {'instance_type': tf_vars['instance_type']}
+
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died
+                result = {'name': name, 'region': targets[name], 'log': [], 'timings': [], 'error': str(e)}
+            results[name].update(result)
+
+            # Print each environment's output as one block, as soon as it finishes
+            click.echo(click.style(f'\n── {name} ({result["region"]}) ──', bold=True))
+            for line in result['log']:
+                click.echo(line)
+            echo_terraform_timings(result['timings'])
+            if 'error' in result:
+                click.echo(click.style(f'✗ {result["error"]}', fg='red'))
+            else:
+                click.echo(click.style('✓ Deployed', fg='green'))
+
+    # Merge results; only the parent process touches the config and caches
+    failures = 0
+    for name, result in results.items():
+        if 'error' in result:
+            failures += 1
+            continue
+        if result.get('cache_entry'):
+            save_deploy_cache(result['tf_dir'], result['cache_entry'])
+        requirement = requirements.get(name)
+        config.set_environment(name, {
+            'instance_id': output_value(result['outputs'], 'instance_id'),
+            'public_ip': output_value(result['outputs'], 'public_ip'),
+            'region': result['region'],
+            'instance_type': result['instance_type'],
+            **placement_from_outputs(result['outputs']),
+            **({'capacity': requirement} if requirement else {}),
+        })
+    config.save()
+
+    click.echo(f"\n{'Environment':20} {'Region':16} {'Instance ID':21} {'Public IP':16} Result")
+    for name in targets:
+        result = results[name]
+        outputs = result.get('outputs') or {}
+        click.echo(
+            f"{name:20} {result['region']:16} {output_value(outputs, 'instance_id') or '-':21} "
+            f"{output_value(outputs, 'public_ip') or '-':16} "
+            + (click.style('failed', fg='red') if 'error' in result else click.style('ok', fg='green')))
+    return failures
+
+
+class LifecycleEngine:
+    """Run start/stop/resize transitions for many instances concurrently.
+
+    Blocking boto3 calls run in asyncio's default thread pool. Every instance
+    being waited on in a region shares one poll loop that sends a single
+    batched describe per round, polling every LIFECYCLE_POLL_INITIAL seconds
+    while states are changing and backing off up to LIFECYCLE_POLL_MAX while
+    they aren't. State changes are streamed through `on_event` as they're seen.
+    """
+
+    def __init__(self, config, names=None, on_event=None, timeout=LIFECYCLE_TIMEOUT):
+        self.config = config
+        self.names = names or {}
+        self.on_event = on_event or self._echo_event
+        self.timeout = timeout
+        self.cache = instance_cache(config)
+        self.started_at = time.monotonic()
+        self._states = {}
+        self._waiters = {}
+        self._pollers = {}
+        self._wakeups = {}
+
+    def _echo_event(self, instance_id, message):
+        """Default event sink: print a timestamped line per event"""
+        elapsed = time.monotonic() - self.started_at
+        name = self.names.get(instance_id, instance_id)
+        click.echo(f"[{elapsed:6.1f}s] {name}: {message}")
+
+    def _observe(self, instance_id, state):
+        """Record a state and emit an event if it changed. Returns True on change."""
+        previous = self._states.get(instance_id)
+        self._states[instance_id] = state
+        if previous == state:
+            return False
+        self.on_event(instance_id, f"{previous} → {state}" if previous else state)
+        return True
+
+    def _failed(self, instance_id, error):
+        """Report an instance's failure; returns the error"""
+        self.on_event(instance_id, click.style(f'failed: {str(error) or type(error).__name__}', fg='red'))
+        return error
+
+    async def guard(self, instance_id, coro):
+        """Await a per-instance coroutine, reporting (and returning) its failure"""
+        try:
+            return await coro
+        except Exception as e:
+            return self._failed(instance_id, e)
+
+    async def _call(self, fn, **kwargs):
+        """Run a blocking boto3 call in the thread pool"""
+        import asyncio
+        import functools
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(fn, **kwargs))
+
+    async def wait_for_state(self, region, instance_id, targets, failures=('terminated',)):
+        """Wait until an instance reaches one of `targets`, returning its description"""
+        import asyncio
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(region, {}).setdefault(instance_id, []).append(
+            (targets, failures, future))
+
+        wakeup = self._wakeups.setdefault(region, asyncio.Event())
+        wakeup.set()
+        poller = self._pollers.get(region)
+        if poller is None or poller.done():
+            self._pollers[region] = asyncio.create_task(self._poll_region(region))
+
+        return await asyncio.wait_for(future, self.timeout)
+
+    async def _poll_region(self, region):
+        """Poll all waited-on instances in a region with one describe per round"""
+        import asyncio
+
+        ec2 = aws_client(self.config, 'ec2', region)
+        waiters = self._waiters[region]
+        wakeup = self._wakeups[region]
+        interval = LIFECYCLE_POLL_INITIAL
+
+        while True:
+            # Drop waiters that were resolved or timed out
+            for instance_id in list(waiters):
+                waiters[instance_id] = [w for w in waiters[instance_id] if not w[2].done()]
+                if not waiters[instance_id]:
+                    del waiters[instance_id]
+            if not waiters:
+                return
+
+            wakeup.clear()
+            polled = list(waiters)
+            instances = await self._call(describe_instances_batched, ec2=ec2, instance_ids=polled)
+
+            changed = False
+            for instance_id in polled:
+                # Waiters added while the describe was in flight wait for the next round
+                pending = waiters[instance_id]
+                instance = instances.get(instance_id)
+                if instance is None:
+                    for _, _, future in pending:
+                        if not future.done():
+                            future.set_exception(RuntimeError(f'Instance {instance_id} not found'))
+                    continue
+
+                self.cache.update(instance)
+                state = instance['State']['Name']
+                changed = self._observe(instance_id, state) or changed
+                for targets, failures, future in pending:
+                    if future.done():
+                        continue
+                    if state in targets:
+                        future.set_result(instance)
+                    elif state in failures:
+                        future.set_exception(RuntimeError(f'Instance entered state {state}'))
+            self.cache.save()
+
+            interval = LIFECYCLE_POLL_INITIAL if changed else min(
+                interval * LIFECYCLE_POLL_BACKOFF, LIFECYCLE_POLL_MAX)
+            try:
+                # New waiters wake the loop early
+                await asyncio.wait_for(wakeup.wait(), interval)
+                interval = LIFECYCLE_POLL_INITIAL
+            except asyncio.TimeoutError:
+                pass
+
+    async def wait_ready(self, instance_id, host, port=22):
+        """Wait until `host:port` accepts connections (and sends an SSH banner on port 22).
+
+        Gives up after the engine's timeout, e.g. when ssh_allowed_cidrs
+        excludes this machine or sshd never starts.
+        """
+        import asyncio
+
+        interval = 1.0
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), 5)
+                try:
+                    if port != 22 or (await asyncio.wait_for(reader.readline(), 5)).startswith(b'SSH-'):
+                        self.on_event(instance_id, f'ready ({host}:{port} reachable)')
+                        return
+                finally:
+                    writer.close()
+            except (OSError, asyncio.TimeoutError):
+                pass
+            if time.monotonic() + interval > deadline:
+                raise RuntimeError(f'{host}:{port} did not answer within {self.timeout:.0f}s '
+                                   f'(check ssh_allowed_cidrs and the boot log)')
+            await asyncio.sleep(interval)
+            interval = min(interval * LIFECYCLE_POLL_BACKOFF, 10.0)
+
+    async def _after_start(self, region, instance_id, wait_ready):
+        """Wait for a started instance to run and, optionally, accept SSH"""
+        instance = await self.wait_for_state(region, instance_id, ('running',),
+                                             failures=('terminated', 'shutting-down', 'stopped'))
+        if wait_ready:
+            host = instance.get('PublicIpAddress')
+            if not host:
+                self.on_event(instance_id, 'no public IP, skipping readiness check')
+            else:
+                await self.wait_ready(instance_id, host)
+                seconds = record_start_ready(instance_id)
+                if seconds is not None:
+                    self.on_event(instance_id, f'SSH answered {seconds:.1f}s after start')
+                # Pre-warm the SSH master so the first `ssh`/`exec` is instant
+                if await self._call(warm_ssh_master, config=self.config, host=host,
+                                   key_file=ssh_key_file(self.config)):
+                    self.on_event(instance_id, 'ssh connection pre-warmed')
+                else:
+                    self.on_event(instance_id, 'could not pre-warm ssh connection')
+        return instance
+
+    async def start(self, region, instance_ids, wait=True, wait_ready=False):
+        """Start instances with one call per chunk, then wait for all concurrently"""
+        import asyncio
+
+        ec2 = aws_client(self.config, 'ec2', region)
+        for chunk in chunked(list(instance_ids)):
+            note_start({i: 'resume' if (self.cache.entries.get(i) or {}).get('hibernated') else 'boot'
+                        for i in chunk})
+            response = await self._call(ec2.start_instances, InstanceIds=chunk)
+            for change in response['StartingInstances']:
+                self.cache.set_state(change['InstanceId'], change['CurrentState']['Name'])
+                self._observe(change['InstanceId'], change['CurrentState']['Name'])
+        if wait:
+            return await asyncio.gather(*(self.guard(i, self._after_start(region, i, wait_ready))
+                                          for i in instance_ids))
+
+    async def stop(self, region, instance_ids, wait=True):
+        """Stop instances with one call per chunk, then wait for all concurrently"""
+        import asyncio
+
+        ec2 = aws_client(self.config, 'ec2', region)
+        for chunk in chunked(list(instance_ids)):
+            response = await self._call(ec2.stop_instances, InstanceIds=chunk)
+            for change in response['StoppingInstances']:
+                self.cache.set_state(change['InstanceId'], change['CurrentState']['Name'])
+                self._observe(change['InstanceId'], change['CurrentState']['Name'])
+        if wait:
+            return await asyncio.gather(*(self.guard(i, self.wait_for_state(region, i, ('stopped',)))
+                                          for i in instance_ids))
+
+    async def resize(self, region, instance_ids, new_type, restart=None, wait_ready=False):
+        """Change the type of instances: stop them, modify each, and start the ones that were running.
+
+        Describes, stops and starts go out one call per chunk like start() and
+        stop(); only modify_instance_attribute is per instance. Their public
+        IPs change, so SSH masters are closed and cached connection paths
+        dropped. Returns a result per instance (its exception if it failed).
+        """
+        import asyncio
+
+        ec2 = aws_client(self.config, 'ec2', region)
+        instance_ids = list(instance_ids)
+        instances = await self._call(describe_instances_batched, ec2=ec2, instance_ids=instance_ids)
+        results = {}
+        states = {}
+        for instance_id in instance_ids:
+            instance = instances.get(instance_id)
+            if instance is None:
+                results[instance_id] = self._failed(instance_id, RuntimeError(f'Instance {instance_id} not found'))
+            elif (instance.get('HibernationOptions') or {}).get('Configured'):
+                results[instance_id] = self._failed(instance_id, RuntimeError(
+                    "EC2 can't change the type of an instance with hibernation enabled"))
+            elif instance.get('InstanceLifecycle') == 'spot':
+                results[instance_id] = self._failed(instance_id, RuntimeError(
+                    "EC2 can't change the type of a spot instance"))
+            else:
+                self._observe(instance_id, instance['State']['Name'])
+                if instance.get('InstanceType') == new_type:
+                    self.on_event(instance_id, f'already {new_type}')
+                else:
+                    states[instance_id] = instance['State']['Name']
+        if not states:
+            return [results.get(instance_id) for instance_id in instance_ids]
+
+        running = [i for i, state in states.items() if state in ('running', 'pending')]
+        restarting = running if restart is None else list(states) if restart else []
+        connections = load_connection_cache()
+        for instance_id in running:
+            await self._call(close_ssh_masters, config=self.config, deployment={'instance_id': instance_id},
+                             cache=self.cache, connections=connections)
+        if running:
+            try:
+                await self.stop(region, running, wait=False)
+            except Exception as e:
+                results.update((i, self._failed(i, e)) for i in running)
+        waiting = [i for i, state in states.items() if state != 'stopped' and i not in results]
+        for instance_id, result in zip(waiting, await asyncio.gather(
+                *(self.guard(i, self.wait_for_state(region, i, ('stopped',))) for i in waiting))):
+            if isinstance(result, Exception):
+                results[instance_id] = result
+
+        async def modify(instance_id):
+            self.cache.invalidate(instance_id)
+            await self._call(ec2.modify_instance_attribute, InstanceId=instance_id,
+                             InstanceType={'Value': new_type})
+            self.on_event(instance_id, f"type {instances[instance_id].get('InstanceType')} → {new_type}")
+
+        modifying = [i for i in states if i not in results]
+        for instance_id, result in zip(modifying, await asyncio.gather(
+                *(self.guard(i, modify(i)) for i in modifying))):
+            results[instance_id] = result
+        forget_connection(*states)
+
+        restarting = [i for i in restarting if results.get(i) is None]
+        if restarting:
+            try:
+                started = await self.start(region, restarting, wait_ready=wait_ready)
+            except Exception as e:
+                started = [self._failed(i, e) for i in restarting]
+            results.update(zip(restarting, started))
+        return [results.get(instance_id) for instance_id in instance_ids]
+
+
+def run_lifecycle(config, action, selected, instance_type=None, wait_ready=False, on_event=None):
+    """Run a lifecycle action for (name, deployment) pairs concurrently.
+
+    `action` is 'start', 'stop', 'wait-running', 'wait-stopped' or 'resize'.
+    Events are printed, or passed to `on_event(instance_id, message)`
+    (instance_id is None for errors that aren't about one instance). Each
+    instance fails independently. Returns the number of failures.
+    """
+    import asyncio
+
+    names = {dep['instance_id']: name for name, dep in selected}
+    engine = LifecycleEngine(config, names=names, on_event=on_event)
+
+    async def batch(coro, count):
+        # A batched start/stop call failed for every instance in it
+        try:
+            return await coro
+        except Exception as e:
+            message = click.style(f'Error: {str(e)}', fg='red')
+            if on_event:
+                on_event(None, message)
+            else:
+                click.echo(message)
+            return [e] * count
+
+    async def run_all():
+        jobs = []
+        for region, members in group_by_region(config, selected).items():
+            ids = [dep['instance_id'] for _, dep in members]
+            if action == 'start':
+                jobs.append(batch(engine.start(region, ids, wait_ready=wait_ready), len(ids)))
+            elif action == 'stop':
+                jobs.append(batch(engine.stop(region, ids), len(ids)))
+            elif action == 'wait-running':
+                jobs += [engine.guard(i, engine._after_start(region, i, wait_ready)) for i in ids]
+            elif action == 'wait-stopped':
+                jobs += [engine.guard(i, engine.wait_for_state(region, i, ('stopped',))) for i in ids]
+            elif action == 'resize':
+                jobs.append(batch(engine.resize(region, ids, instance_type, wait_ready=wait_ready), len(ids)))
+            else:
+                raise ValueError(f'Unknown lifecycle action: {action}')
+
+        results = []
+        for result in await asyncio.gather(*jobs):
+            results += result if isinstance(result, list) else [result]
+        return results
+
+    try:
+        results = asyncio.run(run_all())
+    finally:
+        engine.cache.save()
+
+    # Failures were already reported as they happened
+    return sum(1 for result in results if isinstance(result, Exception))
+
+
+def render_user_data(boot_mode, region, ssm_prefix='/goldenshell', auto_shutdown_minutes=30,
+                     web_terminal=None):
+    """Render terraform/user-data.sh like base64gzip(templatefile(...)) in main.tf.
+
+    `web_terminal` is a web_terminal_settings() dict (default: the default
+    profile). Returns gzipped bytes; boto3 does the base64 encoding.
+    """
+    import re
+    import gzip
+
+    variables = {
+        'aws_region': region,
+        'auto_shutdown_minutes': auto_shutdown_minutes,
+        'ssm_prefix': ssm_prefix,
+        'boot_mode': boot_mode,
+        'ttyd_options': ttyd_options(web_terminal or WEB_TERMINAL_PROFILES[WEB_TERMINAL_DEFAULT_PROFILE]),
+    }
+    tf_dir = Path(__file__).parent / 'terraform'
+    variables['provision_script'] = (tf_dir / 'provision.sh').read_text()
+    variables['aws_module_script'] = (tf_dir / 'goldenshell_aws.py').read_text()
+    variables['idle_monitor_script'] = (tf_dir / 'idle-monitor.py').read_text()
+    variables['secrets_helper_script'] = (tf_dir / 'secrets-helper.py').read_text()
+    template = (tf_dir / 'user-data.sh').read_text()
+
+    # "$${...}" is an escaped literal, "${name}" a template variable
+    def substitute(match):
+        if match.group(1):
+            return '${' + match.group(2) + '}'
+        return str(variables[match.group(2)])
+
+    return gzip.compress(re.sub(r'(\$?)\$\{(\w+)\}', substitute, template).encode())
+
+
+def newest_image(images):
+    """Pick the most recently created image from a describe_images result"""
+    return max(images, key=lambda image: image['CreationDate'], default=None)
+
+
+def find_stock_ami(ec2):
+    """Get the newest stock Ubuntu image (same lookup as data.aws_ami.ubuntu)"""
+    response = ec2.describe_images(Owners=[UBUNTU_AMI_OWNER], Filters=[
+        {'Name': 'name', 'Values': [UBUNTU_AMI_NAME]},
+        {'Name': 'virtualization-type', 'Values': ['hvm']},
+        {'Name': 'state', 'Values': ['available']},
+    ])
+    return newest_image(response['Images'])
+
+
+def find_baked_ami(ec2, arch='x86_64'):
+    """Get the newest image produced by `goldenshell bake` for `arch`, or None"""
+    response = ec2.describe_images(Owners=['self'], Filters=[
+        {'Name': f'tag:{BAKED_AMI_TAG}', 'Values': ['true']},
+        {'Name': 'state', 'Values': ['available']},
+        {'Name': 'architecture', 'Values': [arch]},
+    ])
+    return newest_image(response['Images'])
+
+
+def baked_ami_for(config, region, use_baked=True, arch='x86_64'):
+    """Get the AMI ID `deploy` should pass to Terraform ('' means stock Ubuntu)"""
+    if not use_baked:
+        return ''
+    try:
+        image = find_baked_ami(aws_client(config, 'ec2', region), arch)
+    except Exception as e:
+        click.echo(click.style(f'Could not look up baked AMIs in {region} ({e}); using stock Ubuntu', fg='yellow'))
+        return ''
+    if image is None:
+        return ''
+    click.echo(f"Using baked AMI {image['ImageId']} ({image['Name']}) in {region}")
+    return image['ImageId']
+
+
+def prune_baked_images(ec2, keep):
+    """Deregister all but the newest `keep` baked images and delete their snapshots"""
+    response = ec2.describe_images(Owners=['self'], Filters=[
+        {'Name': f'tag:{BAKED_AMI_TAG}', 'Values': ['true']},
+    ])
+    images = sorted(response['Images'], key=lambda image: image['CreationDate'], reverse=True)
+    pruned = []
+    for image in images[keep:]:
+        delete_image(ec2, image)
+        pruned.append(image['ImageId'])
+    return pruned
+
+
+def delete_image(ec2, image):
+    """Deregister an image (a describe_images entry) and delete its snapshots"""
+    ec2.deregister_image(ImageId=image['ImageId'])
+    for mapping in image.get('BlockDeviceMappings', []):
+        snapshot_id = mapping.get('Ebs', {}).get('SnapshotId')
+        if snapshot_id:
+            ec2.delete_snapshot(SnapshotId=snapshot_id)
+
+
+def console_output(ec2, instance_id, latest=True):
+    """Get an instance's serial console output ('' if none is available yet)"""
+    try:
+        response = ec2.get_console_output(InstanceId=instance_id, Latest=latest)
+    except Exception:
+        # Latest=True is only supported on Nitro instances
+        response = ec2.get_console_output(InstanceId=instance_id)
+    return response.get('Output') or ''
+
+
+async def bake_image(engine, ec2, region, source_image, instance_type, user_data):
+    """Provision a builder from `source_image`, wait for it to power off, and image it.
+
+    The builder runs user-data in bake mode, which installs everything and then
+    shuts the instance down. It is terminated whether or not baking succeeds.
+    """
+    import asyncio
+
+    baked_at = time.strftime('%Y%m%d-%H%M%S', time.gmtime())
+    response = await engine._call(
+        ec2.run_instances, ImageId=source_image['ImageId'], InstanceType=instance_type,
+        MinCount=1, MaxCount=1, UserData=user_data,
+        InstanceInitiatedShutdownBehavior='stop',
+        MetadataOptions={'HttpTokens': 'required', 'HttpEndpoint': 'enabled'},
+        TagSpecifications=[{'ResourceType': 'instance', 'Tags': [
+            {'Key': 'Name', 'Value': 'goldenshell-bake-builder'},
+            {'Key': 'Project', 'Value': 'GoldenShell'},
+            {'Key': 'ManagedBy', 'Value': 'goldenshell-bake'},
+        ]}])
+    instance_id = response['Instances'][0]['InstanceId']
+    engine.names[instance_id] = 'builder'
+    engine.on_event(instance_id, f"launched from {source_image['ImageId']}")
+
+    try:
+        await engine._call(ec2.get_waiter('instance_exists').wait, InstanceIds=[instance_id])
+        await engine.wait_for_state(region, instance_id, ('stopped',))
+
+        output = await engine._call(console_output, ec2=ec2, instance_id=instance_id, latest=False)
+        if 'GoldenShell bake failed' in output:
+            raise RuntimeError('Provisioning failed on the builder; see its console output')
+        if 'GoldenShell bake complete' not in output:
+            engine.on_event(instance_id, click.style(
+                'console output unavailable; assuming provisioning completed', fg='yellow'))
+
+        tags = [
+            {'Key': 'Name', 'Value': f'goldenshell-{baked_at}'},
+            {'Key': 'Project', 'Value': 'GoldenShell'},
+            {'Key': BAKED_AMI_TAG, 'Value': 'true'},
+            {'Key': 'SourceAmi', 'Value': source_image['ImageId']},
+        ]
+        image = await engine._call(
+            ec2.create_image, InstanceId=instance_id, Name=f'goldenshell-{baked_at}',
+            Description=f"GoldenShell baked from {source_image['Name']}",
+            TagSpecifications=[{'ResourceType': 'image', 'Tags': tags},
+                               {'ResourceType': 'snapshot', 'Tags': tags}])
+        engine.on_event(instance_id, f"creating image {image['ImageId']}")
+
+        waiter = ec2.get_waiter('image_available')
+        await engine._call(waiter.wait, ImageIds=[image['ImageId']],
+                           WaiterConfig={'Delay': 15, 'MaxAttempts': 120})
+        engine.on_event(instance_id, f"image {image['ImageId']} available")
+        return image['ImageId']
+    finally:
+        await asyncio.shield(engine._call(ec2.terminate_instances, InstanceIds=[instance_id]))
+        engine.on_event(instance_id, 'terminated builder')
+
+
+async def probe_boot(engine, ec2, region, label, image_id, instance_type, user_data, security_group_id):
+    """Boot a throwaway instance and time launch → running → SSH → setup complete.
+
+    Returns {milestone: seconds since run_instances returned}. The console is
+    polled for the setup marker every BOOT_PROBE_CONSOLE_INTERVAL seconds, so
+    'ready' is accurate to within that interval.
+    """
+    import asyncio
+
+    response = await engine._call(
+        ec2.run_instances, ImageId=image_id, InstanceType=instance_type,
+        MinCount=1, MaxCount=1, UserData=user_data,
+        SecurityGroupIds=[security_group_id],
+        InstanceInitiatedShutdownBehavior='terminate',
+        MetadataOptions={'HttpTokens': 'required', 'HttpEndpoint': 'enabled'},
+        TagSpecifications=[{'ResourceType': 'instance', 'Tags': [
+            {'Key': 'Name', 'Value': f'goldenshell-boot-probe-{label}'},
+            {'Key': 'Project', 'Value': 'GoldenShell'},
+            {'Key': 'ManagedBy', 'Value': 'goldenshell-boot-timeline'},
+        ]}])
+    launched = time.monotonic()
+    instance_id = response['Instances'][0]['InstanceId']
+    engine.names[instance_id] = label
+    timeline = {'instance_id': instance_id}
+
+    try:
+        await engine._call(ec2.get_waiter('instance_exists').wait, InstanceIds=[instance_id])
+        instance = await engine.wait_for_state(region, instance_id, ('running',))
+        timeline['running'] = time.monotonic() - launched
+
+        await engine.wait_ready(instance_id, instance['PublicIpAddress'])
+        timeline['ssh'] = time.monotonic() - launched
+
+        while 'GoldenShell setup complete!' not in await engine._call(
+                console_output, ec2=ec2, instance_id=instance_id):
+            if time.monotonic() - launched > engine.timeout:
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(BOOT_PROBE_CONSOLE_INTERVAL)
+        timeline['ready'] = time.monotonic() - launched
+        engine.on_event(instance_id, 'setup complete')
+        return timeline
+    finally:
+        await asyncio.shield(engine._call(ec2.terminate_instances, InstanceIds=[instance_id]))
+        # The temporary security group can only be deleted once this is gone
+        await engine.wait_for_state(region, instance_id, ('terminated',), failures=())
+
+
+def run_boot_timeline(config, region, instance_type, images):
+    """Boot one probe per (label, image_id) concurrently and print a timeline table.
+
+    Probes get a temporary security group that allows SSH (they have no key
+    pair), which is deleted once they've terminated. Returns the number of
+    probes that failed.
+    """
+    import asyncio
+
+    ec2 = aws_client(config, 'ec2', region)
+    engine = LifecycleEngine(config, timeout=BAKE_TIMEOUT)
+    user_data = render_user_data('probe', region,
+                                 auto_shutdown_minutes=config.get('auto_shutdown_minutes', 30))
+
+    vpcs = ec2.describe_vpcs(Filters=[{'Name': 'is-default', 'Values': ['true']}])['Vpcs']
+    if not vpcs:
+        raise RuntimeError(f'No default VPC in {region}')
+    group_id = ec2.create_security_group(
+        GroupName=f'goldenshell-boot-probe-{int(time.time())}',
+        Description='Temporary SSH access for goldenshell boot-timeline',
+        VpcId=vpcs[0]['VpcId'])['GroupId']
+
+    async def run_all():
+        return await asyncio.gather(*(
+            engine.guard(label, probe_boot(engine, ec2, region, label, image_id,
+                                           instance_type, user_data, group_id))
+            for label, image_id in images))
+
+    try:
+        ec2.authorize_security_group_ingress(GroupId=group_id, IpPermissions=[{
+            'IpProtocol': 'tcp', 'FromPort': 22, 'ToPort': 22,
+            'IpRanges': [{'CidrIp': '0.0.0.0/0', 'Description': 'boot-timeline SSH banner check'}],
+        }])
+        results = asyncio.run(run_all())
+    finally:
+        try:
+            ec2.delete_security_group(GroupId=group_id)
+        except Exception as e:
+            click.echo(click.style(f'Could not delete security group {group_id}: {e}', fg='yellow'))
+
+    click.echo(f"\n{'Image':8} {'AMI':22} {'Running':>9} {'SSH':>9} {'Ready':>9}")
+    for (label, image_id), result in zip(images, results):
+        if isinstance(result, Exception):
+            click.echo(f"{label:8} {image_id:22} " + click.style('failed', fg='red'))
+            continue
+        click.echo(f"{label:8} {image_id:22} {result['running']:>8.1f}s "
+                   f"{result['ssh']:>8.1f}s {result['ready']:>8.1f}s")
+
+    timelines = dict(zip((label for label, _ in images), results))
+    stock, baked = timelines.get('stock'), timelines.get('baked')
+    if isinstance(stock, dict) and isinstance(baked, dict):
+        saved = stock['ready'] - baked['ready']
+        if saved > 0:
+            click.echo(click.style(
+                f"\nBaked image is ready {saved:.0f}s sooner ({saved / stock['ready']:.0%} faster)", fg='green'))
+        else:
+            click.echo(click.style('\nBaked image was not faster than stock Ubuntu', fg='yellow'))
+
+    return sum(1 for result in results if isinstance(result, Exception))
+
+
+def fetch_boot_log_ssm(config, region, instance_id, timeout=60):
+    """Read the boot timeline from an instance with SSM Run Command"""
+    ssm = aws_client(config, 'ssm', region)
+    command_id = ssm.send_command(
+        InstanceIds=[instance_id], DocumentName='AWS-RunShellScript',
+        Parameters={'commands': [f'cat {BOOT_LOG_PATH}']},
+        Comment='goldenshell boot-report')['Command']['CommandId']
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(1)
+        try:
+            invocation = ssm.get_command_invocation(CommandId=command_id, InstanceId=instance_id)
+        except ssm.exceptions.InvocationDoesNotExist:
+            continue
+        if invocation['Status'] in ('Pending', 'InProgress', 'Delayed'):
+            continue
+        if invocation['Status'] != 'Success':
+            raise RuntimeError(f"SSM command {invocation['Status']}: "
+                               f"{invocation.get('StandardErrorContent', '').strip()}")
+        return invocation['StandardOutputContent']
+    raise RuntimeError(f'Timed out waiting for SSM command {command_id}')
+
+
+@telemetry.traced('ssh.boot_log')
+def fetch_boot_log_ssh(config, host, key_file=None):
+    """Read the boot timeline from an instance over SSH"""
+    import subprocess
+
+    warm_ssh_master(config, host, key_file)
+    result = subprocess.run(ssh_command(config, host, key_file, batch=True) + ['cat', BOOT_LOG_PATH],
+                            stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=60)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f'ssh exited with {result.returncode}')
+    return result.stdout
+
+
+def parse_boot_log(text):
+    """Parse the JSON-lines boot timeline written by user-data"""
+    report = {'boot': {}, 'phases': []}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if entry.get('event') == 'boot':
+            report['boot'] = entry
+        elif 'phase' in entry:
+            report['phases'].append(entry)
+    return report
+
+
+def boot_report_label(report):
+    """Short column label for a saved boot report"""
+    day = time.strftime('%m-%d', time.localtime(report.get('boot', {}).get('wall_clock') or report['fetched_at']))
+    return f"{report.get('name') or report['instance_id']} ({day})"
+
+
+def save_boot_report(report):
+    """Keep a fetched report so later deployments can be compared against it"""
+    write_json_atomic(BOOT_REPORTS_DIR / f"{report['instance_id']}.json", report)
+
+
+def load_boot_reports():
+    """Get all saved boot reports, oldest first"""
+    if not BOOT_REPORTS_DIR.is_dir():
+        return []
+    reports = [read_json(path) for path in BOOT_REPORTS_DIR.glob('*.json')]
+    return sorted((r for r in reports if r), key=lambda r: r.get('boot', {}).get('wall_clock') or r['fetched_at'])
+
+
+def echo_boot_waterfall(report, width=40):
+    """Print one report as a per-phase waterfall"""
+    phases = report['phases']
+    if not phases:
+        click.echo(click.style('Boot log is empty (user-data may still be starting).', fg='yellow'))
+        return
+
+    total = max(phase['end'] for phase in phases) or 1
+    click.echo(f"\n{'Phase':22} {'Start':>8} {'Duration':>9}")
+    for phase in phases:
+        duration = phase['end'] - phase['start']
+        offset = int(phase['start'] / total * width)
+        bar = '█' * max(1, round(duration / total * width))
+        color = 'red' if phase.get('status') != 'ok' else 'cyan'
+        click.echo(f"{phase['phase']:22} {phase['start']:>7.1f}s {duration:>8.1f}s  "
+                   + ' ' * offset + click.style(bar, fg=color))
+
+    slowest = max(phases, key=lambda phase: phase['end'] - phase['start'])
+    user_data = total - phases[0]['end'] if phases[0]['phase'] == 'pre-user-data' else total
+    click.echo(f"\nTotal: {total:.1f}s since boot (user-data {user_data:.1f}s); "
+               f"slowest phase: {slowest['phase']} ({slowest['end'] - slowest['start']:.1f}s)")
+    failed = [phase['phase'] for phase in phases if phase.get('status') != 'ok']
+    if failed:
+        click.echo(click.style(f"Failed phase: {', '.join(failed)}", fg='red'))
+    elif phases[-1]['phase'] != 'user-environment':
+        click.echo(click.style('Setup has not finished yet.', fg='yellow'))
+
+
+def echo_boot_comparison(reports):
+    """Print phase durations of several reports side by side, with the change from first to last"""
+    names = []
+    for report in reports:
+        for phase in report['phases']:
+            if phase['phase'] not in names:
+                names.append(phase['phase'])
+
+    durations = [{p['phase']: p['end'] - p['start'] for p in report['phases']} for report in reports]
+    labels = [boot_report_label(report)[:18] for report in reports]
+
+    click.echo(f"\n{'Phase':22}" + ''.join(f" {label:>18}" for label in labels) + f" {'Change':>9}")
+    rows = [(name, [d.get(name) for d in durations]) for name in names]
+    rows.append(('TOTAL', [max((p['end'] for p in r['phases']), default=None) for r in reports]))
+
+    for name, values in rows:
+        cells = ''.join(f" {value:>17.1f}s" if value is not None else f" {'-':>18}" for value in values)
+        first, last = values[0], values[-1]
+        change = ''
+        if first is not None and last is not None and len(values) > 1:
+            delta = last - first
+            color = 'red' if delta > 1 else 'green' if delta < -1 else None
+            change = click.style(f"{delta:>+8.1f}s", fg=color)
+        click.echo(f"{name:22}{cells} {change}")
+
+
+class MenuSession:
+    """Live state behind the interactive menu.
+
+    A daemon thread re-describes every known environment (one batched call
+    per region) every `menu_refresh_seconds`, so the header is current and
+    the instance cache stays warm for the commands run from the menu.
+    Start/stop run as background jobs on the lifecycle engine; their events
+    are collected here and shown on the next redraw.
+    """
+
+    def __init__(self):
+        self.config = Config()
+        self.lock = threading.Lock()
+        # Until the first refresh lands, show whatever the instance cache has
+        self.instances = InstanceCache().entries
+        self.refreshed_at = None
+        self.refresh_error = None
+        self.jobs = []
+        self.wakeup = threading.Event()
+
+    def targets(self):
+        """(name, deployment) for the default deployment and every registered environment"""
+        environments = self.config.environments()
+        targets = list(environments.items())
+        deployment = self.config.get('last_deployment') or {}
+        registered = {env.get('instance_id') for env in environments.values()}
+        if deployment.get('instance_id') and deployment['instance_id'] not in registered:
+            targets.insert(0, ('default', deployment))
+        return targets
+
+    def refresh(self):
+        """Describe every target now (batched per region)"""
+        cache = instance_cache(self.config)
+        instances = {}
+        for region, members in group_by_region(self.config, self.targets()).items():
+            instances.update(lookup_instances(self.config, region, [dep['instance_id'] for _, dep in members],
+                                              cache, refresh=True))
+        with self.lock:
+            self.instances = instances
+            self.refreshed_at = time.time()
+            self.refresh_error = None
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                self.refresh_error = str(e)
+            self.wakeup.wait(self.config.get('menu_refresh_seconds', MENU_REFRESH_SECONDS))
+            self.wakeup.clear()
+
+    def start(self):
+        threading.Thread(target=self._refresh_loop, daemon=True).start()
+
+    def reload(self):
+        """Pick up config changes made by a command, and refresh soon"""
+        self.config = Config()
+        self.wakeup.set()
+
+    def run_job(self, action, selected):
+        """Run a lifecycle action for `selected` in the background"""
+        names = {dep['instance_id']: name for name, dep in selected}
+        job = {'label': f"{action} {', '.join(name for name, _ in selected)}", 'events': [],
+               'started_at': time.monotonic(), 'finished_at': None, 'failures': 0}
+
+        def on_event(instance_id, message):
+            job['events'].append(f"{names.get(instance_id, instance_id)}: {message}" if instance_id else message)
+
+        def work():
+            if action == 'stop':
+                cache, connections = InstanceCache(), load_connection_cache()
+                for _, deployment in selected:
+                    close_ssh_masters(self.config, deployment, cache, connections)
+            forget_connection(*(deployment['instance_id'] for _, deployment in selected))
+            try:
+                job['failures'] = run_lifecycle(self.config, action, selected, wait_ready=action == 'start',
+                                                on_event=on_event)
+            except Exception as e:
+                on_event(None, click.style(f'Error: {str(e)}', fg='red'))
+                job['failures'] = len(selected)
+            job['finished_at'] = time.monotonic()
+            self.wakeup.set()
+
+        with self.lock:
+            finished = [j for j in self.jobs if j['finished_at'] is not None][-MENU_JOBS_SHOWN:]
+            self.jobs = finished + self.running_jobs() + [job]
+        threading.Thread(target=work, daemon=True).start()
+
+    def running_jobs(self):
+        return [job for job in self.jobs if job['finished_at'] is None]
+
+    def echo_header(self):
+        """Print the environments table and background jobs"""
+        with self.lock:
+            instances = dict(self.instances)
+            jobs = list(self.jobs)
+        targets = self.targets()
+        if not targets:
+            click.echo('  No deployments yet.')
+        for name, deployment in targets:
+            instance = instances.get(deployment['instance_id']) or {}
+            state = instance.get('state', 'unknown')
+            click.echo(
+                f"  {name:14} {click.style(f'{state:13}', fg=state_color(state))} "
+                f"{instance.get('instance_type') or '':11} {instance.get('public_ip') or '-':16} "
+                f"{(state == 'running' and describe_idle(instance.get('tags'))) or ''}".rstrip()
+            )
+        if self.refresh_error:
+            click.echo(click.style(f'  Refresh failed: {self.refresh_error}', fg='red'))
+        elif targets:
+            click.echo(click.style(f"  updated {format_minutes(time.time() - self.refreshed_at)} ago"
+                                   if self.refreshed_at else '  (refreshing...)', dim=True))
+
+        for job in jobs:
+            if job['finished_at'] is None:
+                status = click.style(f"running {format_minutes(time.monotonic() - job['started_at'])}", fg='yellow')
+            elif job['failures']:
+                status = click.style(f"{job['failures']} failed", fg='red')
+            else:
+                status = click.style('done', fg='green')
+            last = job['events'][-1] if job['events'] else ''
+            click.echo(f"  [{job['label']}] {status}  {last}")
+
+
+def choose_menu_targets(session, action):
+    """Ask which environment(s) a menu action applies to, when there's a choice"""
+    targets = session.targets()
+    if len(targets) <= 1:
+        if not targets:
+            click.echo(click.style('No active deployment found.', fg='yellow'))
+        return targets
+    names = [name for name, _ in targets]
+    choice = click.prompt(f"Environment to {action} ({', '.join(names)}, all)", default=names[0])
+    if choice == 'all':
+        return targets
+    selected = [(name, deployment) for name, deployment in targets if name == choice]
+    if not selected:
+        click.echo(click.style(f'Unknown environment: {choice}', fg='red'))
+    return selected
+
 
 def interactive_menu():
-    """Display interactive menu and handle user selection"""
+    """Run the interactive menu until the user exits.
+
+    The header shows live state from a MenuSession; start and stop return
+    to the menu at once and finish in the background.
+    """
+    session = MenuSession()
+    session.start()
+
+    # Display menu options
+    menu_options = {
+        '1': ('Initialize configuration', 'init'),
+        '2': ('View configuration', 'config'),
+        '3': ('Deploy new instance', 'deploy'),
+        '4': ('Check instance status', 'status'),
+        '5': ('Start instance', 'start'),
+        '6': ('Stop instance', 'stop'),
+        '7': ('Resize instance', 'resize'),
+        '8': ('SSH to instance', 'ssh'),
+        '9': ('Destroy environment', 'destroy'),
+        '0': ('Exit', None),
+    }
+
+    # Map command names to actual command functions
+    command_map = {
+        'init': init,
+        'config': config,
+        'status': status,
+        'resize': resize,
+        'ssh': ssh,
+        'deploy': deploy,
+        'destroy': destroy,
+    }
+
     while True:
         # Clear screen (optional - comment out if not desired)
         click.clear()
@@ -72,29 +4461,20 @@ def interactive_menu():
         click.echo(click.style('=' * 53, fg='cyan'))
         click.echo(click.style('  GoldenShell - AWS Development Environment', fg='cyan', bold=True))
         click.echo(click.style('=' * 53, fg='cyan'))
+        session.echo_header()
         click.echo()
 
-        # Display menu options
-        menu_options = {
-            '1': ('Initialize configuration', 'init'),
-            '2': ('View configuration', 'config'),
-            '3': ('Deploy new instance', 'deploy'),
-            '4': ('Check instance status', 'status'),
-            '5': ('Start instance', 'start'),
-            '6': ('Stop instance', 'stop'),
-            '7': ('Resize instance', 'resize'),
-            '8': ('SSH to instance', 'ssh'),
-            '9': ('Destroy environment', 'destroy'),
-            '0': ('Exit', None),
-        }
-
         for key in sorted(menu_options.keys()):
             desc, _ = menu_options[key]
             click.echo(f"  {key}. {desc}")
 
         click.echo()
-        choice = click.prompt(click.style('Select an option', fg='yellow'),
-                             type=str, default='0', show_default=False)
+        choice = click.prompt(click.style('Select an option (Enter to update)', fg='yellow'),
+                              type=str, default='', show_default=False)
+
+        # Redraw with the latest state
+        if not choice:
+            continue
 
         if choice not in menu_options:
             click.echo(click.style('\nInvalid option. Please try again.', fg='red'))
@@ -105,9 +4485,23 @@ def interactive_menu():
 
         # Exit option
         if command is None:
+            running = session.running_jobs()
+            if running and not click.confirm(
+                    f'{len(running)} background job(s) still running; they continue in AWS but '
+                    'won\'t be reported. Exit anyway?'):
+                continue
             click.echo(click.style('\nGoodbye!', fg='green'))
             sys.exit(0)
 
+        # Lifecycle actions run in the background
+        if command in ('start', 'stop'):
+            selected = choose_menu_targets(session, command)
+            if selected:
+                session.run_job(command, selected)
+            else:
+                click.pause()
+            continue
+
         # Execute the selected command
         click.echo()
         click.echo(click.style(f'Executing: {command}', fg='cyan'))
@@ -119,33 +4513,19 @@ def interactive_menu():
             ctx = click.Context(cli)
             ctx.invoked_subcommand = command
 
-            # Map command names to actual command functions
-            command_map = {
-                'init': init,
-                'config': config,
-                'status': status,
-                'start': start,
-                'stop': stop,
-                'resize': resize,
-                'ssh': ssh,
-                'deploy': deploy,
-                'destroy': destroy,
-            }
-
-            if command in command_map:
-                # Handle special cases for commands that need parameters
-                if command == 'deploy':
-                    instance_type = click.prompt(
-                        'Instance type',
-                        default='t3.medium',
-                        show_default=True
-                    )
-                    ctx.invoke(command_map[command], instance_type=instance_type)
-                elif command == 'ssh':
-                    # Explicitly pass None values to trigger interactive mode
-                    ctx.invoke(command_map[command], tailscale_hostname=None, use_public_ip=False)
-                else:
-                    ctx.invoke(command_map[command])
+            # Handle special cases for commands that need parameters
+            if command == 'deploy':
+                instance_type = click.prompt(
+                    'Instance type',
+                    default='t3.medium',
+                    show_default=True
+                )
+                ctx.invoke(command_map[command], instance_type=instance_type)
+            elif command == 'ssh':
+                # Explicitly pass None values to trigger interactive mode
+                ctx.invoke(command_map[command], tailscale_hostname=None, use_public_ip=False)
+            else:
+                ctx.invoke(command_map[command])
 
         except SystemExit as e:
             # Handle sys.exit() calls from commands
@@ -153,6 +4533,7 @@ def interactive_menu():
                 click.echo(click.style(f'\nCommand exited with error code: {e.code}', fg='red'))
         except Exception as e:
             click.echo(click.style(f'\nError: {str(e)}', fg='red'))
+        session.reload()
 
         # Pause before returning to menu
         click.echo()
@@ -160,10 +4541,41 @@ def interactive_menu():
         click.pause(info=click.style('\nPress any key to return to menu...', fg='yellow'))
 
 
+def start_telemetry(ctx, profile, trace_file):
+    """Record spans for this invocation and report them when it finishes"""
+    telemetry.enable()
+    started = process_started_ns()
+    if started and started < IMPORT_STARTED_NS:
+        telemetry.end(telemetry.begin('python.startup', start_ns=started), end_ns=IMPORT_STARTED_NS)
+    telemetry.end(telemetry.begin('import', start_ns=IMPORT_STARTED_NS))
+    # Only the command name: arguments can hold secrets (init --aws-secret-access-key)
+    root = telemetry.begin('command', {'command': ctx.invoked_subcommand or 'menu'},
+                           start_ns=started or IMPORT_STARTED_NS)
+
+    def finish():
+        telemetry.end(root)
+        if trace_file:
+            try:
+                telemetry.export(trace_file, {'service.name': 'goldenshell', 'process.pid': os.getpid()})
+            except OSError as e:
+                click.echo(click.style(f'Could not write trace to {trace_file}: {e}', fg='yellow'), err=True)
+        if profile:
+            click.echo(telemetry.summary(root), err=True)
+
+    ctx.call_on_close(finish)
+
+
 @click.group(invoke_without_command=True)
+@click.option('--profile', is_flag=True, envvar='GOLDENSHELL_PROFILE',
+              help='Print where the time went (start-up, config, AWS calls, Terraform, ssh) to stderr')
+@click.option('--trace', 'trace_file', type=click.Path(dir_okay=False), envvar='GOLDENSHELL_TRACE',
+              help='Append timing spans to this file as JSON lines (OpenTelemetry field names)')
 @click.pass_context
-def cli(ctx):
+def cli(ctx, profile, trace_file):
     """GoldenShell - Deploy ephemeral Linux development environments in AWS"""
+    if profile or trace_file:
+        start_telemetry(ctx, profile, trace_file)
+
     # If no subcommand was provided, show interactive menu
     if ctx.invoked_subcommand is None:
         interactive_menu()
@@ -186,6 +4598,7 @@ def init(aws_access_key_id, aws_secret_access_key, aws_region, tailscale_auth_ke
     config.set('ssh_key_name', ssh_key_name)
 
     config.save()
+    reset_aws_pool()
 
     click.echo(click.style('✓ Configuration saved successfully!', fg='green'))
     click.echo(f'Config location: {CONFIG_FILE}')
@@ -204,73 +4617,221 @@ def config():
     click.echo(config.display())
 
 
+@cli.group()
+def env():
+    """Manage named environments for fleet commands"""
+
+
+@env.command('list')
+def env_list():
+    """List registered environments"""
+    config = Config()
+    environments = config.environments()
+
+    if not environments:
+        click.echo(click.style('No environments registered. Use "goldenshell env add" or "goldenshell deploy --env".', fg='yellow'))
+        return
+
+    click.echo(click.style('Registered Environments:', fg='cyan', bold=True))
+    for name, deployment in sorted(environments.items()):
+        region = deployment.get('region') or config.get('aws_region')
+        click.echo(f"  {name:20} {deployment.get('instance_id', 'N/A'):21} {region}")
+
+
+@env.command('add')
+@click.argument('name')
+@click.option('--instance-id', required=True, help='EC2 instance ID')
+@click.option('--region', help='AWS region (defaults to the configured region)')
+@click.option('--public-ip', help='Public IP address of the instance')
+def env_add(name, instance_id, region, public_ip):
+    """Register an existing instance as a named environment"""
+    config = Config()
+
+    config.set_environment(name, {
+        'instance_id': instance_id,
+        'public_ip': public_ip,
+        'region': region or config.get('aws_region'),
+    })
+    config.save()
+
+    click.echo(click.style(f'✓ Environment "{name}" registered', fg='green'))
+
+
+@env.command('remove')
+@click.argument('name')
+def env_remove(name):
+    """Remove a named environment (the instance itself is not touched)"""
+    config = Config()
+
+    if not config.remove_environment(name):
+        click.echo(click.style(f'Environment "{name}" not found.', fg='yellow'))
+        return
+    config.save()
+
+    click.echo(click.style(f'✓ Environment "{name}" removed', fg='green'))
+
+
 @cli.command()
-@click.option('--instance-type', default='t3.medium', help='EC2 instance type')
-def deploy(instance_type):
-    """Deploy the AWS development environment"""
+@click.option('--instance-type', help=f'EC2 instance type (default: {DEFAULT_INSTANCE_TYPE})')
+@click.option('--env', 'env_specs', multiple=True, metavar='NAME[=REGION]',
+              help='Deploy a named environment in its own workspace (repeatable)')
+@click.option('--region', 'regions', multiple=True,
+              help='Deploy an environment named after this region (repeatable)')
+@click.option('--parallel', default=DEPLOY_PARALLELISM, show_default=True,
+              help='Maximum environments deployed at once')
+@click.option('--force', is_flag=True, help='Re-run init and plan even if nothing changed')
+@click.option('--stock-ami', is_flag=True, help='Use stock Ubuntu even if a baked AMI exists')
+@click.option('--no-pool', is_flag=True, help='Deploy new environments with Terraform even if the warm pool has instances')
+@click.option('--vcpus', type=click.IntRange(1), help='vCPUs needed; the capacity engine picks type, zone and market')
+@click.option('--memory', type=click.FloatRange(0.5), help='Memory needed in GiB (capacity engine)')
+@click.option('--arch', type=click.Choice(['x86_64', 'arm64']), help='CPU architecture (capacity engine)')
+@click.option('--market', type=click.Choice(['auto', 'spot', 'on-demand']),
+              help='Spot, on-demand, or auto for whichever is cheaper after interruption risk (capacity engine)')
+def deploy(instance_type, env_specs, regions, parallel, force, stock_ami, no_pool, vcpus, memory, arch, market):
+    """Deploy the AWS development environment.
+
+    With --vcpus, --memory, --arch or --market (or a `capacity` section in
+    config.yaml) the capacity engine picks the cheapest instance type, zone
+    and market that fit; see `goldenshell capacity`. Later deploys reuse the
+    requirement, but an existing instance keeps its zone and market.
+    """
     config = Config()
 
     if not config.config:
         click.echo(click.style('Error: No configuration found. Run "goldenshell init" first.', fg='red'))
         sys.exit(1)
+    try:
+        web_terminal_settings(config)
+    except ValueError as e:
+        click.echo(click.style(f'Error: {str(e)}', fg='red'))
+        sys.exit(1)
+    requirement = capacity_requirement(config, vcpus, memory, arch, market, instance_type)
 
-    click.echo(click.style('Deploying GoldenShell environment...', fg='cyan'))
-
-    # Set up Terraform
-    tf_dir = Path(__file__).parent / 'terraform'
-    tf = Terraform(working_dir=str(tf_dir))
+    if env_specs or regions:
+        try:
+            targets = parse_deploy_targets(config, env_specs, regions)
+        except click.BadParameter as e:
+            click.echo(click.style(f'Error: {e.message}', fg='red'))
+            sys.exit(1)
 
-    # Prepare Terraform variables
-    tf_vars = {
-        'aws_region': config.get('aws_region'),
-        'instance_type': instance_type,
-        'key_name': config.get('ssh_key_name'),
-        'tailscale_auth_key': config.get('tailscale_auth_key'),
-    }
+        # Environments claimed from the warm pool aren't Terraform-managed
+        environments = config.environments()
+        for name in [name for name in targets if (environments.get(name) or {}).get('source') == 'pool']:
+            click.echo(click.style(f'{name} already runs on a warm-pool instance; '
+                                   f'"goldenshell env remove {name}" first to deploy it with Terraform', fg='yellow'))
+            del targets[name]
+        if not targets:
+            return
 
-    # Set AWS credentials as environment variables
-    os.environ['AWS_ACCESS_KEY_ID'] = config.get('aws_access_key_id')
-    os.environ['AWS_SECRET_ACCESS_KEY'] = config.get('aws_secret_access_key')
-    os.environ['AWS_DEFAULT_REGION'] = config.get('aws_region')
+        new_targets = {name: region for name, region in targets.items() if name not in environments}
+        # Warm-pool instances are on-demand in whatever zone they were built in
+        if new_targets and not no_pool and not requirement and config.get('warm_pool_size', 0):
+            try:
+                claimed = claim_warm_instances(config, new_targets, instance_type or DEFAULT_INSTANCE_TYPE)
+            except Exception as e:
+                click.echo(click.style(f'Could not use the warm pool ({e}); deploying with Terraform', fg='yellow'))
+                claimed = {}
+            for name in claimed:
+                del targets[name]
+            if claimed:
+                refill_warm_pool_in_background(set(claimed.values()))
+                click.echo(f'Refilling the warm pool in the background (log: {WARM_POOL_LOG_FILE})')
+
+        requirements = {name: requirement or (None if instance_type else (environments.get(name) or {}).get('capacity'))
+                        for name in targets}
+        placements = {}
+        ranked = {}
+        for name, region in targets.items():
+            if requirements[name]:
+                try:
+                    placements[name] = choose_capacity(config, requirements[name], region, environments.get(name),
+                                                       label=name, ranked=ranked)
+                except Exception as e:
+                    click.echo(click.style(f'Error: {name}: {str(e)}', fg='red'))
+                    sys.exit(1)
+
+        failures = deploy_parallel(config, targets, instance_type or DEFAULT_INSTANCE_TYPE, force=force,
+                                   parallel=parallel, use_baked=not stock_ami, placements=placements,
+                                   requirements=requirements) if targets else 0
+        # Terraform may have rotated secrets
+        SecretStore(config).invalidate()
+        if failures:
+            click.echo(click.style(f'\n✗ {failures} environment(s) failed', fg='red'))
+            sys.exit(1)
+        click.echo(click.style('\n✓ Deployment successful!', fg='green', bold=True))
+        return
 
-    try:
-        # Initialize Terraform
-        click.echo('Initializing Terraform...')
-        tf.init()
+    click.echo(click.style('Deploying GoldenShell environment...', fg='cyan'))
 
-        # Apply Terraform configuration
-        click.echo('Creating AWS resources...')
-        return_code, stdout, stderr = tf.apply(var=tf_vars, skip_plan=True)
+    tf_dir = Path(__file__).parent / 'terraform'
 
-        if return_code != 0:
-            click.echo(click.style(f'Error deploying: {stderr}', fg='red'))
+    deployment = config.get('last_deployment') or {}
+    if not instance_type:
+        requirement = requirement or deployment.get('capacity')
+    candidate = None
+    if requirement:
+        try:
+            candidate = choose_capacity(config, requirement, config.get('aws_region'), deployment)
+        except Exception as e:
+            click.echo(click.style(f'Error: {str(e)}', fg='red'))
             sys.exit(1)
 
-        # Get outputs
-        outputs = tf.output(json=True)
+    region = config.get('aws_region')
+    tf_vars = terraform_vars(config, region, deployment, candidate,
+                             ami_id=baked_ami_for(config, region, use_baked=not stock_ami,
+                                                  arch=candidate['arch'] if candidate else 'x86_64'),
+                             instance_type=instance_type or DEFAULT_INSTANCE_TYPE)
 
+    timings = []
+
+    try:
+        outputs, cache_entry = terraform_deploy(
+            tf_dir, tf_vars, terraform_env(config, region), load_deploy_cache(tf_dir), force=force, timings=timings)
+        if cache_entry:
+            save_deploy_cache(tf_dir, cache_entry)
+        # Terraform may have rotated secrets
+        SecretStore(config).invalidate()
+
+        echo_terraform_timings(timings)
         click.echo(click.style('\n✓ Deployment successful!', fg='green', bold=True))
         click.echo(f"\nInstance ID: {outputs.get('instance_id', {}).get('value', 'N/A')}")
         click.echo(f"Public IP: {outputs.get('public_ip', {}).get('value', 'N/A')}")
+        placement = placement_from_outputs(outputs)
+        if placement:
+            click.echo(f"Market: {placement.get('market', 'N/A')} in {placement.get('availability_zone', 'N/A')}")
         click.echo(f"Tailscale IP: Check your Tailscale admin panel")
 
         # Save deployment info
         config.set('last_deployment', {
             'instance_id': outputs.get('instance_id', {}).get('value'),
             'public_ip': outputs.get('public_ip', {}).get('value'),
+            'instance_type': tf_vars['instance_type'],
+            **placement,
+            **({'capacity': requirement} if requirement else {}),
         })
         config.save()
 
+    except TerraformError as e:
+        echo_terraform_timings(timings)
+        click.echo(click.style(str(e), fg='red'))
+        sys.exit(1)
     except Exception as e:
         click.echo(click.style(f'Error: {str(e)}', fg='red'))
         sys.exit(1)
 
 
 @cli.command()
-def status():
+@click.option('--env', 'env_names', multiple=True, help='Named environment to act on (repeatable)')
+@click.option('--all', 'all_envs', is_flag=True, help='Act on every registered environment')
+@click.option('--refresh', is_flag=True, help='Bypass the local instance cache')
+def status(env_names, all_envs, refresh):
     """Check instance status and connection details"""
     config = Config()
 
+    if env_names or all_envs:
+        run_fleet_command(config, 'status', env_names, all_envs, refresh=refresh)
+        return
+
     deployment = config.get('last_deployment')
     if not deployment:
         click.echo(click.style('No active deployment found.', fg='yellow'))
@@ -281,39 +4842,59 @@ def status():
         click.echo(click.style('No instance ID found.', fg='yellow'))
         return
 
-    # Set AWS credentials
-    os.environ['AWS_ACCESS_KEY_ID'] = config.get('aws_access_key_id')
-    os.environ['AWS_SECRET_ACCESS_KEY'] = config.get('aws_secret_access_key')
-
     try:
-        ec2 = boto3.client('ec2', region_name=config.get('aws_region'))
-        response = ec2.describe_instances(InstanceIds=[instance_id])
+        cache = instance_cache(config)
+        instance = lookup_instances(config, config.get('aws_region'), [instance_id],
+                                    cache, refresh=refresh).get(instance_id)
 
-        if response['Reservations']:
-            instance = response['Reservations'][0]['Instances'][0]
-            state = instance['State']['Name']
-            state_color = 'green' if state == 'running' else 'yellow' if state == 'stopped' else 'red'
+        if instance:
+            state = instance['state']
+            age = int(time.time() - instance['fetched_at'])
 
             click.echo(click.style(f'Instance Status:', fg='cyan', bold=True))
             click.echo(f"Instance ID: {instance_id}")
-            click.echo(f"State: {click.style(state, fg=state_color)}")
-            click.echo(f"Instance Type: {instance.get('InstanceType', 'N/A')}")
-            click.echo(f"Public IP: {instance.get('PublicIpAddress', 'N/A')}")
+            click.echo(f"State: {click.style(state, fg=state_color(state))}"
+                       + (' (hibernated)' if state == 'stopped' and instance.get('hibernated') else '')
+                       + (' (spot interruption; `goldenshell start` relaunches it)'
+                          if state == 'stopped' and instance.get('interrupted') else '')
+                       + (f" (cached {age}s ago, --refresh to update)" if age > 0 else ''))
+            click.echo(f"Instance Type: {instance.get('instance_type') or 'N/A'}")
+            if 'spot' in instance:
+                click.echo(f"Market: {'spot' if instance['spot'] else 'on-demand'} in {instance.get('zone') or 'N/A'}")
+            click.echo(f"Public IP: {instance.get('public_ip') or 'N/A'}")
+            if 'hibernation' in instance:
+                click.echo(f"Hibernation: {'enabled' if instance['hibernation'] else 'not enabled'}")
+
+            starts = start_time_summary(instance_id)
+            if starts:
+                labels = {'resume': 'resume from hibernation', 'boot': 'cold boot'}
+                click.echo('Start to SSH: ' + ', '.join(
+                    f"{labels[mode]} {median:.0f}s (median of {count})" for mode, (median, count) in starts.items()))
+                if len(starts) == 2:
+                    saved = starts['boot'][0] - starts['resume'][0]
+                    click.echo(f"  Resuming saves {saved:.0f}s per start" if saved > 0
+                               else '  Resuming is not faster than a cold boot here')
 
             if state == 'running':
+                idle = describe_idle(instance.get('tags'))
+                click.echo(f"Idle Monitor: {idle or 'no report yet'}")
+
+                tags = instance.get('tags') or {}
+                tailscale_host = (tags.get(TAILSCALE_HOST_TAG) or deployment.get('tailscale_hostname')
+                                  or '<tailscale-hostname>')
                 click.echo(f"\n{click.style('Connection Commands:', fg='cyan')}")
-                click.echo(f"  SSH (Tailscale): ssh ubuntu@<tailscale-hostname>")
-                click.echo(f"  Mosh (Tailscale): mosh ubuntu@<tailscale-hostname>")
-                click.echo(f"  Web Terminal: http://{instance.get('PublicIpAddress', 'N/A')}:7681")
+                click.echo("  Fastest path: goldenshell ssh")
+                click.echo(f"  SSH (Tailscale): ssh ubuntu@{tailscale_host}")
+                click.echo(f"  Mosh (Tailscale): mosh ubuntu@{tailscale_host}")
+                try:
+                    profile = f" ({web_terminal_settings(config)['profile']} profile)"
+                except ValueError:
+                    profile = ''
+                click.echo(f"  Web Terminal: http://{instance.get('public_ip') or 'N/A'}:{WEB_TERMINAL_PORT}{profile}")
 
-                # Retrieve web terminal password from SSM
+                # Retrieve web terminal password from SSM (or the local secrets cache)
                 try:
-                    ssm = boto3.client('ssm', region_name=config.get('aws_region'))
-                    password_response = ssm.get_parameter(
-                        Name='/goldenshell/ttyd-password',
-                        WithDecryption=True
-                    )
-                    password = password_response['Parameter']['Value']
+                    password = SecretStore(config).get('/goldenshell', 'ttyd-password', refresh=refresh)
                     click.echo(f"\n{click.style('Web Terminal Credentials:', fg='cyan')}")
                     click.echo(f"  Username: ubuntu")
                     click.echo(f"  Password: {password}")
@@ -328,10 +4909,18 @@ def status():
 
 
 @cli.command()
-def start():
+@click.option('--env', 'env_names', multiple=True, help='Named environment to act on (repeatable)')
+@click.option('--all', 'all_envs', is_flag=True, help='Act on every registered environment')
+@click.option('--refresh', is_flag=True, help='Bypass the local instance cache')
+@click.option('--wait', is_flag=True, help='Wait for the transition to finish and SSH to be reachable')
+def start(env_names, all_envs, refresh, wait):
     """Start the instance"""
     config = Config()
 
+    if env_names or all_envs:
+        run_fleet_command(config, 'start', env_names, all_envs, refresh=refresh, wait=wait)
+        return
+
     deployment = config.get('last_deployment')
     if not deployment:
         click.echo(click.style('No active deployment found.', fg='yellow'))
@@ -342,17 +4931,15 @@ def start():
         click.echo(click.style('No instance ID found.', fg='yellow'))
         return
 
-    # Set AWS credentials
-    os.environ['AWS_ACCESS_KEY_ID'] = config.get('aws_access_key_id')
-    os.environ['AWS_SECRET_ACCESS_KEY'] = config.get('aws_secret_access_key')
-
     try:
-        ec2 = boto3.client('ec2', region_name=config.get('aws_region'))
+        ec2 = aws_client(config, 'ec2')
+        cache = instance_cache(config)
 
         # Check current state
-        response = ec2.describe_instances(InstanceIds=[instance_id])
-        if response['Reservations']:
-            state = response['Reservations'][0]['Instances'][0]['State']['Name']
+        instance = lookup_instances(config, config.get('aws_region'), [instance_id],
+                                    cache, refresh=refresh).get(instance_id)
+        if instance:
+            state = instance['state']
 
             if state == 'running':
                 click.echo(click.style('Instance is already running!', fg='green'))
@@ -360,12 +4947,33 @@ def start():
             elif state == 'pending':
                 click.echo(click.style('Instance is already starting...', fg='yellow'))
                 return
+            elif state == 'stopped' and instance.get('interrupted'):
+                click.echo(click.style('EC2 reclaimed this spot instance\'s capacity, and only EC2 may restart it; '
+                                       'relaunching it from its disk on the best capacity available...', fg='yellow'))
+                if relaunch_interrupted(config, [('instance', deployment)]):
+                    sys.exit(1)
+                return
 
-        click.echo('Starting instance...')
-        ec2.start_instances(InstanceIds=[instance_id])
+        resuming = bool(instance and instance.get('hibernated'))
+        click.echo('Resuming instance from hibernation...' if resuming else 'Starting instance...')
+        forget_connection(instance_id)
+        note_start({instance_id: 'resume' if resuming else 'boot'})
+        response = ec2.start_instances(InstanceIds=[instance_id])
+        cache.set_state(instance_id, response['StartingInstances'][0]['CurrentState']['Name'])
+        cache.save()
+
+        if wait:
+            if run_lifecycle(config, 'wait-running', [('instance', deployment)], wait_ready=True):
+                sys.exit(1)
+            click.echo(click.style('✓ Instance is up and accepting SSH connections!', fg='green'))
+            return
 
         click.echo(click.style('✓ Instance started successfully!', fg='green'))
-        click.echo('\nWait about 1-2 minutes for it to boot, then connect via:')
+        if resuming:
+            click.echo('\nSessions and running programs pick up where they left off in a few seconds.')
+            click.echo('Connect via:')
+        else:
+            click.echo('\nWait about 1-2 minutes for it to boot, then connect via:')
         click.echo('  ssh ubuntu@<tailscale-hostname>')
 
     except Exception as e:
@@ -374,10 +4982,20 @@ def start():
 
 
 @cli.command()
-def stop():
+@click.option('--env', 'env_names', multiple=True, help='Named environment to act on (repeatable)')
+@click.option('--all', 'all_envs', is_flag=True, help='Act on every registered environment')
+@click.option('--refresh', is_flag=True, help='Bypass the local instance cache')
+@click.option('--wait', is_flag=True, help='Wait for the transition to finish')
+@click.option('--hibernate', is_flag=True,
+              help='Save memory to disk so the next start resumes running programs (falls back to a normal stop)')
+def stop(env_names, all_envs, refresh, wait, hibernate):
     """Stop the instance"""
     config = Config()
 
+    if env_names or all_envs:
+        run_fleet_command(config, 'stop', env_names, all_envs, refresh=refresh, wait=wait, hibernate=hibernate)
+        return
+
     deployment = config.get('last_deployment')
     if not deployment:
         click.echo(click.style('No active deployment found.', fg='yellow'))
@@ -388,17 +5006,15 @@ def stop():
         click.echo(click.style('No instance ID found.', fg='yellow'))
         return
 
-    # Set AWS credentials
-    os.environ['AWS_ACCESS_KEY_ID'] = config.get('aws_access_key_id')
-    os.environ['AWS_SECRET_ACCESS_KEY'] = config.get('aws_secret_access_key')
-
     try:
-        ec2 = boto3.client('ec2', region_name=config.get('aws_region'))
+        ec2 = aws_client(config, 'ec2')
+        cache = instance_cache(config)
 
         # Check current state
-        response = ec2.describe_instances(InstanceIds=[instance_id])
-        if response['Reservations']:
-            state = response['Reservations'][0]['Instances'][0]['State']['Name']
+        instance = lookup_instances(config, config.get('aws_region'), [instance_id],
+                                    cache, refresh=refresh).get(instance_id)
+        if instance:
+            state = instance['state']
 
             if state == 'stopped':
                 click.echo(click.style('Instance is already stopped!', fg='yellow'))
@@ -407,91 +5023,401 @@ def stop():
                 click.echo(click.style('Instance is already stopping...', fg='yellow'))
                 return
 
-        click.echo('Stopping instance...')
-        ec2.stop_instances(InstanceIds=[instance_id])
+        if hibernate and instance and not instance.get('hibernation', True):
+            click.echo(click.style('Hibernation is not enabled on this instance (set enable_hibernation = true '
+                                   'in terraform.tfvars and redeploy); stopping normally', fg='yellow'))
+            hibernate = False
+
+        click.echo('Hibernating instance...' if hibernate else 'Stopping instance...')
+        close_ssh_masters(config, deployment)
+        forget_connection(instance_id)
+        changes, hibernated = stop_instances(ec2, [instance_id], hibernate=hibernate)
+        cache.set_state(instance_id, changes[0]['CurrentState']['Name'], hibernated=hibernated)
+        cache.save()
 
-        click.echo(click.style('✓ Instance stopped successfully!', fg='green'))
+        if wait and run_lifecycle(config, 'wait-stopped', [('instance', deployment)]):
+            sys.exit(1)
+
+        click.echo(click.style('✓ Instance hibernated; the next start resumes where you left off'
+                               if hibernated else '✓ Instance stopped successfully!', fg='green'))
 
     except Exception as e:
         click.echo(click.style(f'Error: {str(e)}', fg='red'))
         sys.exit(1)
 
 
-@cli.command()
-@click.option('--tailscale-hostname', help='Tailscale hostname of the instance')
-@click.option('--use-public-ip', is_flag=True, help='Use public IP instead of Tailscale')
-def ssh(tailscale_hostname, use_public_ip):
-    """SSH into the instance via Tailscale or public IP"""
+def remember_tailscale_hostname(config, hostname):
+    """Save the Tailscale hostname used for the current deployment"""
+    deployment = config.get('last_deployment')
+    if deployment and hostname and deployment.get('tailscale_hostname') != hostname:
+        deployment['tailscale_hostname'] = hostname
+        config.set('last_deployment', deployment)
+        config.save()
+
+
+@telemetry.traced('connect.choose')
+def choose_endpoint(config, tailscale_hostname=None, use_public_ip=False, use_ssm=False, probe=False):
+    """Pick how to reach the current deployment: an explicit choice, else the resolver.
+
+    Returns (endpoint, cached).
+    """
+    if tailscale_hostname:
+        remember_tailscale_hostname(config, tailscale_hostname)
+        return {'method': 'tailscale', 'host': tailscale_hostname}, False
+
+    deployment = config.get('last_deployment')
+    if not deployment or not deployment.get('instance_id'):
+        click.echo(click.style('No active deployment found.', fg='red'), err=True)
+        sys.exit(1)
+    region = config.get('aws_region')
+
+    if use_public_ip:
+        public_ip = known_public_ip(config, deployment)
+        if not public_ip:
+            click.echo(click.style('No public IP available. Please start the instance first.', fg='red'), err=True)
+            sys.exit(1)
+        return {'method': 'public-ip', 'host': public_ip}, False
+    if use_ssm:
+        return {'method': 'ssm', 'host': deployment['instance_id'], 'region': region}, False
+    try:
+        return resolve_connection(config, deployment, region, refresh=probe)
+    except RuntimeError as e:
+        click.echo(click.style(f'Error: {str(e)}', fg='red'), err=True)
+        sys.exit(1)
+
+
+@telemetry.traced('ssh.session')
+def run_on_endpoint(config, remote_command, announce, **choice):
+    """Run ssh (interactively, or with a remote command) over the chosen endpoint.
+
+    A cached path that fails to connect (ssh exits with 255 right away) is
+    probed again and retried once. Returns ssh's exit code.
+    """
     import subprocess
 
+    endpoint, cached = choose_endpoint(config, **choice)
+    while True:
+        if announce:
+            latency = f", {endpoint['latency'] * 1000:.0f}ms" if 'latency' in endpoint else ''
+            click.echo(f"Connecting via {endpoint['method']} ({endpoint['host']}{latency})...", err=True)
+        command, env = endpoint_command(config, endpoint)
+        if remote_command:
+            command += ['--'] + list(remote_command)
+        started = time.monotonic()
+        try:
+            returncode = subprocess.run(command, env=env).returncode
+        except FileNotFoundError:
+            click.echo(click.style('Error: ssh command not found. Please install OpenSSH.', fg='red'), err=True)
+            sys.exit(1)
+        if returncode != 255 or not cached or time.monotonic() - started > SSH_RETRY_WINDOW:
+            return returncode
+        click.echo(click.style('Cached connection path failed; probing again...', fg='yellow'), err=True)
+        endpoint, cached = choose_endpoint(config, probe=True)
+
+
+@cli.command()
+@click.option('--tailscale-hostname', help='Connect over Tailscale to this hostname')
+@click.option('--use-public-ip', is_flag=True, help='Connect to the public IP')
+@click.option('--ssm', 'use_ssm', is_flag=True, help='Connect through AWS Systems Manager Session Manager')
+@click.option('--probe', is_flag=True, help='Probe the connection paths again instead of using the cached choice')
+@click.option('--bench', is_flag=True, help='Measure cold vs. multiplexed connect latency and exit')
+@click.option('--bench-runs', type=int, default=SSH_BENCH_RUNS, show_default=True,
+              help='Connections per measurement with --bench')
+def ssh(tailscale_hostname, use_public_ip, use_ssm, probe, bench, bench_runs):
+    """SSH into the instance over the fastest reachable path.
+
+    Tailscale, the public IP and Session Manager are probed concurrently and
+    the winner is remembered for a while; the options force a path.
+    """
     config = Config()
-    deployment = config.get('last_deployment')
-    public_ip = deployment.get('public_ip') if deployment else None
 
-    # If no hostname provided and not using public IP flag, show options
-    if not tailscale_hostname and not use_public_ip:
-        click.echo(click.style('SSH Connection Options:', fg='cyan', bold=True))
-        click.echo()
+    if bench:
+        deployment = config.get('last_deployment')
+        if not deployment:
+            click.echo(click.style('No active deployment found.', fg='yellow'))
+            sys.exit(1)
+        remember_tailscale_hostname(config, tailscale_hostname)
+        instance = lookup_instances(config, config.get('aws_region'), [deployment['instance_id']],
+                                    instance_cache(config)).get(deployment['instance_id']) or {}
+        paths = []
+        for candidate in connection_candidates(deployment, instance):
+            if candidate['method'] == 'public-ip':
+                paths.append(('public-ip', candidate['host'], ssh_key_file(config)))
+            elif candidate['method'] == 'tailscale' and not use_public_ip:
+                paths.append(('tailscale', candidate['host'], None))
+        if not paths:
+            click.echo(click.style('Nothing to benchmark: no public IP or Tailscale address known.', fg='yellow'))
+            sys.exit(1)
+        bench_ssh(config, paths, bench_runs)
+        return
 
-        # Show public IP option if available
-        if public_ip:
-            click.echo(f"1. Connect via Public IP: {click.style(public_ip, fg='green')}")
-            click.echo(f"   Command: ssh -i ~/.ssh/{config.get('ssh_key_name', 'goldenshell-key')}.pem ubuntu@{public_ip}")
-        else:
-            click.echo("1. Public IP not available (instance may be stopped)")
+    run_on_endpoint(config, None, True, tailscale_hostname=tailscale_hostname,
+                    use_public_ip=use_public_ip, use_ssm=use_ssm, probe=probe)
 
-        click.echo()
-        click.echo("2. Connect via Tailscale:")
-        click.echo("   - Check your Tailscale admin panel for the hostname")
-        click.echo("   - Run: goldenshell ssh --tailscale-hostname <hostname>")
-        click.echo()
 
-        # Prompt user for choice
-        if public_ip:
-            choice = click.prompt(
-                'Select connection method',
-                type=click.Choice(['1', '2', 'cancel']),
-                default='1'
-            )
+@cli.command('exec', context_settings={'ignore_unknown_options': True,
+                                        'allow_interspersed_args': False})
+@click.option('--tailscale-hostname', help='Connect over Tailscale to this hostname')
+@click.option('--use-public-ip', is_flag=True, help='Connect to the public IP')
+@click.option('--ssm', 'use_ssm', is_flag=True, help='Connect through AWS Systems Manager Session Manager')
+@click.option('--probe', is_flag=True, help='Probe the connection paths again instead of using the cached choice')
+@click.argument('command', nargs=-1, required=True, type=click.UNPROCESSED)
+def exec_command(tailscale_hostname, use_public_ip, use_ssm, probe, command):
+    """Run COMMAND on the instance over the shared SSH connection.
 
-            if choice == '1':
-                use_public_ip = True
-            elif choice == '2':
-                tailscale_hostname = click.prompt('Enter Tailscale hostname')
-            else:
-                click.echo('Cancelled.')
-                return
+    Uses the same path selection as `goldenshell ssh` and exits with the
+    remote command's exit code.
+    """
+    config = Config()
+    sys.exit(run_on_endpoint(config, command, False, tailscale_hostname=tailscale_hostname,
+                             use_public_ip=use_public_ip, use_ssm=use_ssm, probe=probe))
+
+
+def endpoint_options(f):
+    """The --tailscale-hostname/--use-public-ip/--ssm/--probe options shared by sync commands"""
+    f = click.option('--probe', is_flag=True,
+                     help='Probe the connection paths again instead of using the cached choice')(f)
+    f = click.option('--ssm', 'use_ssm', is_flag=True,
+                     help='Connect through AWS Systems Manager Session Manager')(f)
+    f = click.option('--use-public-ip', is_flag=True, help='Connect to the public IP')(f)
+    return click.option('--tailscale-hostname', help='Connect over Tailscale to this hostname')(f)
+
+
+def run_sync(direction, paths, destination, delete, excludes, streams, watch, debounce, **choice):
+    """Shared body of `sync push` and `sync pull`"""
+    config = Config()
+    endpoint, _ = choose_endpoint(config, **choice)
+    units = sync_units(direction, paths, destination)
+    excludes = SYNC_DEFAULT_EXCLUDES + tuple(excludes)
+    hash_cache = read_json(SYNC_HASH_CACHE_FILE, {})
+    click.echo(f"Syncing via {endpoint['method']} ({endpoint['host']})...")
+    try:
+        if watch:
+            watch_push(config, endpoint, units, excludes, delete, streams, hash_cache, debounce)
         else:
-            click.echo(click.style('No public IP available. Please start the instance first.', fg='yellow'))
-            return
+            sync_once(config, endpoint, direction, units, excludes, delete, streams, hash_cache)
+    except (RuntimeError, OSError, ValueError) as e:
+        click.echo(click.style(f'Error: {str(e)}', fg='red'))
+        sys.exit(1)
+
+
+@cli.group()
+def sync():
+    """Copy files to and from the instance.
+
+    Only files whose content changed are sent (checked against content
+    hashes on both sides), compressed and over parallel streams.
+    """
+    pass
+
+
+@sync.command('push')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--to', 'destination', default='~', show_default=True, help='Remote directory to copy into')
+@click.option('--delete', is_flag=True, help='Delete remote files that no longer exist locally')
+@click.option('--exclude', 'excludes', multiple=True,
+              help=f"Name pattern to skip (repeatable; always skips {', '.join(SYNC_DEFAULT_EXCLUDES)})")
+@click.option('--streams', type=click.IntRange(1, 16), default=SYNC_STREAMS, show_default=True,
+              help='Parallel transfer streams')
+@click.option('--watch', is_flag=True, help='Keep running and push changes as they happen')
+@click.option('--debounce', type=float, default=SYNC_DEBOUNCE, show_default=True,
+              help='With --watch, seconds to wait for changes to settle before pushing')
+@endpoint_options
+def sync_push(paths, destination, delete, excludes, streams, watch, debounce, **choice):
+    """Copy local PATHS to the instance"""
+    run_sync('push', paths, destination, delete, excludes, streams, watch, debounce, **choice)
+
+
+@sync.command('pull')
+@click.argument('paths', nargs=-1, required=True)
+@click.option('--to', 'destination', default='.', show_default=True, help='Local directory to copy into')
+@click.option('--delete', is_flag=True, help='Delete local files that no longer exist on the instance')
+@click.option('--exclude', 'excludes', multiple=True,
+              help=f"Name pattern to skip (repeatable; always skips {', '.join(SYNC_DEFAULT_EXCLUDES)})")
+@click.option('--streams', type=click.IntRange(1, 16), default=SYNC_STREAMS, show_default=True,
+              help='Parallel transfer streams')
+@endpoint_options
+def sync_pull(paths, destination, delete, excludes, streams, **choice):
+    """Copy PATHS from the instance (relative to the home directory)"""
+    run_sync('pull', paths, destination, delete, excludes, streams, False, None, **choice)
+
+
+@cli.group()
+def webterm():
+    """Web terminal (ttyd) tools"""
+    pass
+
+
+@webterm.command('bench')
+@click.option('--url', help=f'Web terminal URL (default: the deployment\'s public IP, port {WEB_TERMINAL_PORT})')
+@click.option('--username', default='ubuntu', show_default=True, help='Web terminal username')
+@click.option('--password', help='Web terminal password (default: read from SSM for the deployment)')
+@click.option('--keystrokes', type=click.IntRange(1), default=WEBTERM_BENCH_KEYSTROKES, show_default=True,
+              help='Keystrokes to time')
+@click.option('--bytes', 'size', type=click.IntRange(1), default=WEBTERM_BENCH_BYTES, show_default=True,
+              help='Random data the throughput test prints (base64-encoded)')
+def webterm_bench(url, username, password, keystrokes, size):
+    """Measure keystroke latency and output throughput of the web terminal.
+
+    Types into the shared terminal session (each keystroke is erased again)
+    and prints a burst of output, so run it with a shell prompt showing.
+    benchmarks/ttyd_standin.py serves a local stand-in to try it against.
+    """
+    config = Config()
+
+    def stored_password(refresh=False):
+        try:
+            return SecretStore(config).get('/goldenshell', 'ttyd-password', refresh=refresh)
+        except Exception as e:
+            click.echo(click.style(f'Error: Could not retrieve web terminal password: {str(e)}', fg='red'))
+            sys.exit(1)
+
+    from_store = False
+    if not url:
+        deployment = config.get('last_deployment')
+        if not deployment or not deployment.get('instance_id'):
+            click.echo(click.style('No active deployment found. Pass --url.', fg='red'))
+            sys.exit(1)
+        public_ip = known_public_ip(config, deployment)
+        if not public_ip:
+            click.echo(click.style('No public IP available. Please start the instance first.', fg='red'))
+            sys.exit(1)
+        url = f'http://{public_ip}:{WEB_TERMINAL_PORT}'
+        if password is None:
+            password, from_store = stored_password(), True
 
-    # Execute SSH command
+    click.echo(f'Benchmarking web terminal at {url}...')
+    client = WebTerminalClient(url, username, password)
     try:
-        if use_public_ip and public_ip:
-            # SSH via public IP
-            key_file = f"~/.ssh/{config.get('ssh_key_name', 'goldenshell-key')}.pem"
-            key_file_expanded = os.path.expanduser(key_file)
+        try:
+            result = bench_web_terminal(client, keystrokes, size)
+        except PermissionError:
+            if not from_store:
+                raise
+            # The cached password may predate a rotation
+            client.close()
+            client = WebTerminalClient(url, username, stored_password(refresh=True))
+            result = bench_web_terminal(client, keystrokes, size)
+    except (OSError, RuntimeError) as e:
+        client.close()
+        click.echo(click.style(f'Error: {str(e)}', fg='red'))
+        sys.exit(1)
 
-            click.echo(f"Connecting to {public_ip} via SSH...")
-            subprocess.run(['ssh', '-i', key_file_expanded, f'ubuntu@{public_ip}'])
-        elif tailscale_hostname:
-            # SSH via Tailscale
-            click.echo(f"Connecting to {tailscale_hostname} via Tailscale SSH...")
-            subprocess.run(['ssh', f'ubuntu@{tailscale_hostname}'])
-        else:
-            click.echo(click.style('Error: No hostname or IP address provided.', fg='red'))
+    compression = ('permessage-deflate' if result['compressed']
+                   else click.style('off (not negotiated)', fg='yellow'))
+    data_mb = result['data_bytes'] / 1e6
+    click.echo(f"  Connect (WebSocket upgrade): {result['connect'] * 1000:.0f}ms")
+    click.echo(f"  Keystroke round trip:        median {result['median'] * 1000:.1f}ms, "
+               f"p95 {result['p95'] * 1000:.1f}ms ({result['keystrokes']} keystrokes)")
+    click.echo(f"  Output throughput:           {data_mb / result['elapsed']:.2f} MB/s "
+               f"({data_mb:.2f} MB in {result['elapsed']:.2f}s)")
+    click.echo(f"  Compression:                 {compression}, "
+               f"{result['wire_bytes'] / max(result['data_bytes'], 1):.2f}x of the output on the wire")
+
+
+@cli.command()
+@click.option('--vcpus', type=click.IntRange(1), help=f'vCPUs needed (default: as {DEFAULT_INSTANCE_TYPE})')
+@click.option('--memory', type=click.FloatRange(0.5), help='Memory needed in GiB')
+@click.option('--arch', type=click.Choice(['x86_64', 'arm64']), help='CPU architecture (default: x86_64)')
+@click.option('--market', type=click.Choice(['auto', 'spot', 'on-demand']),
+              help='Purchase option to consider (default: auto, both)')
+@click.option('--region', 'regions', multiple=True,
+              help='Region to consider (repeatable; default: the configured region)')
+@click.option('--limit', type=click.IntRange(1), default=CAPACITY_SHOWN, show_default=True,
+              help='Number of candidates to show')
+def capacity(vcpus, memory, arch, market, regions, limit):
+    """Rank instance types, zones and spot/on-demand by cost, interruption risk and latency"""
+    config = Config()
+
+    if not config.config:
+        click.echo(click.style('Error: No configuration found. Run "goldenshell init" first.', fg='red'))
+        sys.exit(1)
 
-    except FileNotFoundError:
-        click.echo(click.style('Error: ssh command not found. Please install OpenSSH.', fg='red'))
+    requirement = capacity_requirement(config, vcpus, memory, arch, market, always=True)
+    regions = list(regions) or [config.get('aws_region')]
+    click.echo(f"Finding {requirement['vcpus']} vCPU / {requirement['memory']:g} GiB ({requirement['arch']}, "
+               f"{requirement['market']}) in {', '.join(regions)}...")
+    try:
+        candidates = find_capacity(config, requirement, regions,
+                                   zones=pinned_zones(config, config.get('aws_region')))
     except Exception as e:
         click.echo(click.style(f'Error: {str(e)}', fg='red'))
+        sys.exit(1)
+    if not candidates:
+        click.echo(click.style('Nothing fits; try another --market, --arch or --region.', fg='yellow'))
+        return
+
+    click.echo(click.style(f"\n{'#':>3} {'Type':14} {'Market':10} {'Zone':16} {'vCPU':>4} {'Memory':>7} "
+                           f"{'$/hour':>8} {'$/month':>8} {'Interrupted':12} {'RTT':>6}", fg='cyan'))
+    for number, candidate in enumerate(candidates[:limit], 1):
+        if candidate['market'] != 'spot':
+            interruption = '-'
+        elif candidate['interruption'] is None:
+            interruption = 'unknown'
+        else:
+            interruption = SPOT_INTERRUPTION_BANDS[candidate['interruption']]
+        latency = f"{candidate['latency'] * 1000:.0f}ms" if candidate['latency'] is not None else '?'
+        click.echo(f"{number:>3} {candidate['instance_type']:14} {candidate['market']:10} {candidate['zone']:16} "
+                   f"{candidate['vcpus']:>4} {candidate['memory']:>6g}G {candidate['hourly']:>8.4f} "
+                   f"{candidate['hourly'] * HOURS_PER_MONTH:>8.0f} {interruption:12} {latency:>6}")
+    if len(candidates) > limit:
+        click.echo(f"    ... and {len(candidates) - limit} more (--limit)")
+
+    best = candidates[0]
+    command = f"goldenshell deploy --vcpus {requirement['vcpus']} --memory {requirement['memory']:g}"
+    if requirement['arch'] != 'x86_64':
+        command += f" --arch {requirement['arch']}"
+    if requirement['market'] != 'auto':
+        command += f" --market {requirement['market']}"
+    if best['region'] != config.get('aws_region'):
+        command += f" --region {best['region']}"
+    click.echo(click.style(f'\nBest: {describe_capacity(best)}', fg='green'))
+    click.echo(f'Deploy it with: {command}')
 
 
 @cli.command()
-def resize():
-    """Change the instance type (requires instance restart)"""
+@click.option('--refresh', is_flag=True, help='Bypass the local instance cache')
+@click.option('--instance-type', help='New instance type (skips the interactive menu)')
+@click.option('--env', 'env_names', multiple=True, help='Named environment to resize (repeatable)')
+@click.option('--all', 'all_envs', is_flag=True, help='Resize every registered environment')
+@click.option('--wait', is_flag=True, help='Wait for restarted instances to accept SSH')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation')
+@click.option('--recommend', is_flag=True,
+              help='Recommend the cheapest type that fits CloudWatch usage, then offer to apply it')
+@click.option('--days', type=click.IntRange(1, 63), default=RECOMMEND_DAYS, show_default=True,
+              help='Days of usage to consider with --recommend')
+@click.option('--live', is_flag=True,
+              help='Swap to a new instance cloned from a snapshot instead of restarting (seconds offline)')
+def resize(refresh, instance_type, env_names, all_envs, wait, yes, recommend, days, live):
+    """Change the instance type (requires instance restart, or --live)"""
     config = Config()
 
+    if recommend and (instance_type or env_names or all_envs):
+        raise click.UsageError('--recommend cannot be combined with --instance-type, --env or --all')
+    if live and (env_names or all_envs):
+        raise click.UsageError('--live only resizes the main deployment, not --env/--all')
+
+    if env_names or all_envs:
+        if not instance_type:
+            raise click.UsageError('--instance-type is required with --env/--all')
+        selected = select_environments(config, env_names, all_envs)
+        if not selected:
+            click.echo(click.style('No matching environments found.', fg='yellow'))
+            return
+
+        click.echo(f"This will change {len(selected)} environment(s) to {instance_type}.")
+        click.echo(click.style('WARNING: Running instances will be stopped and restarted!', fg='yellow'))
+        if not yes and not click.confirm('Continue?'):
+            click.echo('Cancelled.')
+            return
+
+        failures = run_lifecycle(config, 'resize', selected, instance_type=instance_type, wait_ready=wait)
+        if failures:
+            click.echo(click.style(f'\n✗ {failures} environment(s) failed', fg='red'))
+            sys.exit(1)
+        click.echo(click.style(f'\n✓ Resized {len(selected)} environment(s) to {instance_type}', fg='green'))
+        return
+
     deployment = config.get('last_deployment')
     if not deployment:
         click.echo(click.style('No active deployment found.', fg='yellow'))
@@ -502,119 +5428,341 @@ def resize():
         click.echo(click.style('No instance ID found.', fg='yellow'))
         return
 
-    # Set AWS credentials
-    os.environ['AWS_ACCESS_KEY_ID'] = config.get('aws_access_key_id')
-    os.environ['AWS_SECRET_ACCESS_KEY'] = config.get('aws_secret_access_key')
-    os.environ['AWS_DEFAULT_REGION'] = config.get('aws_region')
-
     try:
-        ec2 = boto3.client('ec2', region_name=config.get('aws_region'))
+        ec2 = aws_client(config, 'ec2')
+        cache = instance_cache(config)
 
         # Get current instance type
-        response = ec2.describe_instances(InstanceIds=[instance_id])
-        if response['Reservations']:
-            instance = response['Reservations'][0]['Instances'][0]
-            current_type = instance.get('InstanceType', 'unknown')
-            current_state = instance['State']['Name']
+        instance = lookup_instances(config, config.get('aws_region'), [instance_id],
+                                    cache, refresh=refresh).get(instance_id)
+        if instance:
+            current_type = instance.get('instance_type') or 'unknown'
+            current_state = instance['state']
 
             click.echo(click.style('Instance Resize', fg='cyan', bold=True))
             click.echo(f"\nCurrent instance type: {click.style(current_type, fg='green')}")
             click.echo(f"Current state: {current_state}\n")
 
-            # Instance type options with descriptions
-            instance_types = {
-                '1': ('t3.micro', '2 vCPU, 1GB RAM - ~$7.50/month'),
-                '2': ('t3.small', '2 vCPU, 2GB RAM - ~$15/month'),
-                '3': ('t3.medium', '2 vCPU, 4GB RAM - ~$30/month (default)'),
-                '4': ('t3.large', '2 vCPU, 8GB RAM - ~$60/month'),
-                '5': ('t3.xlarge', '4 vCPU, 16GB RAM - ~$120/month'),
-                '6': ('t3.2xlarge', '8 vCPU, 32GB RAM - ~$240/month'),
-                '7': ('c6i.large', '2 vCPU, 4GB RAM - Compute optimized ~$60/month'),
-                '8': ('c6i.xlarge', '4 vCPU, 8GB RAM - Compute optimized ~$120/month'),
-            }
-
-            click.echo(click.style('Available instance types:', fg='cyan'))
-            for key, (itype, desc) in instance_types.items():
-                marker = '→' if itype == current_type else ' '
-                click.echo(f"  {marker} {key}. {itype:15} - {desc}")
-
-            click.echo()
-            choice = click.prompt('Select instance type (or press Enter to cancel)',
-                                default='', show_default=False)
-
-            if not choice or choice not in instance_types:
-                click.echo('Cancelled.')
-                return
+            if recommend:
+                new_type = recommend_resize(config, ec2, config.get('aws_region'), instance_id,
+                                            current_type, days)
+                if new_type is None:
+                    return
+            elif instance_type:
+                new_type = instance_type
+            else:
+                # Instance type options with descriptions, priced for this region
+                catalog = priced_catalog(config, config.get('aws_region'))
+                instance_types = {str(number): (itype, instance_type_menu_label(itype, spec))
+                                  for number, (itype, spec) in enumerate(catalog.items(), 1)}
+                click.echo(click.style('Available instance types:', fg='cyan'))
+                for key, (itype, desc) in instance_types.items():
+                    marker = '→' if itype == current_type else ' '
+                    click.echo(f"  {marker} {key}. {itype:15} - {desc}")
+
+                click.echo()
+                choice = click.prompt('Select instance type (or press Enter to cancel)',
+                                    default='', show_default=False)
 
-            new_type = instance_types[choice][0]
+                if not choice or choice not in instance_types:
+                    click.echo('Cancelled.')
+                    return
+
+                new_type = instance_types[choice][0]
 
             if new_type == current_type:
                 click.echo(click.style(f'Instance is already {current_type}', fg='yellow'))
                 return
 
+            if instance.get('hibernation') and not live:
+                click.echo(click.style("EC2 can't change the type of an instance with hibernation enabled; "
+                                       'use --live to move to a new instance instead.', fg='red'))
+                sys.exit(1)
+            if instance.get('spot') and not live:
+                click.echo(click.style("EC2 can't change the type of a spot instance; "
+                                       'use --live to move to a new instance instead.', fg='red'))
+                sys.exit(1)
+
+            if live:
+                if current_state != 'running':
+                    click.echo(click.style(f'A live resize needs a running instance (it is {current_state}); '
+                                           'resize without --live instead.', fg='yellow'))
+                    return
+                click.echo(f"\nThis will replace {instance_id} with a new {new_type} instance "
+                           f"cloned from a snapshot of its root volume")
+                click.echo('The instance stays online until a short cutover; the old one is then stopped.')
+                if not yes and not click.confirm('Continue?'):
+                    click.echo('Cancelled.')
+                    return
+                live_resize(config, ec2, deployment, new_type)
+                return
+
             # Confirm the change
             click.echo(f"\nThis will change instance type from {current_type} to {new_type}")
             if current_state == 'running':
                 click.echo(click.style('WARNING: Instance will be stopped and restarted!', fg='yellow'))
 
-            if not click.confirm('Continue?'):
+            if not yes and not click.confirm('Continue?'):
                 click.echo('Cancelled.')
                 return
 
-            # Stop instance if running
-            if current_state == 'running':
+            # Stop instance if running; it comes back with a new public IP
+            if current_state in ('running', 'pending'):
                 click.echo('\nStopping instance...')
+                close_ssh_masters(config, deployment)
                 ec2.stop_instances(InstanceIds=[instance_id])
+            forget_connection(instance_id)
 
-                # Wait for instance to stop
-                waiter = ec2.get_waiter('instance_stopped')
+            # Wait for instance to stop
+            if current_state != 'stopped':
                 click.echo('Waiting for instance to stop...')
-                waiter.wait(InstanceIds=[instance_id])
+                if run_lifecycle(config, 'wait-stopped', [('instance', deployment)]):
+                    sys.exit(1)
 
             # Modify instance type
             click.echo(f'Changing instance type to {new_type}...')
+            cache.invalidate(instance_id)
+            cache.save()
             ec2.modify_instance_attribute(
                 InstanceId=instance_id,
                 InstanceType={'Value': new_type}
             )
 
-            # Update Terraform tfvars file
-            tf_dir = Path(__file__).parent / 'terraform'
-            tfvars_file = tf_dir / 'terraform.tfvars'
-
-            if tfvars_file.exists():
-                click.echo('Updating terraform.tfvars...')
-                with open(tfvars_file, 'r') as f:
-                    content = f.read()
-
-                # Update instance_type line
-                import re
-                content = re.sub(
-                    r'instance_type\s*=\s*"[^"]*"',
-                    f'instance_type = "{new_type}"',
-                    content
-                )
-
-                with open(tfvars_file, 'w') as f:
-                    f.write(content)
+            update_tfvars_instance_type(Path(__file__).parent / 'terraform', new_type)
+            config.set('last_deployment', {**deployment, 'instance_type': new_type})
+            config.save()
 
             click.echo(click.style(f'\n✓ Instance type changed to {new_type}', fg='green'))
 
             # Ask if user wants to start the instance
-            if click.confirm('\nStart the instance now?', default=True):
+            if yes or click.confirm('\nStart the instance now?', default=True):
                 click.echo('Starting instance...')
-                ec2.start_instances(InstanceIds=[instance_id])
-                click.echo(click.style('✓ Instance started!', fg='green'))
-                click.echo('Wait 1-2 minutes for it to boot, then connect via SSH.')
+                response = ec2.start_instances(InstanceIds=[instance_id])
+                cache.set_state(instance_id, response['StartingInstances'][0]['CurrentState']['Name'])
+                cache.save()
+                if wait:
+                    if run_lifecycle(config, 'wait-running', [('instance', deployment)], wait_ready=True):
+                        sys.exit(1)
+                    click.echo(click.style('✓ Instance is up and accepting SSH connections!', fg='green'))
+                else:
+                    click.echo(click.style('✓ Instance started!', fg='green'))
+                    click.echo('Wait 1-2 minutes for it to boot, then connect via SSH.')
+        else:
+            click.echo(click.style('Instance not found.', fg='yellow'))
 
     except Exception as e:
         click.echo(click.style(f'Error: {str(e)}', fg='red'))
         sys.exit(1)
 
 
+def update_tfvars_instance_type(tf_dir, new_type):
+    """Point terraform.tfvars at a new instance type, if the file exists"""
+    tfvars_file = tf_dir / 'terraform.tfvars'
+
+    if tfvars_file.exists():
+        click.echo('Updating terraform.tfvars...')
+        with open(tfvars_file, 'r') as f:
+            content = f.read()
+
+        # Update instance_type line
+        import re
+        content = re.sub(
+            r'instance_type\s*=\s*"[^"]*"',
+            f'instance_type = "{new_type}"',
+            content
+        )
+
+        with open(tfvars_file, 'w') as f:
+            f.write(content)
+
+
+def terraform_adopt_instance(tf_dir, tf_vars, env, instance_id):
+    """Make aws_instance.goldenshell in `tf_dir` track another instance; returns (return code, stderr)"""
+    tf = terraform_client(tf_dir, env)
+    save_deploy_cache(tf_dir, None)
+    with telemetry.span('terraform.state_rm'):
+        return_code, _, stderr = tf.cmd('state', 'rm', 'aws_instance.goldenshell')
+    if return_code == 0:
+        with telemetry.span('terraform.import'):
+            return_code, _, stderr = tf.cmd('import', 'aws_instance.goldenshell', instance_id,
+                                            var=tf_vars, input=False)
+    return return_code, stderr
+
+
+def live_resize(config, ec2, deployment, new_type):
+    """Swap the main deployment onto a new instance of `new_type` and re-point Terraform at it"""
+    import asyncio
+
+    region = config.get('aws_region')
+    old_id = deployment['instance_id']
+    engine = LifecycleEngine(config, names={old_id: 'old'})
+    started = time.monotonic()
+    try:
+        clone, downtime = asyncio.run(swap_instance(engine, ec2, region, old_id, new_type))
+    finally:
+        engine.cache.save()
+    new_id = clone['InstanceId']
+
+    close_ssh_masters(config, deployment)
+    forget_connection(old_id, new_id)
+    deployment = {**deployment, 'instance_id': new_id, 'public_ip': clone.get('PublicIpAddress'),
+                  'instance_type': new_type}
+    config.set('last_deployment', deployment)
+    config.save()
+
+    tf_dir = Path(__file__).parent / 'terraform'
+    update_tfvars_instance_type(tf_dir, new_type)
+
+    # Terraform still tracks the old instance; hand it the replacement instead
+    click.echo('Updating Terraform state...')
+    return_code, stderr = terraform_adopt_instance(tf_dir, terraform_vars(config, region, deployment),
+                                                   terraform_env(config, region), new_id)
+
+    click.echo(click.style(f'\n✓ Now running on {new_id} ({new_type}), '
+                           f'{downtime:.1f}s offline, {time.monotonic() - started:.0f}s total', fg='green'))
+    click.echo(f'The old instance {old_id} is stopped, not terminated: start it again to roll back, '
+               f'or terminate it once you are happy. `destroy` terminates it too.')
+    if return_code != 0:
+        click.echo(click.style(f'Could not update Terraform state: {stderr.strip()}', fg='yellow'))
+        click.echo('Fix it manually from the terraform directory with:')
+        click.echo('  terraform state rm aws_instance.goldenshell')
+        click.echo(f'  terraform import aws_instance.goldenshell {new_id}')
+    else:
+        click.echo('Run `goldenshell deploy` to point the CloudWatch alarms at the new instance.')
+
+
+def relaunch_interrupted(config, selected):
+    """Relaunch spot instances EC2 stopped to reclaim capacity, on the best capacity available now.
+
+    `selected` is [(name, deployment)]. Each deployment's saved capacity
+    requirement (else one matching its instance) goes to find_capacity(),
+    leaving out the spot pool that was just reclaimed, and relaunch_instance()
+    moves it onto the best candidate; all run concurrently. The config and
+    Terraform state then follow the replacements. Returns the number of
+    failures.
+    """
+    import asyncio
+
+    engine = LifecycleEngine(config, names={dep['instance_id']: name for name, dep in selected})
+    main_id = (config.get('last_deployment') or {}).get('instance_id')
+    failures = 0
+    jobs = []
+    for name, deployment in selected:
+        region = deployment.get('region') or config.get('aws_region')
+        ec2 = aws_client(config, 'ec2', region)
+        try:
+            old = describe_instances_batched(ec2, [deployment['instance_id']])[deployment['instance_id']]
+            requirement = deployment.get('capacity') or requirement_of(ec2, old)
+            reclaimed = (old['InstanceType'], old['Placement']['AvailabilityZone'], 'spot')
+            candidates = [candidate for candidate in find_capacity(config, requirement, [region],
+                                                                   zones=pinned_zones(config, region))
+                          if (candidate['instance_type'], candidate['zone'], candidate['market']) != reclaimed]
+            if not candidates:
+                raise RuntimeError('no other capacity fits')
+        except Exception as e:
+            failures += 1
+            click.echo(click.style(f'{name}: cannot relaunch: {str(e)}', fg='red'))
+            continue
+        click.echo(f'{name}: relaunching as {describe_capacity(candidates[0])}')
+        jobs.append((name, deployment, region, candidates[0], old))
+
+    async def run_all():
+        return await asyncio.gather(*(
+            engine.guard(old['InstanceId'], relaunch_instance(engine, aws_client(config, 'ec2', region),
+                                                              region, old, candidate))
+            for _, _, region, candidate, old in jobs))
+
+    try:
+        results = asyncio.run(run_all()) if jobs else []
+    finally:
+        engine.cache.save()
+
+    for (name, deployment, region, candidate, old), clone in zip(jobs, results):
+        if isinstance(clone, Exception):
+            failures += 1
+            continue
+        old_id, new_id = old['InstanceId'], clone['InstanceId']
+        close_ssh_masters(config, deployment)
+        forget_connection(old_id, new_id)
+        updated = {**deployment, 'instance_id': new_id, 'public_ip': clone.get('PublicIpAddress'),
+                   'instance_type': candidate['instance_type'],
+                   'availability_zone': candidate['zone'], 'market': candidate['market']}
+        if old_id == main_id:
+            config.set('last_deployment', updated)
+            tf_dir = Path(__file__).parent / 'terraform'
+            update_tfvars_instance_type(tf_dir, candidate['instance_type'])
+            tf_vars = terraform_vars(config, region, updated)
+        else:
+            config.set_environment(name, updated)
+            tf_dir = WORKSPACES_DIR / name
+            tf_vars = terraform_vars(config, region, updated, environment=name)
+        config.save()
+
+        click.echo(click.style(f"✓ {name}: now on {new_id} ({candidate['instance_type']} {candidate['market']} "
+                               f"in {candidate['zone']})", fg='green'))
+        click.echo(f'  The interrupted {old_id} is stopped, not terminated; terminate it once you are happy '
+                   f'(`destroy` terminates it too).')
+        if deployment.get('source') == 'pool' or not (tf_dir / '.terraform').is_dir():
+            continue
+        # Terraform still tracks the interrupted instance; hand it the replacement instead
+        return_code, stderr = terraform_adopt_instance(tf_dir, tf_vars, terraform_env(config, region), new_id)
+        if return_code != 0:
+            click.echo(click.style(f'  Could not update Terraform state: {stderr.strip()}', fg='yellow'))
+            click.echo(f'  Fix it manually from {tf_dir} with:')
+            click.echo('    terraform state rm aws_instance.goldenshell')
+            click.echo(f'    terraform import aws_instance.goldenshell {new_id}')
+    return failures
+
+
+def destroy_environment(config, name):
+    """Tear down a `deploy --env` environment, then forget it and its caches.
+
+    Terraform destroys it from its own workspace directory; an environment
+    claimed from the warm pool has no Terraform state, so its instance is
+    terminated instead. Instances it replaced (live resizes, spot relaunches)
+    are terminated as well. Raises on failure, leaving the environment
+    registered.
+    """
+    deployment = config.environments()[name]
+    region = deployment.get('region') or config.get('aws_region')
+    tf_dir = WORKSPACES_DIR / name
+    ec2 = aws_client(config, 'ec2', region)
+
+    if deployment.get('source') == 'pool':
+        ec2.terminate_instances(InstanceIds=[deployment['instance_id']])
+        click.echo(f"{name}: terminated warm-pool instance {deployment['instance_id']}")
+    else:
+        if not (tf_dir / '.terraform').is_dir():
+            raise RuntimeError(f'not deployed with "deploy --env" (no workspace in {tf_dir}); '
+                               f'"goldenshell env remove {name}" forgets it without touching AWS')
+        tf = terraform_client(tf_dir, terraform_env(config, region))
+        select_terraform_workspace(tf, tf_dir, name)
+        timings = []
+        return_code, _, stderr = timed_terraform(timings, 'destroy', tf.destroy, auto_approve=True,
+                                                 var=terraform_vars(config, region, deployment, environment=name))
+        echo_terraform_timings(timings)
+        if return_code != 0:
+            raise TerraformError(f'Error destroying: {stderr}')
+    save_deploy_cache(tf_dir, None)
+
+    if deployment.get('instance_id'):
+        replaced = terminate_replaced(ec2, deployment['instance_id'])
+        if replaced:
+            click.echo(f"{name}: terminated replaced instances {', '.join(replaced)}")
+        cache = instance_cache(config)
+        cache.invalidate(deployment['instance_id'])
+        cache.save()
+        forget_connection(deployment['instance_id'])
+    config.remove_environment(name)
+    config.save()
+
+
 @cli.command()
 @click.confirmation_option(prompt='Are you sure you want to destroy the environment?')
-def destroy():
+@click.option('--env', 'env_names', multiple=True, help='Destroy a `deploy --env` environment (repeatable)')
+@click.option('--region', 'regions', multiple=True,
+              help='Destroy the environment named after this region (repeatable)')
+def destroy(env_names, regions):
     """Tear down the AWS environment"""
     config = Config()
 
@@ -622,19 +5770,44 @@ def destroy():
         click.echo(click.style('Error: No configuration found.', fg='red'))
         sys.exit(1)
 
+    if env_names or regions:
+        environments = config.environments()
+        failures = 0
+        for name in dict.fromkeys(env_names + regions):
+            if name not in environments:
+                click.echo(click.style(f'Environment "{name}" not found.', fg='yellow'))
+                failures += 1
+                continue
+            click.echo(click.style(f'Destroying environment {name}...', fg='cyan'))
+            try:
+                destroy_environment(config, name)
+            except Exception as e:
+                click.echo(click.style(f'{name}: {str(e)}', fg='red'))
+                failures += 1
+                continue
+            click.echo(click.style(f'✓ Environment "{name}" destroyed', fg='green'))
+        # Terraform removed the environments' SSM parameters
+        SecretStore(config).invalidate()
+        if failures:
+            sys.exit(1)
+        return
+
     click.echo(click.style('Destroying GoldenShell environment...', fg='cyan'))
 
     # Set up Terraform
+    region = config.get('aws_region')
+    deployment = config.get('last_deployment') or {}
     tf_dir = Path(__file__).parent / 'terraform'
-    tf = Terraform(working_dir=str(tf_dir))
+    tf = terraform_client(tf_dir, terraform_env(config, region))
 
-    # Set AWS credentials as environment variables
-    os.environ['AWS_ACCESS_KEY_ID'] = config.get('aws_access_key_id')
-    os.environ['AWS_SECRET_ACCESS_KEY'] = config.get('aws_secret_access_key')
-    os.environ['AWS_DEFAULT_REGION'] = config.get('aws_region')
+    timings = []
 
     try:
-        return_code, stdout, stderr = tf.destroy(auto_approve=True)
+        return_code, stdout, stderr = timed_terraform(timings, 'destroy', tf.destroy, auto_approve=True,
+                                                      var=terraform_vars(config, region, deployment))
+        echo_terraform_timings(timings)
+        save_deploy_cache(tf_dir, None)
+        SecretStore(config).invalidate()
 
         if return_code != 0:
             click.echo(click.style(f'Error destroying: {stderr}', fg='red'))
@@ -643,6 +5816,14 @@ def destroy():
         click.echo(click.style('✓ Environment destroyed successfully!', fg='green'))
 
         # Clear deployment info
+        if deployment.get('instance_id'):
+            replaced = terminate_replaced(aws_client(config, 'ec2', region),
+                                          deployment['instance_id'])
+            if replaced:
+                click.echo(f"Terminated replaced instances {', '.join(replaced)}")
+            cache = instance_cache(config)
+            cache.invalidate(deployment['instance_id'])
+            cache.save()
         config.set('last_deployment', None)
         config.save()
 
@@ -651,5 +5832,314 @@ def destroy():
         sys.exit(1)
 
 
+@cli.group()
+def pool():
+    """Keep provisioned, stopped instances ready for near-instant `deploy --env`"""
+
+
+def pool_regions(config, regions):
+    """Regions a pool command acts on: --region values, else the configured region"""
+    return list(regions) or [config.get('aws_region')]
+
+
+@pool.command('status')
+@click.option('--region', 'regions', multiple=True, help='Region to show (repeatable; defaults to the configured region)')
+def pool_status(regions):
+    """Show warm-pool instances and the budgeted pool size"""
+    config = Config()
+
+    try:
+        for region in pool_regions(config, regions):
+            ec2 = aws_client(config, 'ec2', region)
+            instances = list_pool_instances(ec2)
+            click.echo(click.style(f'Warm pool in {region}:', fg='cyan', bold=True))
+            if not instances:
+                click.echo('  (empty)')
+            for instance in instances:
+                tag = pool_tag(instance)
+                state = instance['State']['Name']
+                color = 'green' if tag == 'ready' and state == 'stopped' else 'yellow'
+                click.echo(f"  {instance['InstanceId']:21} {click.style(f'{tag}/{state}', fg=color):30} "
+                           f"{instance['InstanceType']:12} {instance_age_days(instance):5.1f} days  "
+                           f"{instance['ImageId']}")
+
+        instance_type = config.get('warm_pool_instance_type', 't3.medium')
+        _, per_instance, allowance = warm_pool_plan(config, WARM_POOL_DEFAULT_VOLUME_GB, instance_type)
+        click.echo(f"\nwarm_pool_size: {config.get('warm_pool_size', 0)} per region "
+                   f"(budget allows {int(allowance // per_instance)}: ~${per_instance:.2f}/month each for a "
+                   f"{WARM_POOL_DEFAULT_VOLUME_GB}GB volume, pool allowance ${allowance:.2f}/month)")
+        click.echo(f"Instances are replaced after "
+                   f"{config.get('warm_pool_max_age_days', WARM_POOL_MAX_AGE_DAYS)} days or a new baked AMI.")
+    except Exception as e:
+        click.echo(click.style(f'Error: {str(e)}', fg='red'))
+        sys.exit(1)
+
+
+@pool.command('fill')
+@click.option('--region', 'regions', multiple=True, help='Region to fill (repeatable; defaults to the configured region)')
+@click.option('--size', type=click.IntRange(0, 20), help='Set warm_pool_size (instances per region) first')
+def pool_fill(regions, size):
+    """Age out stale pool instances and provision new ones up to the pool size"""
+    config = Config()
+
+    if not config.config:
+        click.echo(click.style('Error: No configuration found. Run "goldenshell init" first.', fg='red'))
+        sys.exit(1)
+    if size is not None:
+        config.set('warm_pool_size', size)
+        config.save()
+
+    failures = 0
+    for region in pool_regions(config, regions):
+        try:
+            failures += fill_warm_pool(config, region)
+        except Exception as e:
+            click.echo(click.style(f'Error ({region}): {str(e)}', fg='red'))
+            failures += 1
+    if failures:
+        click.echo(click.style(f'\n✗ {failures} pool instance(s) or region(s) failed', fg='red'))
+        sys.exit(1)
+
+
+@pool.command('drain')
+@click.option('--region', 'regions', multiple=True, help='Region to drain (repeatable; defaults to the configured region)')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation')
+def pool_drain(regions, yes):
+    """Terminate all unclaimed pool instances and set warm_pool_size to 0"""
+    config = Config()
+
+    if not yes and not click.confirm('Terminate every unclaimed warm-pool instance?'):
+        click.echo('Cancelled.')
+        return
+
+    try:
+        for region in pool_regions(config, regions):
+            ec2 = aws_client(config, 'ec2', region)
+            ids = [instance['InstanceId'] for instance in list_pool_instances(ec2)]
+            if ids:
+                ec2.terminate_instances(InstanceIds=ids)
+            click.echo(f"{region}: terminated {len(ids)} pool instance(s)")
+        config.set('warm_pool_size', 0)
+        config.save()
+        click.echo(click.style('✓ Warm pool drained (warm_pool_size is now 0)', fg='green'))
+    except Exception as e:
+        click.echo(click.style(f'Error: {str(e)}', fg='red'))
+        sys.exit(1)
+
+
+@cli.command()
+@click.option('--region', help='Region to bake in (defaults to the configured region)')
+@click.option('--instance-type', default='t3.medium', show_default=True, help='Builder instance type')
+@click.option('--keep', default=BAKED_AMIS_KEPT, show_default=True, help='Baked AMIs to keep; older ones are deregistered')
+@click.option('--compare', is_flag=True, help='Run a boot-timeline comparison against stock Ubuntu afterwards')
+def bake(region, instance_type, keep, compare):
+    """Build a golden AMI with all GoldenShell tooling pre-installed"""
+    import asyncio
+
+    config = Config()
+
+    if not config.config:
+        click.echo(click.style('Error: No configuration found. Run "goldenshell init" first.', fg='red'))
+        sys.exit(1)
+
+    region = region or config.get('aws_region')
+    click.echo(click.style(f'Baking GoldenShell AMI in {region}...', fg='cyan'))
+
+    try:
+        ec2 = aws_client(config, 'ec2', region)
+        source = find_stock_ami(ec2)
+        if source is None:
+            click.echo(click.style('Error: No stock Ubuntu 22.04 AMI found', fg='red'))
+            sys.exit(1)
+        click.echo(f"Source image: {source['ImageId']} ({source['Name']})")
+
+        user_data = render_user_data('bake', region,
+                                     auto_shutdown_minutes=config.get('auto_shutdown_minutes', 30))
+        engine = LifecycleEngine(config, timeout=BAKE_TIMEOUT)
+        started = time.monotonic()
+        image_id = asyncio.run(bake_image(engine, ec2, region, source, instance_type, user_data))
+        click.echo(click.style(f'\n✓ Baked {image_id} in {time.monotonic() - started:.0f}s', fg='green'))
+
+        pruned = prune_baked_images(ec2, keep)
+        if pruned:
+            click.echo(f"Deregistered older baked AMIs: {', '.join(pruned)}")
+        click.echo('New deployments in this region will use it automatically.')
+
+    except Exception as e:
+        click.echo(click.style(f'Error: {str(e)}', fg='red'))
+        sys.exit(1)
+
+    if compare:
+        click.echo(click.style('\nComparing boot timelines...', fg='cyan'))
+        if run_boot_timeline(config, region, instance_type,
+                             [('stock', source['ImageId']), ('baked', image_id)]):
+            sys.exit(1)
+
+
+@cli.command('boot-timeline')
+@click.option('--region', help='Region to test in (defaults to the configured region)')
+@click.option('--instance-type', default='t3.medium', show_default=True, help='Probe instance type')
+def boot_timeline(region, instance_type):
+    """Compare time-to-ready of the newest baked AMI against stock Ubuntu"""
+    config = Config()
+
+    if not config.config:
+        click.echo(click.style('Error: No configuration found. Run "goldenshell init" first.', fg='red'))
+        sys.exit(1)
+
+    region = region or config.get('aws_region')
+
+    try:
+        ec2 = aws_client(config, 'ec2', region)
+        baked = find_baked_ami(ec2)
+        if baked is None:
+            click.echo(click.style(f'Error: No baked AMI in {region}. Run "goldenshell bake" first.', fg='red'))
+            sys.exit(1)
+        stock = find_stock_ami(ec2)
+
+        click.echo(click.style(f'Booting probe instances in {region} (this launches and terminates 2 instances)...',
+                               fg='cyan'))
+        failures = run_boot_timeline(config, region, instance_type,
+                                     [('stock', stock['ImageId']), ('baked', baked['ImageId'])])
+    except Exception as e:
+        click.echo(click.style(f'Error: {str(e)}', fg='red'))
+        sys.exit(1)
+
+    if failures:
+        sys.exit(1)
+
+
+@cli.command('boot-report')
+@click.option('--env', 'env_name', help='Environment to report on (defaults to the last deployment)')
+@click.option('--via', type=click.Choice(['ssm', 'ssh']), default='ssm', show_default=True,
+              help='How to fetch the boot log from the instance')
+@click.option('--tailscale-hostname', help='With --via ssh: connect over Tailscale instead of the public IP')
+@click.option('--compare', 'compare_ids', multiple=True,
+              help='Compare saved reports by instance ID or environment name (repeatable, or "all")')
+@click.option('--list', 'list_reports', is_flag=True, help='List saved boot reports')
+def boot_report(env_name, via, tailscale_hostname, compare_ids, list_reports):
+    """Show how long each provisioning phase took on first boot"""
+    config = Config()
+    saved = load_boot_reports()
+
+    if list_reports:
+        if not saved:
+            click.echo('No saved boot reports.')
+            return
+        click.echo(f"{'Instance ID':21} {'Name':16} {'Type':12} {'Image':22} {'Baked':6} {'Total':>8}")
+        for report in saved:
+            total = max((p['end'] for p in report['phases']), default=0)
+            click.echo(f"{report['instance_id']:21} {report.get('name') or '-':16} "
+                       f"{report.get('instance_type') or '-':12} {report.get('image_id') or '-':22} "
+                       f"{'yes' if report.get('boot', {}).get('baked') else 'no':6} {total:>7.1f}s")
+        return
+
+    if compare_ids:
+        if 'all' in compare_ids:
+            reports = saved
+        else:
+            by_key = {}
+            for report in saved:
+                by_key[report['instance_id']] = report
+                if report.get('name'):
+                    by_key[report['name']] = report  # newest report per name wins
+            missing = [key for key in compare_ids if key not in by_key]
+            if missing:
+                click.echo(click.style(f"Error: No saved report for {', '.join(missing)}. "
+                                       'Run "goldenshell boot-report --list".', fg='red'))
+                sys.exit(1)
+            reports = [by_key[key] for key in compare_ids]
+        echo_boot_comparison(reports)
+        return
+
+    if env_name:
+        try:
+            (name, deployment), = select_environments(config, (env_name,), False)
+        except (click.BadParameter, ValueError) as e:
+            click.echo(click.style(f'Error: {getattr(e, "message", e)}', fg='red'))
+            sys.exit(1)
+    else:
+        name, deployment = None, config.get('last_deployment') or {}
+
+    instance_id = deployment.get('instance_id')
+    if not instance_id:
+        click.echo(click.style('No active deployment found.', fg='yellow'))
+        return
+    region = deployment.get('region') or config.get('aws_region')
+
+    try:
+        instance = describe_instances_batched(aws_client(config, 'ec2', region), [instance_id]).get(instance_id)
+        if instance is None or instance['State']['Name'] != 'running':
+            click.echo(click.style('Instance is not running. Start it first.', fg='yellow'))
+            return
+
+        click.echo(f'Fetching boot log from {instance_id} via {via.upper()}...')
+        if via == 'ssm':
+            text = fetch_boot_log_ssm(config, region, instance_id)
+        elif tailscale_hostname:
+            text = fetch_boot_log_ssh(config, tailscale_hostname)
+        else:
+            text = fetch_boot_log_ssh(config, instance.get('PublicIpAddress') or deployment.get('public_ip'),
+                                      ssh_key_file(config))
+    except Exception as e:
+        click.echo(click.style(f'Error: {str(e)}', fg='red'))
+        sys.exit(1)
+
+    report = dict(parse_boot_log(text), instance_id=instance_id, name=name, region=region,
+                  instance_type=instance.get('InstanceType'), image_id=instance.get('ImageId'),
+                  fetched_at=time.time())
+    if not report['boot'] and not report['phases']:
+        click.echo(click.style(f'No boot log found at {BOOT_LOG_PATH} '
+                               '(the instance may predate boot instrumentation).', fg='yellow'))
+        return
+
+    baked = 'baked image' if report['boot'].get('baked') else 'stock image'
+    click.echo(click.style(f"Boot timeline for {name or instance_id} ({instance_id}, "
+                           f"{report['instance_type']}, {report['image_id']}, {baked})", fg='cyan', bold=True))
+    echo_boot_waterfall(report)
+    save_boot_report(report)
+
+    # Compare with the most recent report from another instance
+    previous = [r for r in saved if r['instance_id'] != instance_id]
+    if previous:
+        click.echo(click.style('\nCompared with the previous deployment:', fg='cyan'))
+        echo_boot_comparison([previous[-1], report])
+
+
+@cli.command('bench-clients')
+@click.option('--service', 'services', multiple=True, default=['ec2', 'ssm'], show_default=True,
+              help='AWS service to measure (repeatable)')
+@click.option('--iterations', default=3, show_default=True, help='Warm lookups per service')
+def bench_clients(services, iterations):
+    """Measure cold vs. warm AWS client creation latency"""
+    import boto3
+
+    config = Config()
+    region = config.get('aws_region') or 'us-east-1'
+    access_key, secret_key = aws_credentials(config)
+
+    click.echo(click.style('AWS Client Latency:', fg='cyan', bold=True))
+    click.echo(f"{'Service':10} {'Unpooled':>12} {'Pool cold':>12} {'Pool warm':>12}")
+
+    reset_aws_pool()
+    for service in services:
+        # What every command used to pay: a fresh session and client
+        started = time.perf_counter()
+        boto3.Session(aws_access_key_id=access_key, aws_secret_access_key=secret_key).client(
+            service, region_name=region)
+        unpooled = time.perf_counter() - started
+
+        started = time.perf_counter()
+        aws_client(config, service, region)
+        cold = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            aws_client(config, service, region)
+        warm = (time.perf_counter() - started) / iterations
+
+        click.echo(f"{service:10} {unpooled * 1000:>10.1f}ms {cold * 1000:>10.1f}ms {warm * 1000:>10.3f}ms")
+
+
 if __name__ == '__main__':
     cli()
\ No newline at end of file
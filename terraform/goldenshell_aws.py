@@ -0,0 +1,104 @@
+"""
+GoldenShell on-instance AWS client: IMDSv2 and SigV4-signed API calls.
+
+Shared by goldenshell-idle-monitor and goldenshell-secrets so neither starts
+the AWS CLI. Installed by user-data as /usr/local/bin/goldenshell_aws.py,
+next to both scripts, which is on their import path.
+"""
+
+import hmac
+import json
+import time
+import calendar
+import hashlib
+import urllib.request
+
+IMDS = 'http://169.254.169.254/latest'
+
+
+class InstanceMetadata:
+    """IMDSv2 client that caches the token, identity and role credentials"""
+
+    def __init__(self):
+        self.token = None
+        self.token_expires = 0
+        self.credentials = None
+        self.instance_id = self.get('meta-data/instance-id')
+        self.region = self.get('meta-data/placement/region')
+
+    def _token(self):
+        if time.time() > self.token_expires:
+            request = urllib.request.Request(
+                f'{IMDS}/api/token', method='PUT',
+                headers={'X-aws-ec2-metadata-token-ttl-seconds': '21600'},
+            )
+            with urllib.request.urlopen(request, timeout=5) as response:
+                self.token = response.read().decode()
+            self.token_expires = time.time() + 21000
+        return self.token
+
+    def get(self, path):
+        request = urllib.request.Request(f'{IMDS}/{path}',
+                                         headers={'X-aws-ec2-metadata-token': self._token()})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.read().decode()
+
+    def role_credentials(self):
+        """Instance role credentials, refreshed shortly before they expire"""
+        if self.credentials and time.time() < self.credentials['refresh_at']:
+            return self.credentials
+        role = self.get('meta-data/iam/security-credentials/').split('\n')[0]
+        data = json.loads(self.get(f'meta-data/iam/security-credentials/{role}'))
+        expires = calendar.timegm(time.strptime(data['Expiration'], '%Y-%m-%dT%H:%M:%SZ'))
+        self.credentials = {
+            'access_key': data['AccessKeyId'],
+            'secret_key': data['SecretAccessKey'],
+            'token': data['Token'],
+            'refresh_at': expires - 300,
+        }
+        return self.credentials
+
+
+def _hmac(key, message):
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+def sign_request(credentials, region, service, body, headers, amz_date):
+    """Return `headers` plus the host, date, token and authorization of a SigV4-signed POST to /"""
+    headers = {
+        **{name.lower(): value for name, value in headers.items()},
+        'host': f'{service}.{region}.amazonaws.com',
+        'x-amz-date': amz_date,
+        'x-amz-security-token': credentials['token'],
+    }
+    signed_headers = ';'.join(sorted(headers))
+    canonical_request = '\n'.join([
+        'POST', '/', '',
+        ''.join(f'{name}:{headers[name]}\n' for name in sorted(headers)),
+        signed_headers,
+        hashlib.sha256(body.encode()).hexdigest(),
+    ])
+    scope = f'{amz_date[:8]}/{region}/{service}/aws4_request'
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256', amz_date, scope,
+        hashlib.sha256(canonical_request.encode()).hexdigest(),
+    ])
+    key = _hmac(('AWS4' + credentials['secret_key']).encode(), amz_date[:8])
+    for part in (region, service, 'aws4_request'):
+        key = _hmac(key, part)
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    headers['authorization'] = (
+        f"AWS4-HMAC-SHA256 Credential={credentials['access_key']}/{scope}, "
+        f"SignedHeaders={signed_headers}, Signature={signature}"
+    )
+    return headers
+
+
+def aws_post(metadata, service, body, headers):
+    """POST `body` to an AWS API in the instance's region with the instance role; returns the response body"""
+    amz_date = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    headers = sign_request(metadata.role_credentials(), metadata.region, service, body, headers, amz_date)
+    request = urllib.request.Request(f"https://{headers['host']}/", data=body.encode(),
+                                     headers=headers, method='POST')
+    with urllib.request.urlopen(request, timeout=15) as response:
+        return response.read()
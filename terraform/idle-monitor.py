@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+GoldenShell idle monitor - stops the instance after a period without activity.
+
+Runs as a resident systemd service (goldenshell-idle-monitor). Every sample it
+reads, without forking anything:
+  - logged-in sessions (SSH, mosh, Tailscale SSH) from utmp
+  - established inbound TCP connections to SSH/the web terminal from /proc/net/tcp*
+  - CPU busy time from /proc/stat and disk throughput from /proc/diskstats,
+    so long builds and test runs count as activity
+
+Instance metadata and role credentials are fetched from IMDSv2 once and cached.
+Idle accounting is written to /run/goldenshell/idle.json and published as the
+GoldenShellIdle instance tag (read by `goldenshell status`) whenever the
+activity changes, plus a periodic heartbeat. Instances launched with
+hibernation are hibernated rather than stopped, and the idle timer restarts
+when they resume. Memory use is published every 5
+minutes as the GoldenShell/MemoryUtilization CloudWatch metric (read by
+`goldenshell resize --recommend`). AWS API calls are signed by goldenshell_aws
+(terraform/goldenshell_aws.py), so the AWS CLI is never started. On spot
+instances it also watches for EC2's two-minute interruption notice, then
+flushes the disks and warns logged-in users.
+
+Installed by user-data as /usr/local/bin/goldenshell-idle-monitor.
+Run with --status to print the current accounting.
+"""
+
+import os
+import sys
+import json
+import time
+import struct
+import subprocess
+import urllib.error
+import urllib.parse
+
+from goldenshell_aws import InstanceMetadata, aws_post
+
+# 0 disables auto-shutdown; idle time is still tracked and reported
+IDLE_THRESHOLD_SECONDS = int(os.environ.get('IDLE_THRESHOLD_MINUTES', '30')) * 60
+SAMPLE_INTERVAL = int(os.environ.get('IDLE_SAMPLE_SECONDS', '30'))
+# Whole-machine CPU busy percentage and disk throughput that count as activity
+CPU_BUSY_PERCENT = float(os.environ.get('IDLE_CPU_PERCENT', '10'))
+DISK_KBPS = float(os.environ.get('IDLE_DISK_KBPS', '512'))
+# Local ports whose inbound connections are user activity: SSH, nginx, ttyd
+ACTIVITY_PORTS = {22, 443, 7681}
+# Re-publish the tag at least this often so `goldenshell status` can spot a dead monitor
+HEARTBEAT_SECONDS = 600
+# Don't re-issue StopInstances while the first one takes effect
+STOP_RETRY_SECONDS = 300
+# Wall-clock time passing this much faster than the monotonic clock between
+# samples means the instance was hibernated and has resumed
+RESUME_GAP_SECONDS = 120
+
+STATE_FILE = '/run/goldenshell/idle.json'
+IDLE_TAG = 'GoldenShellIdle'
+# CloudWatch metric for memory use, one statistic set per period
+METRIC_NAMESPACE = 'GoldenShell'
+METRIC_PERIOD_SECONDS = 300
+
+UTMP_FILE = '/var/run/utmp'
+UTMP_RECORD = struct.Struct('<h2xi32s4s32s256shhiii16s20s')
+USER_PROCESS = 7
+TCP_ESTABLISHED = '01'
+
+
+def log(message):
+    """Log to the journal (stdout of the service)"""
+    print(message, flush=True)
+
+
+def query_call(metadata, service, version, action, params):
+    """Call an AWS Query API action with the instance role"""
+    body = urllib.parse.urlencode(sorted({'Action': action, 'Version': version, **params}.items()))
+    return aws_post(metadata, service, body,
+                    {'content-type': 'application/x-www-form-urlencoded; charset=utf-8'})
+
+
+def ec2_call(metadata, action, params):
+    """Call an EC2 API action with the instance role"""
+    return query_call(metadata, 'ec2', '2016-11-15', action, params)
+
+
+def count_sessions():
+    """Logged-in user sessions in utmp whose process is still alive"""
+    try:
+        with open(UTMP_FILE, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return 0
+    sessions = 0
+    for offset in range(0, len(data) - UTMP_RECORD.size + 1, UTMP_RECORD.size):
+        record = UTMP_RECORD.unpack_from(data, offset)
+        ut_type, pid = record[0], record[1]
+        if ut_type == USER_PROCESS and os.path.exists(f'/proc/{pid}'):
+            sessions += 1
+    return sessions
+
+
+def count_connections():
+    """Established inbound TCP connections to ACTIVITY_PORTS (IPv4 and IPv6)"""
+    connections = 0
+    for path in ('/proc/net/tcp', '/proc/net/tcp6'):
+        try:
+            with open(path) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[3] != TCP_ESTABLISHED:
+                        continue
+                    local_port = int(fields[1].rsplit(':', 1)[1], 16)
+                    if local_port in ACTIVITY_PORTS:
+                        connections += 1
+        except OSError:
+            continue
+    return connections
+
+
+def read_cpu_times():
+    """(busy, total) jiffies across all CPUs; iowait and steal don't count as busy"""
+    with open('/proc/stat') as f:
+        values = [int(v) for v in f.readline().split()[1:]]
+    user, nice, system, idle, iowait, irq, softirq, steal = (values + [0] * 8)[:8]
+    busy = user + nice + system + irq + softirq
+    return busy, busy + idle + iowait + steal
+
+
+def read_memory_percent():
+    """Percentage of memory in use (not available to new processes), from /proc/meminfo"""
+    values = {}
+    with open('/proc/meminfo') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            values[name] = int(rest.split()[0])
+    return 100.0 * (1 - values['MemAvailable'] / values['MemTotal'])
+
+
+def whole_disks():
+    """Block devices that are disks, not partitions, loop or ram devices"""
+    try:
+        return {name for name in os.listdir('/sys/block')
+                if not name.startswith(('loop', 'ram', 'zram'))}
+    except OSError:
+        return set()
+
+
+def read_disk_bytes(disks):
+    """Bytes read plus written so far on the given disks"""
+    sectors = 0
+    with open('/proc/diskstats') as f:
+        for line in f:
+            fields = line.split()
+            if fields[2] in disks:
+                sectors += int(fields[5]) + int(fields[9])
+    return sectors * 512
+
+
+class IdleMonitor:
+    """Samples activity and decides when the instance has been idle too long"""
+
+    def __init__(self, metadata):
+        self.metadata = metadata
+        self.disks = whole_disks()
+        self.cpu = read_cpu_times()
+        self.disk_bytes = read_disk_bytes(self.disks)
+        self.sampled_at = time.monotonic()
+        self.activity = None
+        self.published_at = 0
+        self.stop_requested_at = 0
+        self.memory_samples = []
+        self.metrics_published_at = time.monotonic()
+        self.stepped_at = (time.time(), time.monotonic())
+        try:
+            self.hibernation = metadata.get('meta-data/hibernation/configured') == 'true'
+        except OSError:
+            self.hibernation = False
+        try:
+            self.spot = metadata.get('meta-data/instance-life-cycle') == 'spot'
+        except OSError:
+            self.spot = False
+        self.interruption_noticed = False
+
+        # Survive service restarts within a boot (/run is cleared on reboot)
+        previous = {}
+        try:
+            with open(STATE_FILE) as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            pass
+        self.last_active = previous.get('last_active', time.time())
+
+    def sample(self):
+        """Return the list of activity reasons seen since the last sample"""
+        now = time.monotonic()
+        elapsed = max(now - self.sampled_at, 1e-6)
+        cpu = read_cpu_times()
+        disk_bytes = read_disk_bytes(self.disks)
+
+        total = cpu[1] - self.cpu[1]
+        self.cpu_percent = 100.0 * (cpu[0] - self.cpu[0]) / total if total > 0 else 0.0
+        self.disk_kbps = (disk_bytes - self.disk_bytes) / 1024 / elapsed
+        self.cpu, self.disk_bytes, self.sampled_at = cpu, disk_bytes, now
+        self.sessions = count_sessions()
+        self.connections = count_connections()
+        self.memory_samples.append(read_memory_percent())
+
+        reasons = []
+        if self.sessions:
+            reasons.append('sessions')
+        if self.connections:
+            reasons.append('connections')
+        if self.cpu_percent >= CPU_BUSY_PERCENT:
+            reasons.append('cpu')
+        if self.disk_kbps >= DISK_KBPS:
+            reasons.append('disk')
+        return reasons
+
+    def accounting(self, reasons):
+        now = time.time()
+        return {
+            'last_active': int(self.last_active),
+            'idle_seconds': int(now - self.last_active),
+            'threshold_seconds': IDLE_THRESHOLD_SECONDS,
+            'activity': reasons,
+            'sessions': self.sessions,
+            'connections': self.connections,
+            'cpu_percent': round(self.cpu_percent, 1),
+            'disk_kbps': round(self.disk_kbps, 1),
+            'updated': int(now),
+        }
+
+    def write_state(self, accounting):
+        os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+        temp = STATE_FILE + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(accounting, f)
+        os.replace(temp, STATE_FILE)
+
+    def publish(self, accounting):
+        """Publish the accounting as the GoldenShellIdle tag (one short string)"""
+        value = (f"last_active={accounting['last_active']};"
+                 f"threshold={accounting['threshold_seconds']};"
+                 f"activity={','.join(accounting['activity']) or 'none'};"
+                 f"updated={accounting['updated']}")
+        try:
+            ec2_call(self.metadata, 'CreateTags', {
+                'ResourceId.1': self.metadata.instance_id,
+                'Tag.1.Key': IDLE_TAG,
+                'Tag.1.Value': value,
+            })
+            self.published_at = time.time()
+        except Exception as e:
+            log(f'Could not publish idle tag: {e}')
+
+    def publish_metrics(self):
+        """Publish this period's memory samples as one CloudWatch statistic set"""
+        samples, self.memory_samples = self.memory_samples, []
+        self.metrics_published_at = time.monotonic()
+        if not samples:
+            return
+        try:
+            query_call(self.metadata, 'monitoring', '2010-08-01', 'PutMetricData', {
+                'Namespace': METRIC_NAMESPACE,
+                'MetricData.member.1.MetricName': 'MemoryUtilization',
+                'MetricData.member.1.Unit': 'Percent',
+                'MetricData.member.1.Dimensions.member.1.Name': 'InstanceId',
+                'MetricData.member.1.Dimensions.member.1.Value': self.metadata.instance_id,
+                'MetricData.member.1.StatisticValues.SampleCount': str(len(samples)),
+                'MetricData.member.1.StatisticValues.Sum': f'{sum(samples):.2f}',
+                'MetricData.member.1.StatisticValues.Minimum': f'{min(samples):.2f}',
+                'MetricData.member.1.StatisticValues.Maximum': f'{max(samples):.2f}',
+            })
+        except Exception as e:
+            log(f'Could not publish memory metric: {e}')
+
+    def stop_instance(self):
+        action = 'Hibernating' if self.hibernation else 'Stopping'
+        log(f'Idle for over {IDLE_THRESHOLD_SECONDS}s. {action} instance {self.metadata.instance_id}...')
+        self.stop_requested_at = time.time()
+        params = {'InstanceId.1': self.metadata.instance_id}
+        if self.hibernation:
+            try:
+                ec2_call(self.metadata, 'StopInstances', {**params, 'Hibernate': 'true'})
+                return
+            except urllib.error.HTTPError as e:
+                # e.g. the hibernation agent isn't ready yet; a normal stop still saves money
+                log(f'Hibernate failed ({e}); stopping instead')
+            except Exception as e:
+                log(f'StopInstances failed: {e}')
+                return
+        try:
+            ec2_call(self.metadata, 'StopInstances', params)
+        except Exception as e:
+            log(f'StopInstances failed: {e}')
+
+    def check_interruption(self):
+        """Warn once EC2 gives notice that it is reclaiming this spot instance"""
+        try:
+            # 404 until a notice is issued
+            notice = json.loads(self.metadata.get('meta-data/spot/instance-action'))
+        except (OSError, ValueError):
+            return
+        self.interruption_noticed = True
+        log(f"Spot interruption notice: {notice.get('action')} at {notice.get('time')}")
+        os.sync()
+        subprocess.run(['wall', f"EC2 is reclaiming this spot instance ({notice.get('action')} at "
+                                f"{notice.get('time')}). Save your work; files on disk are kept, and "
+                                f"`goldenshell start` relaunches it on other capacity."], check=False)
+
+    def step(self):
+        if self.spot and not self.interruption_noticed:
+            self.check_interruption()
+        wall, monotonic = time.time(), time.monotonic()
+        if (wall - self.stepped_at[0]) - (monotonic - self.stepped_at[1]) > RESUME_GAP_SECONDS:
+            log('Resumed from hibernation; idle timer restarted')
+            self.last_active = wall
+            self.stop_requested_at = 0
+        self.stepped_at = (wall, monotonic)
+
+        reasons = self.sample()
+        if reasons:
+            self.last_active = time.time()
+
+        accounting = self.accounting(reasons)
+        self.write_state(accounting)
+
+        changed = bool(reasons) != bool(self.activity)
+        if changed:
+            log(f"Active: {', '.join(reasons)}" if reasons else 'No activity; idle timer running')
+        self.activity = reasons
+        if changed or time.time() - self.published_at >= HEARTBEAT_SECONDS:
+            self.publish(accounting)
+        if time.monotonic() - self.metrics_published_at >= METRIC_PERIOD_SECONDS:
+            self.publish_metrics()
+
+        if (IDLE_THRESHOLD_SECONDS > 0
+                and accounting['idle_seconds'] > IDLE_THRESHOLD_SECONDS
+                and time.time() - self.stop_requested_at > STOP_RETRY_SECONDS):
+            self.stop_instance()
+
+    def run(self):
+        threshold = f'{IDLE_THRESHOLD_SECONDS}s' if IDLE_THRESHOLD_SECONDS > 0 else 'disabled'
+        log(f'Idle monitor started (auto-shutdown {threshold}, sampling every {SAMPLE_INTERVAL}s)')
+        while True:
+            time.sleep(SAMPLE_INTERVAL)
+            self.step()
+
+
+def connect_metadata():
+    """Wait for IMDS, which can lag networking at boot"""
+    delay = 1
+    while True:
+        try:
+            return InstanceMetadata()
+        except OSError as e:
+            log(f'Instance metadata not available yet ({e}); retrying in {delay}s')
+            time.sleep(delay)
+            delay = min(delay * 2, 60)
+
+
+def main():
+    if '--status' in sys.argv[1:]:
+        try:
+            with open(STATE_FILE) as f:
+                print(json.dumps(json.load(f), indent=2))
+        except OSError:
+            print('Idle monitor has not recorded a sample yet')
+            sys.exit(1)
+        return
+
+    IdleMonitor(connect_metadata()).run()
+
+
+if __name__ == '__main__':
+    main()
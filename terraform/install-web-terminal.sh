@@ -65,7 +65,7 @@ fi
 # Install AWS CLI
 if ! command -v aws &> /dev/null; then
     echo "[4/8] Installing AWS CLI..."
-    curl "https://awscli.amazonaws.com/awscli-exe-linux-x86_64.zip" -o "/tmp/awscliv2.zip"
+    curl "https://awscli.amazonaws.com/awscli-exe-linux-$(uname -m).zip" -o "/tmp/awscliv2.zip"
     unzip -q /tmp/awscliv2.zip -d /tmp
     sudo /tmp/aws/install
     rm -rf /tmp/aws /tmp/awscliv2.zip
@@ -87,7 +87,7 @@ fi
 if ! command -v zellij &> /dev/null; then
     echo "[6/8] Installing Zellij..."
     ZELLIJ_VERSION="0.41.2"
-    wget -q "https://github.com/zellij-org/zellij/releases/download/v${ZELLIJ_VERSION}/zellij-x86_64-unknown-linux-musl.tar.gz" -O /tmp/zellij.tar.gz
+    wget -q "https://github.com/zellij-org/zellij/releases/download/v${ZELLIJ_VERSION}/zellij-$(uname -m)-unknown-linux-musl.tar.gz" -O /tmp/zellij.tar.gz
     sudo tar -xzf /tmp/zellij.tar.gz -C /usr/local/bin/
     sudo chmod +x /usr/local/bin/zellij
     rm /tmp/zellij.tar.gz
@@ -100,7 +100,7 @@ fi
 if ! command -v ttyd &> /dev/null; then
     echo "[7/8] Installing ttyd..."
     TTYD_VERSION="1.7.7"
-    wget -q "https://github.com/tsl0922/ttyd/releases/download/${TTYD_VERSION}/ttyd.x86_64" -O /tmp/ttyd
+    wget -q "https://github.com/tsl0922/ttyd/releases/download/${TTYD_VERSION}/ttyd.$(uname -m)" -O /tmp/ttyd
     sudo mv /tmp/ttyd /usr/local/bin/ttyd
     sudo chmod +x /usr/local/bin/ttyd
     echo "ttyd installed: $(ttyd --version)"
@@ -17,6 +17,38 @@ provider "aws" {
   region = var.aws_region
 }
 
+# Per-environment naming so several environments can share one AWS account.
+# The default (unnamed) environment keeps the original resource names.
+locals {
+  name_suffix = var.environment != "" ? "-${var.environment}" : ""
+  ssm_prefix  = var.environment != "" ? "/goldenshell/${var.environment}" : "/goldenshell"
+  environment = var.environment != "" ? var.environment : "default"
+
+  # ttyd tuning per web terminal profile (mirrors WEB_TERMINAL_PROFILES in goldenshell.py)
+  web_terminal_profiles = {
+    lan      = { reconnect = true, ping_interval = 30, renderer = "webgl" }
+    balanced = { reconnect = true, ping_interval = 15, renderer = "webgl" }
+    mobile   = { reconnect = true, ping_interval = 5, renderer = "canvas" }
+  }
+  web_terminal = local.web_terminal_profiles[var.web_terminal_profile]
+  ttyd_options = join(" ", [
+    "-P ${coalesce(var.web_terminal_ping_interval, local.web_terminal.ping_interval)}",
+    "-t disableReconnect=${coalesce(var.web_terminal_reconnect, local.web_terminal.reconnect) ? "false" : "true"}",
+    "-t rendererType=${coalesce(var.web_terminal_renderer, local.web_terminal.renderer)}",
+  ])
+
+  # Hibernation saves RAM to the (encrypted) root volume, so it needs room for it
+  hibernation      = var.enable_hibernation && data.aws_ec2_instance_type.selected.hibernation_supported
+  root_volume_size = local.hibernation ? var.ebs_volume_size + ceil(data.aws_ec2_instance_type.selected.memory_size / 1024) : var.ebs_volume_size
+
+  # Graviton types need the arm64 Ubuntu image
+  ami_arch = contains(data.aws_ec2_instance_type.selected.supported_architectures, "x86_64") ? "amd64" : "arm64"
+}
+
+data "aws_ec2_instance_type" "selected" {
+  instance_type = var.instance_type
+}
+
 # Get VPC - either use specified vpc_id or find default
 data "aws_vpc" "selected" {
   id      = var.vpc_id != "" ? var.vpc_id : null
@@ -39,16 +71,23 @@ data "aws_subnets" "available" {
     name   = "default-for-az"
     values = ["true"]
   }
+  dynamic "filter" {
+    for_each = var.availability_zone != "" ? [var.availability_zone] : []
+    content {
+      name   = "availability-zone"
+      values = [filter.value]
+    }
+  }
 }
 
-# Get latest Ubuntu 22.04 AMI
+# Get latest Ubuntu 22.04 AMI (used when no baked AMI is given)
 data "aws_ami" "ubuntu" {
   most_recent = true
   owners      = ["099720109477"] # Canonical
 
   filter {
     name   = "name"
-    values = ["ubuntu/images/hvm-ssd/ubuntu-jammy-22.04-amd64-server-*"]
+    values = ["ubuntu/images/hvm-ssd/ubuntu-jammy-22.04-${local.ami_arch}-server-*"]
   }
 
   filter {
@@ -59,7 +98,7 @@ data "aws_ami" "ubuntu" {
 
 # Security Group
 resource "aws_security_group" "goldenshell" {
-  name        = "goldenshell-sg"
+  name        = "goldenshell-sg${local.name_suffix}"
   description = "Security group for GoldenShell development instance"
   vpc_id      = data.aws_vpc.selected.id
 
@@ -118,7 +157,7 @@ resource "aws_security_group" "goldenshell" {
   }
 
   tags = {
-    Name        = "goldenshell-sg"
+    Name        = "goldenshell-sg${local.name_suffix}"
     Project     = "GoldenShell"
     ManagedBy   = "Terraform"
   }
@@ -126,7 +165,7 @@ resource "aws_security_group" "goldenshell" {
 
 # IAM Role for EC2 instance (for CloudWatch and auto-shutdown)
 resource "aws_iam_role" "goldenshell" {
-  name = "goldenshell-instance-role"
+  name = "goldenshell-instance-role${local.name_suffix}"
 
   assume_role_policy = jsonencode({
     Version = "2012-10-17"
@@ -142,7 +181,7 @@ resource "aws_iam_role" "goldenshell" {
   })
 
   tags = {
-    Name = "goldenshell-instance-role"
+    Name = "goldenshell-instance-role${local.name_suffix}"
   }
 }
 
@@ -187,6 +226,23 @@ resource "aws_iam_role_policy" "goldenshell_cloudwatch" {
             "ec2:ResourceTag/Project" = "GoldenShell"
           }
         }
+      },
+      {
+        # The idle monitor publishes its accounting as the GoldenShellIdle tag,
+        # and user-data the instance's Tailscale name and address
+        Effect = "Allow"
+        Action = [
+          "ec2:CreateTags"
+        ]
+        Resource = "arn:aws:ec2:${var.aws_region}:*:instance/*"
+        Condition = {
+          StringEquals = {
+            "ec2:ResourceTag/Project" = "GoldenShell"
+          }
+          "ForAllValues:StringEquals" = {
+            "aws:TagKeys" = ["GoldenShellIdle", "GoldenShellTailscaleHost", "GoldenShellTailscaleIP"]
+          }
+        }
       }
     ]
   })
@@ -206,7 +262,13 @@ resource "aws_iam_role_policy" "goldenshell_ssm" {
           "ssm:GetParameter",
           "ssm:GetParameters"
         ]
-        Resource = "arn:aws:ssm:${var.aws_region}:*:parameter/goldenshell/*"
+        Resource = "arn:aws:ssm:${var.aws_region}:*:parameter${local.ssm_prefix}/*"
+      },
+      {
+        # goldenshell-secrets reads the whole prefix in one call
+        Effect   = "Allow"
+        Action   = "ssm:GetParametersByPath"
+        Resource = "arn:aws:ssm:${var.aws_region}:*:parameter${local.ssm_prefix}"
       }
     ]
   })
@@ -220,19 +282,19 @@ resource "aws_iam_role_policy_attachment" "goldenshell_ssm_managed" {
 
 # Instance Profile
 resource "aws_iam_instance_profile" "goldenshell" {
-  name = "goldenshell-instance-profile"
+  name = "goldenshell-instance-profile${local.name_suffix}"
   role = aws_iam_role.goldenshell.name
 }
 
 # SSM Parameter for Tailscale Auth Key (secure storage)
 resource "aws_ssm_parameter" "tailscale_auth_key" {
-  name        = "/goldenshell/tailscale-auth-key"
+  name        = "${local.ssm_prefix}/tailscale-auth-key"
   description = "Tailscale authentication key for GoldenShell instances"
   type        = "SecureString"
   value       = var.tailscale_auth_key
 
   tags = {
-    Name      = "goldenshell-tailscale-key"
+    Name      = "goldenshell-tailscale-key${local.name_suffix}"
     Project   = "GoldenShell"
     ManagedBy = "Terraform"
   }
@@ -248,13 +310,13 @@ resource "random_password" "ttyd_password" {
 
 # SSM Parameter for web terminal password (secure storage)
 resource "aws_ssm_parameter" "ttyd_password" {
-  name        = "/goldenshell/ttyd-password"
+  name        = "${local.ssm_prefix}/ttyd-password"
   description = "Web terminal (ttyd) password for GoldenShell instances"
   type        = "SecureString"
   value       = var.ttyd_password != "" ? var.ttyd_password : random_password.ttyd_password[0].result
 
   tags = {
-    Name      = "goldenshell-ttyd-password"
+    Name      = "goldenshell-ttyd-password${local.name_suffix}"
     Project   = "GoldenShell"
     ManagedBy = "Terraform"
   }
@@ -262,13 +324,28 @@ resource "aws_ssm_parameter" "ttyd_password" {
 
 # EC2 Instance
 resource "aws_instance" "goldenshell" {
-  ami                    = data.aws_ami.ubuntu.id
+  ami                    = var.ami_id != "" ? var.ami_id : data.aws_ami.ubuntu.id
   instance_type          = var.instance_type
   key_name              = var.key_name
   subnet_id             = var.subnet_id != "" ? var.subnet_id : (length(data.aws_subnets.available) > 0 ? data.aws_subnets.available[0].ids[0] : null)
   vpc_security_group_ids = [aws_security_group.goldenshell.id]
   iam_instance_profile   = aws_iam_instance_profile.goldenshell.name
   associate_public_ip_address = true
+  hibernation            = local.hibernation
+
+  # Spot: EC2 stops (or hibernates) the instance when it reclaims the capacity
+  # and restarts it when capacity returns; `goldenshell start` relaunches it
+  # elsewhere instead of waiting
+  dynamic "instance_market_options" {
+    for_each = var.market_type == "spot" ? [1] : []
+    content {
+      market_type = "spot"
+      spot_options {
+        spot_instance_type             = "persistent"
+        instance_interruption_behavior = local.hibernation ? "hibernate" : "stop"
+      }
+    }
+  }
 
   # Enforce IMDSv2 for improved security
   metadata_options {
@@ -278,33 +355,44 @@ resource "aws_instance" "goldenshell" {
     instance_metadata_tags      = "enabled"
   }
 
-  user_data = templatefile("${path.module}/user-data.sh", {
+  # Gzipped to stay well under the 16 KB user-data limit (cloud-init unpacks it)
+  user_data_base64 = base64gzip(templatefile("${path.module}/user-data.sh", {
     aws_region             = var.aws_region
     auto_shutdown_minutes  = var.auto_shutdown_minutes
-  })
+    ssm_prefix             = local.ssm_prefix
+    boot_mode              = "deploy"
+    provision_script       = file("${path.module}/provision.sh")
+    aws_module_script      = file("${path.module}/goldenshell_aws.py")
+    idle_monitor_script    = file("${path.module}/idle-monitor.py")
+    secrets_helper_script  = file("${path.module}/secrets-helper.py")
+    ttyd_options           = local.ttyd_options
+  }))
 
   root_block_device {
-    volume_size           = var.ebs_volume_size
+    volume_size           = local.root_volume_size
     volume_type           = "gp3"
     encrypted             = true
     delete_on_termination = true
 
     tags = {
-      Name      = "${var.instance_name}-root"
-      Project   = "GoldenShell"
-      ManagedBy = "Terraform"
+      Name        = "${var.instance_name}-root"
+      Project     = "GoldenShell"
+      Environment = local.environment
+      ManagedBy   = "Terraform"
     }
   }
 
   tags = {
     Name      = var.instance_name
     Project   = "GoldenShell"
+    Environment = local.environment
     ManagedBy = "Terraform"
     AutoShutdown = "enabled"
   }
 
+  # A newer baked AMI only applies to new instances, never replaces this one
   lifecycle {
-    ignore_changes = [user_data]
+    ignore_changes = [user_data, user_data_base64, ami]
   }
 }
 
@@ -340,12 +428,13 @@ resource "aws_dlm_lifecycle_policy" "goldenshell_backups" {
     }
 
     target_tags = {
-      Project = "GoldenShell"
+      Project     = "GoldenShell"
+      Environment = local.environment
     }
   }
 
   tags = {
-    Name      = "goldenshell-backup-policy"
+    Name      = "goldenshell-backup-policy${local.name_suffix}"
     Project   = "GoldenShell"
     ManagedBy = "Terraform"
   }
@@ -354,7 +443,7 @@ resource "aws_dlm_lifecycle_policy" "goldenshell_backups" {
 # IAM role for DLM
 resource "aws_iam_role" "dlm_lifecycle_role" {
   count = var.enable_backups ? 1 : 0
-  name  = "goldenshell-dlm-lifecycle-role"
+  name  = "goldenshell-dlm-lifecycle-role${local.name_suffix}"
 
   assume_role_policy = jsonencode({
     Version = "2012-10-17"
@@ -370,7 +459,7 @@ resource "aws_iam_role" "dlm_lifecycle_role" {
   })
 
   tags = {
-    Name      = "goldenshell-dlm-role"
+    Name      = "goldenshell-dlm-role${local.name_suffix}"
     Project   = "GoldenShell"
     ManagedBy = "Terraform"
   }
@@ -410,7 +499,7 @@ resource "aws_iam_role_policy" "dlm_lifecycle" {
 
 # CloudWatch Alarm for high CPU usage
 resource "aws_cloudwatch_metric_alarm" "high_cpu" {
-  alarm_name          = "goldenshell-high-cpu"
+  alarm_name          = "goldenshell-high-cpu${local.name_suffix}"
   comparison_operator = "GreaterThanThreshold"
   evaluation_periods  = 2
   metric_name         = "CPUUtilization"
@@ -426,7 +515,7 @@ resource "aws_cloudwatch_metric_alarm" "high_cpu" {
   }
 
   tags = {
-    Name      = "goldenshell-high-cpu-alarm"
+    Name      = "goldenshell-high-cpu-alarm${local.name_suffix}"
     Project   = "GoldenShell"
     ManagedBy = "Terraform"
   }
@@ -434,7 +523,7 @@ resource "aws_cloudwatch_metric_alarm" "high_cpu" {
 
 # CloudWatch Alarm for instance status check failures
 resource "aws_cloudwatch_metric_alarm" "instance_health" {
-  alarm_name          = "goldenshell-instance-health"
+  alarm_name          = "goldenshell-instance-health${local.name_suffix}"
   comparison_operator = "GreaterThanThreshold"
   evaluation_periods  = 2
   metric_name         = "StatusCheckFailed"
@@ -450,7 +539,7 @@ resource "aws_cloudwatch_metric_alarm" "instance_health" {
   }
 
   tags = {
-    Name      = "goldenshell-health-alarm"
+    Name      = "goldenshell-health-alarm${local.name_suffix}"
     Project   = "GoldenShell"
     ManagedBy = "Terraform"
   }
@@ -458,7 +547,7 @@ resource "aws_cloudwatch_metric_alarm" "instance_health" {
 
 # AWS Budget for cost monitoring
 resource "aws_budgets_budget" "goldenshell_monthly" {
-  name              = "goldenshell-monthly-budget"
+  name              = "goldenshell-monthly-budget${local.name_suffix}"
   budget_type       = "COST"
   limit_amount      = var.monthly_budget_limit
   limit_unit        = "USD"
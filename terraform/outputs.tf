@@ -13,6 +13,16 @@ output "public_ip" {
   value       = aws_instance.goldenshell.public_ip
 }
 
+output "availability_zone" {
+  description = "Availability zone of the instance"
+  value       = aws_instance.goldenshell.availability_zone
+}
+
+output "market_type" {
+  description = "Purchase option of the instance (on-demand or spot)"
+  value       = var.market_type
+}
+
 output "private_ip" {
   description = "Private IP address of the instance"
   value       = aws_instance.goldenshell.private_ip
@@ -60,5 +70,5 @@ output "web_terminal_url" {
 
 output "web_terminal_password_command" {
   description = "Command to retrieve web terminal password"
-  value       = "aws ssm get-parameter --name /goldenshell/ttyd-password --with-decryption --query Parameter.Value --output text --region ${var.aws_region}"
+  value       = "aws ssm get-parameter --name ${aws_ssm_parameter.ttyd_password.name} --with-decryption --query Parameter.Value --output text --region ${var.aws_region}"
 }
\ No newline at end of file
@@ -0,0 +1,248 @@
+#!/bin/bash
+# GoldenShell provisioner - installs every package and tool the instance needs.
+#
+# Provisioning is a dependency graph of steps. Steps whose dependencies are
+# done run in parallel, and a step is skipped when what's installed already
+# matches its version, so re-running this on a provisioned box takes seconds.
+#
+# Installed by user-data as /usr/local/sbin/goldenshell-provision and reused by
+# fix-instance.sh. Run as root. Set GOLDENSHELL_BOOT_LOG to also append each
+# step's timing to the boot timeline read by `goldenshell boot-report`.
+set -e
+
+export DEBIAN_FRONTEND=noninteractive
+
+STAMP_DIR="/var/lib/goldenshell/stamps"
+CACHE_DIR="/var/cache/goldenshell"
+LOG_DIR="/var/log/goldenshell-provision"
+mkdir -p "$STAMP_DIR" "$CACHE_DIR" "$LOG_DIR"
+
+# Wait for other apt/dpkg users (e.g. unattended-upgrades) instead of failing
+APT="apt-get -y -o DPkg::Lock::Timeout=600"
+
+# Versions
+NODE_MAJOR="20"
+ZELLIJ_VERSION="0.41.2"
+TTYD_VERSION="1.7.7"
+AWS_CLI_MAJOR="2"
+BASE_PACKAGES="curl wget git build-essential ca-certificates gnupg lsb-release unzip jq python3 python3-pip nginx tmux mosh rsync ec2-hibinit-agent"
+REPO_PACKAGES="gh nodejs tailscale"
+
+# --- Steps -------------------------------------------------------------------
+# Each step NAME has:
+#   step_NAME      does the work
+#   current_NAME   (optional) prints the installed version; when it matches
+#                  the step's version the step is skipped. Steps without one
+#                  are skipped when their stamp file matches instead.
+
+# Third-party apt repositories (GitHub CLI, NodeSource, Tailscale), followed by
+# the one and only `apt-get update`
+step_apt_sources() {
+    local arch codename
+    arch=$(dpkg --print-architecture)
+    codename=$(lsb_release -cs)
+    install -d -m 0755 /etc/apt/keyrings
+
+    curl -fsSL https://cli.github.com/packages/githubcli-archive-keyring.gpg -o /etc/apt/keyrings/githubcli-archive-keyring.gpg
+    echo "deb [arch=$arch signed-by=/etc/apt/keyrings/githubcli-archive-keyring.gpg] https://cli.github.com/packages stable main" > /etc/apt/sources.list.d/github-cli.list
+
+    curl -fsSL https://deb.nodesource.com/gpgkey/nodesource-repo.gpg.key | gpg --batch --yes --dearmor -o /etc/apt/keyrings/nodesource.gpg
+    echo "deb [signed-by=/etc/apt/keyrings/nodesource.gpg] https://deb.nodesource.com/node_$NODE_MAJOR.x nodistro main" > /etc/apt/sources.list.d/nodesource.list
+
+    curl -fsSL "https://pkgs.tailscale.com/stable/ubuntu/$codename.noarmor.gpg" -o /etc/apt/keyrings/tailscale-archive-keyring.gpg
+    echo "deb [signed-by=/etc/apt/keyrings/tailscale-archive-keyring.gpg] https://pkgs.tailscale.com/stable/ubuntu $codename main" > /etc/apt/sources.list.d/tailscale.list
+
+    chmod go+r /etc/apt/keyrings/*.gpg
+    $APT update
+}
+
+# System upgrade plus every apt package in a single transaction
+step_apt_packages() {
+    # Ubuntu's own nodejs/npm packages conflict with NodeSource's
+    $APT remove libnode-dev npm 2>/dev/null || true
+    $APT upgrade
+    # shellcheck disable=SC2086
+    $APT install $BASE_PACKAGES $REPO_PACKAGES
+}
+
+current_apt_packages() {
+    # shellcheck disable=SC2086
+    if dpkg -s $BASE_PACKAGES $REPO_PACKAGES > /dev/null 2>&1 \
+        && [ "$(node --version 2>/dev/null | cut -d. -f1)" = "v$NODE_MAJOR" ]; then
+        echo "$BASE_PACKAGES $REPO_PACKAGES node$NODE_MAJOR"
+    fi
+}
+
+# The AWS CLI installer only needs unzip, so download it while apt is busy
+step_awscli_download() {
+    curl -fsSL "https://awscli.amazonaws.com/awscli-exe-linux-$(uname -m).zip" -o "$CACHE_DIR/awscliv2.zip"
+}
+
+current_awscli_download() {
+    current_aws_cli
+}
+
+step_aws_cli() {
+    rm -rf "$CACHE_DIR/aws"
+    unzip -q "$CACHE_DIR/awscliv2.zip" -d "$CACHE_DIR"
+    "$CACHE_DIR/aws/install" --update
+    rm -rf "$CACHE_DIR/aws" "$CACHE_DIR/awscliv2.zip"
+}
+
+current_aws_cli() {
+    aws --version 2>/dev/null | sed -n 's|^aws-cli/\([0-9]*\)\..*|\1|p'
+}
+
+step_zellij() {
+    curl -fsSL "https://github.com/zellij-org/zellij/releases/download/v$ZELLIJ_VERSION/zellij-$(uname -m)-unknown-linux-musl.tar.gz" -o "$CACHE_DIR/zellij.tar.gz"
+    tar -xzf "$CACHE_DIR/zellij.tar.gz" -C /usr/local/bin/
+    chmod +x /usr/local/bin/zellij
+    rm "$CACHE_DIR/zellij.tar.gz"
+}
+
+current_zellij() {
+    /usr/local/bin/zellij --version 2>/dev/null | awk '{print $2}'
+}
+
+step_ttyd() {
+    curl -fsSL "https://github.com/tsl0922/ttyd/releases/download/$TTYD_VERSION/ttyd.$(uname -m)" -o "$CACHE_DIR/ttyd"
+    install -m 0755 "$CACHE_DIR/ttyd" /usr/local/bin/ttyd
+    rm "$CACHE_DIR/ttyd"
+}
+
+current_ttyd() {
+    /usr/local/bin/ttyd --version 2>/dev/null | awk '{print $3}' | cut -d- -f1
+}
+
+# Install (or upgrade) in place; never uninstall first
+step_claude_cli() {
+    npm install -g @anthropic-ai/claude-code@latest
+}
+
+current_claude_cli() {
+    local installed latest
+    installed=$(npm ls -g --depth=0 --json 2>/dev/null | jq -r '.dependencies["@anthropic-ai/claude-code"].version // empty')
+    [ -n "$installed" ] || return 0
+    # Offline: anything installed counts as current (the daily update timer catches up)
+    latest=$(timeout 10 npm view @anthropic-ai/claude-code version 2>/dev/null || echo "$installed")
+    if [ "$installed" = "$latest" ]; then
+        echo "latest"
+    fi
+}
+
+# Name, version, dependencies
+STEPS=(
+    "apt_sources      node$NODE_MAJOR-gh-tailscale-v1"
+    "apt_packages     $BASE_PACKAGES $REPO_PACKAGES node$NODE_MAJOR       : apt_sources"
+    "awscli_download  $AWS_CLI_MAJOR"
+    "aws_cli          $AWS_CLI_MAJOR           : awscli_download apt_packages"
+    "zellij           $ZELLIJ_VERSION"
+    "ttyd             $TTYD_VERSION"
+    "claude_cli       latest      : apt_packages"
+)
+
+# --- Scheduler ---------------------------------------------------------------
+
+declare -A VERSION DEPS STATE PID_STEP
+ORDER=()
+for entry in "${STEPS[@]}"; do
+    spec="${entry%%:*}"
+    read -r name version <<< "$spec"
+    ORDER+=("$name")
+    VERSION[$name]="$(echo "$version" | xargs)"
+    DEPS[$name]=""
+    if [[ "$entry" == *:* ]]; then
+        DEPS[$name]="${entry#*:}"
+    fi
+    STATE[$name]="pending"
+done
+
+uptime_now() {
+    cut -d' ' -f1 /proc/uptime
+}
+
+# Append a step to the boot timeline, if one is being recorded
+record_step() {
+    if [ -n "$GOLDENSHELL_BOOT_LOG" ]; then
+        echo "{\"phase\":\"provision/$1\",\"start\":$2,\"end\":$(uptime_now),\"status\":\"$3\"}" >> "$GOLDENSHELL_BOOT_LOG"
+    fi
+}
+
+# Run one step in the background: skip it if current, otherwise run and stamp it
+run_step() {
+    local name="$1" version="${VERSION[$1]}" started current
+    started=$(uptime_now)
+
+    if declare -F "current_$name" > /dev/null; then
+        current=$("current_$name" || true)
+    else
+        current=$(cat "$STAMP_DIR/$name" 2>/dev/null || true)
+    fi
+    if [ "$current" = "$version" ]; then
+        echo "  = $name is current ($version)"
+        record_step "$name" "$started" "skipped"
+        return 0
+    fi
+
+    # Run outside any condition so `set -e` stops the step at its first error
+    local status
+    set +e
+    ( set -e; "step_$name" ) > "$LOG_DIR/$name.log" 2>&1
+    status=$?
+    set -e
+
+    if [ "$status" -eq 0 ]; then
+        echo "$version" > "$STAMP_DIR/$name"
+        echo "  ✓ $name installed ($(awk -v s="$started" -v e="$(uptime_now)" 'BEGIN {printf "%.1fs", e - s}'))"
+        record_step "$name" "$started" "ok"
+    else
+        echo "  ✗ $name failed; last lines of $LOG_DIR/$name.log:"
+        tail -n 20 "$LOG_DIR/$name.log" | sed 's/^/      /'
+        record_step "$name" "$started" "failed"
+        return 1
+    fi
+}
+
+echo "Provisioning GoldenShell packages..."
+running=0
+failed=""
+while :; do
+    # Start every pending step whose dependencies have all finished
+    if [ -z "$failed" ]; then
+        for name in "${ORDER[@]}"; do
+            [ "${STATE[$name]}" = "pending" ] || continue
+            ready=1
+            for dep in ${DEPS[$name]}; do
+                [ "${STATE[$dep]}" = "done" ] || ready=0
+            done
+            if [ "$ready" = 1 ]; then
+                run_step "$name" &
+                PID_STEP[$!]="$name"
+                STATE[$name]="running"
+                running=$((running + 1))
+            fi
+        done
+    fi
+
+    [ "$running" -gt 0 ] || break
+
+    if wait -n -p finished; then
+        STATE[${PID_STEP[$finished]}]="done"
+    else
+        STATE[${PID_STEP[$finished]}]="failed"
+        failed="$failed ${PID_STEP[$finished]}"
+    fi
+    running=$((running - 1))
+done
+
+if [ -n "$failed" ]; then
+    not_run=""
+    for name in "${ORDER[@]}"; do
+        if [ "${STATE[$name]}" = "pending" ]; then
+            not_run="$not_run $name"
+        fi
+    done
+    echo "Provisioning failed:$failed${not_run:+ (not run:$not_run)}"
+    exit 1
+fi
+echo "Provisioning complete"
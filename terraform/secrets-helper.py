@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+GoldenShell secrets helper: fetch every parameter under an SSM path at once.
+
+    goldenshell-secrets fetch /goldenshell   # one GetParametersByPath, decrypted
+    goldenshell-secrets get ttyd-password    # print a fetched value
+    goldenshell-secrets clear                # forget all fetched values
+
+Boot used to start the AWS CLI once per secret (about a second of Python
+start-up each); this makes a single SSM round trip, signed with the instance
+role by goldenshell_aws (terraform/goldenshell_aws.py). Values live in
+/run/goldenshell/secrets (tmpfs, root only), so they never reach the disk and
+are gone after a reboot.
+"""
+
+import os
+import sys
+import json
+import shutil
+
+from goldenshell_aws import InstanceMetadata, aws_post
+
+SECRETS_DIR = '/run/goldenshell/secrets'
+
+
+def ssm_call(metadata, action, payload):
+    """Call an SSM (AWS JSON protocol) action with the instance role"""
+    return json.loads(aws_post(metadata, 'ssm', json.dumps(payload), {
+        'content-type': 'application/x-amz-json-1.1',
+        'x-amz-target': f'AmazonSSM.{action}',
+    }))
+
+
+def fetch(path):
+    """Store every parameter directly under `path`; returns their names"""
+    metadata = InstanceMetadata()
+    os.makedirs(SECRETS_DIR, mode=0o700, exist_ok=True)
+    names = []
+    payload = {'Path': path, 'WithDecryption': True, 'Recursive': False}
+    while True:
+        response = ssm_call(metadata, 'GetParametersByPath', payload)
+        for parameter in response.get('Parameters', []):
+            name = parameter['Name'].rsplit('/', 1)[1]
+            tmp_file = os.path.join(SECRETS_DIR, f'.{name}.tmp')
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(parameter['Value'])
+            os.replace(tmp_file, os.path.join(SECRETS_DIR, name))
+            names.append(name)
+        if not response.get('NextToken'):
+            return names
+        payload['NextToken'] = response['NextToken']
+
+
+def main():
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else (None, [])
+    if command == 'fetch' and len(args) == 1:
+        names = fetch(args[0])
+        print(f"Fetched {len(names)} secret(s) from {args[0]}: {', '.join(names)}", file=sys.stderr)
+    elif command == 'get' and len(args) == 1:
+        try:
+            with open(os.path.join(SECRETS_DIR, args[0])) as f:
+                sys.stdout.write(f.read())
+        except FileNotFoundError:
+            sys.exit(f'{args[0]} has not been fetched (run: goldenshell-secrets fetch <path>)')
+    elif command == 'clear':
+        shutil.rmtree(SECRETS_DIR, ignore_errors=True)
+    else:
+        sys.exit(__doc__.strip())
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,12 @@ exec 2>&1
 
 echo "Starting GoldenShell instance setup..."
 
+# deploy: normal instance, bake: build a golden AMI, probe: boot-timeline test
+# instance, pool: warm-pool instance that powers off once set up
+BOOT_MODE="${boot_mode}"
+# Present on images produced by `goldenshell bake`
+BAKED_IMAGE_FLAG="/var/lib/goldenshell-baked"
+
 # Idempotency check - skip if already completed
 SETUP_COMPLETE_FLAG="/var/lib/goldenshell-setup-complete"
 if [ -f "$SETUP_COMPLETE_FLAG" ]; then
@@ -14,76 +20,74 @@ if [ -f "$SETUP_COMPLETE_FLAG" ]; then
     exit 0
 fi
 
-# Update system
-echo "Updating system packages..."
-export DEBIAN_FRONTEND=noninteractive
-apt-get update
-apt-get upgrade -y
-
-# Install basic dependencies (excluding nodejs/npm - will be installed later)
-apt-get install -y \
-    curl \
-    wget \
-    git \
-    build-essential \
-    ca-certificates \
-    gnupg \
-    lsb-release \
-    unzip \
-    jq \
-    python3 \
-    python3-pip \
-    nginx \
-    tmux \
-    mosh
-
-# Install AWS CLI first (needed for SSM parameter access)
-if ! command -v aws &> /dev/null; then
-    echo "Installing AWS CLI..."
-    curl -s "https://awscli.amazonaws.com/awscli-exe-linux-x86_64.zip" -o "/tmp/awscliv2.zip"
-    unzip -q /tmp/awscliv2.zip -d /tmp
-    /tmp/aws/install
-    rm -rf /tmp/aws /tmp/awscliv2.zip
-    echo "AWS CLI installed: $(aws --version)"
-else
-    echo "AWS CLI already installed: $(aws --version)"
+# Boot timeline for `goldenshell boot-report`: one JSON line per phase, timed
+# with the monotonic clock (seconds since boot, from /proc/uptime)
+BOOT_LOG="/var/log/goldenshell-boot.jsonl"
+BAKED="false"
+[ -f "$BAKED_IMAGE_FLAG" ] && BAKED="true"
+echo "{\"event\":\"boot\",\"boot_mode\":\"$BOOT_MODE\",\"baked\":$BAKED,\"wall_clock\":$(date +%s),\"uptime\":$(cut -d' ' -f1 /proc/uptime)}" >> "$BOOT_LOG"
+
+# Everything before this script (firmware, kernel, cloud-init) is the first phase
+PHASE="pre-user-data"
+PHASE_START="0"
+
+# End the current phase (as "ok", or the status in $2) and start phase $1
+phase() {
+    local now status="ok"
+    now=$(cut -d' ' -f1 /proc/uptime)
+    if [ -n "$2" ]; then
+        status="$2"
+    fi
+    if [ -n "$PHASE" ]; then
+        echo "{\"phase\":\"$PHASE\",\"start\":$PHASE_START,\"end\":$now,\"status\":\"$status\"}" >> "$BOOT_LOG"
+    fi
+    PHASE="$1"
+    PHASE_START="$now"
+}
+
+# Record the phase that was running if the script dies
+trap 'if [ -n "$PHASE" ]; then phase "" failed; fi' EXIT
+
+if [ "$BOOT_MODE" = "bake" ]; then
+    # Power off on failure too, so `goldenshell bake` doesn't wait for the timeout
+    set -E
+    trap 'echo "GoldenShell bake failed"; shutdown -h now' ERR
+elif [ "$BOOT_MODE" = "pool" ]; then
+    set -E
+    trap 'echo "GoldenShell pool setup failed"; shutdown -h now' ERR
+elif [ "$BOOT_MODE" = "probe" ]; then
+    # Probe instances terminate on shutdown; never leave one running
+    shutdown -h +60 "GoldenShell probe instance expiring"
 fi
 
-# Install GitHub CLI
-if ! command -v gh &> /dev/null; then
-    echo "Installing GitHub CLI..."
-    curl -fsSL https://cli.github.com/packages/githubcli-archive-keyring.gpg | dd of=/usr/share/keyrings/githubcli-archive-keyring.gpg
-    chmod go+r /usr/share/keyrings/githubcli-archive-keyring.gpg
-    echo "deb [arch=$(dpkg --print-architecture) signed-by=/usr/share/keyrings/githubcli-archive-keyring.gpg] https://cli.github.com/packages stable main" | tee /etc/apt/sources.list.d/github-cli.list > /dev/null
-    apt-get update
-    apt-get install -y gh
-    echo "GitHub CLI installed: $(gh --version)"
+# Install the provisioner (terraform/provision.sh). It stays on the instance so
+# fix-instance.sh can re-run it; steps that are already current are skipped.
+mkdir -p /usr/local/sbin
+cat > /usr/local/sbin/goldenshell-provision << 'PROVISION'
+${provision_script}
+PROVISION
+chmod 755 /usr/local/sbin/goldenshell-provision
+
+if [ -f "$BAKED_IMAGE_FLAG" ]; then
+    echo "Baked image from $(cat "$BAKED_IMAGE_FLAG"); packages already installed"
 else
-    echo "GitHub CLI already installed: $(gh --version)"
+    phase provision
+    GOLDENSHELL_BOOT_LOG="$BOOT_LOG" /usr/local/sbin/goldenshell-provision
 fi
 
-# Install Node.js v20 LTS (required for latest Claude Code CLI)
-echo "Installing Node.js v20 LTS..."
-# Remove any conflicting packages first to avoid installation failures
-apt-get remove -y libnode-dev nodejs npm 2>/dev/null || true
-# Install Node.js v20 from NodeSource
-curl -fsSL https://deb.nodesource.com/setup_20.x | bash -
-apt-get install -y nodejs
-echo "Node.js installed: $(node --version)"
-echo "npm version: $(npm --version)"
-
-# Install Claude Code CLI via npm (official package)
-if ! command -v claude &> /dev/null; then
-    echo "Installing Claude Code CLI..."
-    npm install -g @anthropic-ai/claude-code
-    echo "Claude Code CLI installed: $(claude --version)"
-else
-    echo "Reinstalling Claude Code CLI to ensure compatibility..."
-    npm uninstall -g @anthropic-ai/claude-code 2>/dev/null || true
-    npm install -g @anthropic-ai/claude-code
-    echo "Claude Code CLI installed: $(claude --version)"
+if [ "$BOOT_MODE" = "bake" ]; then
+    # Leave no per-instance state in the image
+    phase
+    rm -f "$BOOT_LOG"
+    date -u +%Y-%m-%dT%H:%M:%SZ > "$BAKED_IMAGE_FLAG"
+    apt-get clean
+    cloud-init clean --logs
+    echo "GoldenShell bake complete"
+    shutdown -h now
+    exit 0
 fi
 
+phase claude-update-timer
 # Create Claude auto-update script
 cat > /usr/local/bin/update-claude.sh << 'EOF'
 #!/bin/bash
@@ -137,27 +141,34 @@ systemctl start claude-update.timer
 
 echo "Claude auto-update configured (daily updates via systemd)"
 
-# Install Tailscale
-if ! command -v tailscale &> /dev/null; then
-    echo "Installing Tailscale..."
-    curl -fsSL https://tailscale.com/install.sh | sh
+phase secrets
+# IMDSv2 and SigV4 signing shared by goldenshell-secrets and the idle monitor
+# (terraform/goldenshell_aws.py); they import it from their own directory
+cat > /usr/local/bin/goldenshell_aws.py << 'AWSMODULE'
+${aws_module_script}
+AWSMODULE
+chmod 644 /usr/local/bin/goldenshell_aws.py
+
+# Fetch every secret under the SSM prefix with one call (terraform/secrets-helper.py)
+cat > /usr/local/bin/goldenshell-secrets << 'SECRETSHELPER'
+${secrets_helper_script}
+SECRETSHELPER
+chmod 755 /usr/local/bin/goldenshell-secrets
+if [ "$BOOT_MODE" != "probe" ]; then
+    goldenshell-secrets fetch "${ssm_prefix}"
 fi
 
+phase tailscale-up
 # Enable Tailscale service to start on boot
 echo "Enabling Tailscale service..."
 systemctl enable tailscaled
 systemctl start tailscaled
 
 # Configure Tailscale if not already connected
-if ! sudo tailscale status &> /dev/null; then
-    # Retrieve Tailscale auth key from SSM Parameter Store
-    echo "Retrieving Tailscale auth key from SSM..."
-    export AWS_DEFAULT_REGION=${aws_region}
-    TAILSCALE_AUTH_KEY=$(aws ssm get-parameter \
-      --name "/goldenshell/tailscale-auth-key" \
-      --with-decryption \
-      --query "Parameter.Value" \
-      --output text)
+if [ "$BOOT_MODE" = "probe" ]; then
+    echo "Probe instance: skipping Tailscale login"
+elif ! sudo tailscale status &> /dev/null; then
+    TAILSCALE_AUTH_KEY=$(goldenshell-secrets get tailscale-auth-key)
 
     # Start and authenticate Tailscale
     echo "Authenticating Tailscale..."
@@ -172,33 +183,24 @@ else
 fi
 
 # Display Tailscale status
-sudo tailscale status
-
-# Install Zellij (terminal multiplexer for web terminal)
-if ! command -v zellij &> /dev/null; then
-    echo "Installing Zellij..."
-    ZELLIJ_VERSION="0.41.2"
-    wget -q "https://github.com/zellij-org/zellij/releases/download/v$${ZELLIJ_VERSION}/zellij-x86_64-unknown-linux-musl.tar.gz" -O /tmp/zellij.tar.gz
-    tar -xzf /tmp/zellij.tar.gz -C /usr/local/bin/
-    chmod +x /usr/local/bin/zellij
-    rm /tmp/zellij.tar.gz
-    echo "Zellij installed: $(zellij --version)"
-else
-    echo "Zellij already installed"
-fi
-
-# Install ttyd (web-based terminal)
-if ! command -v ttyd &> /dev/null; then
-    echo "Installing ttyd..."
-    TTYD_VERSION="1.7.7"
-    wget -q "https://github.com/tsl0922/ttyd/releases/download/$${TTYD_VERSION}/ttyd.x86_64" -O /tmp/ttyd
-    mv /tmp/ttyd /usr/local/bin/ttyd
-    chmod +x /usr/local/bin/ttyd
-    echo "ttyd installed: $(ttyd --version)"
-else
-    echo "ttyd already installed"
+sudo tailscale status || true
+
+# Publish the tailnet name and address as instance tags, so `goldenshell ssh`
+# can connect over Tailscale without a trip to the admin panel
+if [ "$BOOT_MODE" != "probe" ]; then
+    TS_SELF=$(tailscale status --json 2>/dev/null | jq -c '.Self // empty' || true)
+    TS_HOST=$(echo "$TS_SELF" | jq -r '.DNSName // empty' | sed 's/\.$//')
+    TS_IP=$(echo "$TS_SELF" | jq -r '.TailscaleIPs[0] // empty')
+    if [ -n "$TS_IP" ]; then
+        IMDS_TOKEN=$(curl -s -X PUT "http://169.254.169.254/latest/api/token" -H "X-aws-ec2-metadata-token-ttl-seconds: 60")
+        INSTANCE_ID=$(curl -s -H "X-aws-ec2-metadata-token: $IMDS_TOKEN" http://169.254.169.254/latest/meta-data/instance-id)
+        aws ec2 create-tags --region ${aws_region} --resources "$INSTANCE_ID" \
+            --tags "Key=GoldenShellTailscaleHost,Value=$TS_HOST" "Key=GoldenShellTailscaleIP,Value=$TS_IP" \
+            || echo "Could not tag the instance with its Tailscale address"
+    fi
 fi
 
+phase zellij-config
 # Configure Zellij default config for ubuntu user
 echo "Configuring Zellij..."
 mkdir -p /home/ubuntu/.config/zellij
@@ -235,17 +237,17 @@ EOF
 
 chown -R ubuntu:ubuntu /home/ubuntu/.config
 
+phase ttyd-service
 # Create ttyd systemd service
 echo "Creating ttyd systemd service..."
 
 # Retrieve web terminal password from SSM
-echo "Retrieving web terminal password from SSM..."
-export AWS_DEFAULT_REGION=${aws_region}
-TTYD_PASSWORD=$(aws ssm get-parameter \
-  --name "/goldenshell/ttyd-password" \
-  --with-decryption \
-  --query "Parameter.Value" \
-  --output text)
+if [ "$BOOT_MODE" = "probe" ]; then
+    # Probe instances have no instance profile; use a throwaway password
+    TTYD_PASSWORD=$(openssl rand -hex 16)
+else
+    TTYD_PASSWORD=$(goldenshell-secrets get ttyd-password)
+fi
 
 cat > /etc/systemd/system/ttyd.service << EOF
 [Unit]
@@ -257,8 +259,8 @@ Type=simple
 User=ubuntu
 WorkingDirectory=/home/ubuntu
 # Run ttyd on port 7681 with basic auth (password stored in SSM)
-# -W = writable terminal, -t = client options
-ExecStart=/usr/local/bin/ttyd -p 7681 -W -t disableReconnect=true -c ubuntu:$TTYD_PASSWORD /usr/local/bin/zellij attach --create default
+# -W = writable terminal; the web terminal profile sets -P (ping interval) and -t (client options)
+ExecStart=/usr/local/bin/ttyd -p 7681 -W ${ttyd_options} -c ubuntu:$TTYD_PASSWORD /usr/local/bin/zellij attach --create default
 Restart=always
 RestartSec=5
 
@@ -266,8 +268,9 @@ RestartSec=5
 WantedBy=multi-user.target
 EOF
 
-# Clear the password from memory
+# Clear the password from memory, and the fetched secrets (all used by now)
 unset TTYD_PASSWORD
+goldenshell-secrets clear
 
 # Enable and start ttyd service
 systemctl daemon-reload
@@ -276,87 +279,43 @@ systemctl start ttyd.service
 
 echo "ttyd web terminal service started on port 7681"
 
-# Create auto-shutdown monitoring script
-cat > /usr/local/bin/check-idle-shutdown.sh << 'EOF'
-#!/bin/bash
-
-# Configuration
-IDLE_THRESHOLD_MINUTES=${auto_shutdown_minutes}
-IDLE_THRESHOLD_SECONDS=$((IDLE_THRESHOLD_MINUTES * 60))
-
-# Get instance metadata using IMDSv2
-TOKEN=$(curl -X PUT "http://169.254.169.254/latest/api/token" -H "X-aws-ec2-metadata-token-ttl-seconds: 21600" -s)
-REGION=$(curl -H "X-aws-ec2-metadata-token: $TOKEN" -s http://169.254.169.254/latest/meta-data/placement/region)
-INSTANCE_ID=$(curl -H "X-aws-ec2-metadata-token: $TOKEN" -s http://169.254.169.254/latest/meta-data/instance-id)
-
-# Get the idle time in seconds (time since last user activity)
-# Check for active SSH sessions, running processes, and network activity
-ACTIVE_SESSIONS=$(who | wc -l)
-RECENT_CONNECTIONS=$(ss -tn | grep ESTAB | grep -v ':22' | wc -l)
-WEB_TERMINAL_CONNECTIONS=$(sudo ss -tn | grep ':7681' | grep ESTAB | wc -l)
-
-# If there are active sessions or connections, reset idle timer
-if [ "$ACTIVE_SESSIONS" -gt 0 ] || [ "$RECENT_CONNECTIONS" -gt 0 ] || [ "$WEB_TERMINAL_CONNECTIONS" -gt 0 ]; then
-    echo "$(date): Active sessions detected. Not shutting down."
-    echo "$(date)" > /tmp/last-activity
-    exit 0
-fi
-
-# Check last activity timestamp
-if [ ! -f /tmp/last-activity ]; then
-    echo "$(date)" > /tmp/last-activity
-    exit 0
-fi
-
-LAST_ACTIVITY=$(cat /tmp/last-activity)
-LAST_ACTIVITY_EPOCH=$(date -d "$LAST_ACTIVITY" +%s)
-CURRENT_EPOCH=$(date +%s)
-IDLE_SECONDS=$((CURRENT_EPOCH - LAST_ACTIVITY_EPOCH))
-
-echo "$(date): Idle for $IDLE_SECONDS seconds (threshold: $IDLE_THRESHOLD_SECONDS)"
+phase idle-monitor
+# Resident idle monitor (terraform/idle-monitor.py): samples sessions,
+# connections, CPU and disk every 30s and stops the instance once it has been
+# idle for the threshold
+cat > /usr/local/bin/goldenshell-idle-monitor << 'IDLEMONITOR'
+${idle_monitor_script}
+IDLEMONITOR
+chmod 755 /usr/local/bin/goldenshell-idle-monitor
 
-if [ "$IDLE_SECONDS" -gt "$IDLE_THRESHOLD_SECONDS" ]; then
-    echo "$(date): Idle threshold exceeded. Shutting down instance..."
-    aws ec2 stop-instances --instance-ids "$INSTANCE_ID" --region "$REGION"
-fi
-EOF
-
-chmod +x /usr/local/bin/check-idle-shutdown.sh
-
-# Create systemd service for idle monitoring
 cat > /etc/systemd/system/goldenshell-idle-monitor.service << EOF
 [Unit]
 Description=GoldenShell Idle Monitor
-After=network.target
+After=network-online.target
+Wants=network-online.target
 
 [Service]
-Type=oneshot
-ExecStart=/usr/local/bin/check-idle-shutdown.sh
+Type=simple
+Environment=IDLE_THRESHOLD_MINUTES=${auto_shutdown_minutes}
+ExecStart=/usr/bin/python3 /usr/local/bin/goldenshell-idle-monitor
+Restart=always
+RestartSec=10
+Nice=10
+CPUWeight=10
+IOSchedulingClass=idle
+MemoryMax=64M
 
 [Install]
 WantedBy=multi-user.target
 EOF
 
-# Create systemd timer (check every 5 minutes)
-cat > /etc/systemd/system/goldenshell-idle-monitor.timer << EOF
-[Unit]
-Description=GoldenShell Idle Monitor Timer
-
-[Timer]
-OnBootSec=5min
-OnUnitActiveSec=5min
-
-[Install]
-WantedBy=timers.target
-EOF
-
-# Enable and start the timer
 systemctl daemon-reload
-systemctl enable goldenshell-idle-monitor.timer
-systemctl start goldenshell-idle-monitor.timer
+systemctl enable goldenshell-idle-monitor.service
+systemctl start goldenshell-idle-monitor.service
 
 echo "Auto-shutdown monitoring configured (${auto_shutdown_minutes} minutes idle threshold)"
 
+phase user-environment
 # Set up user environment for ubuntu user
 sudo -u ubuntu bash << 'USEREOF'
 cd ~
@@ -442,6 +401,7 @@ echo "source ~/.bash_profile" >> ~/.bashrc
 USEREOF
 
 # Create setup completion flag
+phase
 touch "$SETUP_COMPLETE_FLAG"
 
 echo "GoldenShell setup complete!"
@@ -450,4 +410,10 @@ echo "Setup completion flag created at: $SETUP_COMPLETE_FLAG"
 echo ""
 echo "Web Terminal URL: http://$(curl -s http://169.254.169.254/latest/meta-data/public-ipv4):7681"
 echo "Username: ubuntu"
-echo "Password: Retrieve from SSM Parameter Store: /goldenshell/ttyd-password"
+echo "Password: Retrieve from SSM Parameter Store: ${ssm_prefix}/ttyd-password"
+
+if [ "$BOOT_MODE" = "pool" ]; then
+    # Wait stopped until `goldenshell deploy --env` claims this instance
+    echo "GoldenShell pool instance ready"
+    shutdown -h now
+fi
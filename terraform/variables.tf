@@ -4,6 +4,12 @@ variable "aws_region" {
   default     = "us-east-1"
 }
 
+variable "environment" {
+  description = "Environment name used to keep resource names and SSM paths unique per environment (leave empty for the default environment)"
+  type        = string
+  default     = ""
+}
+
 variable "vpc_id" {
   description = "VPC ID to deploy resources into (leave empty to use default VPC)"
   type        = string
@@ -16,12 +22,35 @@ variable "subnet_id" {
   default     = ""
 }
 
+variable "ami_id" {
+  description = "AMI to launch, e.g. one built by `goldenshell bake` (leave empty for the latest stock Ubuntu 22.04)"
+  type        = string
+  default     = ""
+}
+
 variable "instance_type" {
   description = "EC2 instance type"
   type        = string
   default     = "t3.medium"
 }
 
+variable "market_type" {
+  description = "Purchase option: \"on-demand\" or \"spot\" (a persistent spot request that stops, or hibernates, on interruption; changing this replaces the instance)"
+  type        = string
+  default     = "on-demand"
+
+  validation {
+    condition     = contains(["on-demand", "spot"], var.market_type)
+    error_message = "market_type must be \"on-demand\" or \"spot\"."
+  }
+}
+
+variable "availability_zone" {
+  description = "Availability zone for the default subnet, e.g. where spot capacity is cheapest (leave empty for any; ignored when subnet_id is set; changing this replaces the instance)"
+  type        = string
+  default     = ""
+}
+
 variable "key_name" {
   description = "AWS SSH key pair name"
   type        = string
@@ -51,6 +80,12 @@ variable "ebs_volume_size" {
   default     = 30
 }
 
+variable "enable_hibernation" {
+  description = "Launch with hibernation so `goldenshell stop --hibernate` keeps memory state (grows the root volume by the instance's RAM; changing this replaces the instance; ignored for types without hibernation support)"
+  type        = bool
+  default     = false
+}
+
 variable "enable_backups" {
   description = "Enable automated EBS snapshots"
   type        = bool
@@ -87,6 +122,40 @@ variable "ssh_allowed_cidrs" {
   default     = ["0.0.0.0/0"]
 }
 
+variable "web_terminal_profile" {
+  description = "Web terminal (ttyd) tuning profile: lan, balanced or mobile"
+  type        = string
+  default     = "balanced"
+
+  validation {
+    condition     = contains(["lan", "balanced", "mobile"], var.web_terminal_profile)
+    error_message = "web_terminal_profile must be lan, balanced or mobile."
+  }
+}
+
+variable "web_terminal_reconnect" {
+  description = "Reconnect the web terminal after a dropped connection (null = profile default)"
+  type        = bool
+  default     = null
+}
+
+variable "web_terminal_ping_interval" {
+  description = "Seconds between web terminal WebSocket pings (null = profile default)"
+  type        = number
+  default     = null
+}
+
+variable "web_terminal_renderer" {
+  description = "xterm.js renderer for the web terminal: webgl, canvas or dom (null = profile default)"
+  type        = string
+  default     = null
+
+  validation {
+    condition     = var.web_terminal_renderer == null || contains(["webgl", "canvas", "dom"], coalesce(var.web_terminal_renderer, "webgl"))
+    error_message = "web_terminal_renderer must be webgl, canvas or dom."
+  }
+}
+
 variable "ttyd_password" {
   description = "Password for web terminal (ttyd) access"
   type        = string